@@ -102,7 +102,8 @@ class HeatMap(object):
         """
         self.row_names = row_names
         self.col_names = col_names
-        A = self.data = numpy.array(data)
+        # avoid copying data which is already an array: it is never modified.
+        A = self.data = numpy.asarray(data)
         self.dmax = self.dmin = self.nrows = 0
         self.ncols = len(self.col_names)
         if len(A):
@@ -123,8 +124,10 @@ class HeatMap(object):
             self.display_data = self.data
         else:
             self.display_data = array_transform(self.data)
-        # zap any nan values
-        self.display_data[numpy.isnan(self.display_data)] = 0
+        # zap any nan values (in a copy, display_data may be the data passed in)
+        nans = numpy.isnan(self.display_data)
+        if nans.any():
+            self.display_data = numpy.where(nans, 0, self.display_data)
         # reset color interpolation if data has changed.
         if (save_data.shape != self.display_data.shape or
             not numpy.allclose(save_data, self.display_data)):
@@ -191,11 +194,11 @@ class HeatMap(object):
         return result
 
     def fix_data(self, default_value=0):
-        "Replace invalid data values in display data."
+        "Replace invalid data values in display data (by a copy, not in place)."
         data = self.display_data
-        for check in (numpy.isinf, numpy.isnan):
-            check_indices = numpy.where(check(data))
-            data[check_indices] = default_value
+        invalid = ~numpy.isfinite(data)
+        if invalid.any():
+            self.display_data = numpy.where(invalid, default_value, data)
 
     def displayed_row_order(self):
         row_order = self.row_order
@@ -226,10 +229,9 @@ class HeatMap(object):
         if row_order is None:
             row_order = list(range(self.nrows))
         for (rowp, rowi) in enumerate(row_order):
-            for colj in range(self.ncols):
-                dataij = self.display_data[rowi, colj]
+            row_colors = ci.interpolate_colors(self.display_data[rowi])
+            for (colj, colorij) in enumerate(row_colors):
                 nameij = self.rectName(rowi, colj)
-                colorij = ci.interpolate_color(dataij)
                 canvas.rect(nameij, colj*dx, rowp*dy, dx, dy, colorij)
         if labels_space is not None:
             label_color = "black"
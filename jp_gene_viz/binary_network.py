@@ -0,0 +1,242 @@
+"""
+Compact binary storage for large regulatory networks.
+
+A binary network file holds the edges of a network as parallel arrays:
+int32 source node ids, int32 target node ids and float32 weights, with
+node names interned to integer ids.  Any additional TSV columns (Motifs,
+etcetera) are stored as int32 codes into per-column string tables.
+The arrays are memory mapped when the file is read, so a multi-million
+edge network loads without parsing any text.
+
+File layout (little endian):
+
+    8 bytes     magic string "JPGVNET1"
+    8 bytes     uint64 length of the JSON header
+    header      JSON: node names, column headers, string tables and
+                the offset, dtype and length of each array
+    padding     to an 8 byte boundary
+    arrays      raw array data at the offsets recorded in the header
+"""
+
+import json
+import math
+import struct
+from array import array
+
+import numpy
+
+from jp_gene_viz import dGraph
+from jp_gene_viz.edge_attributes import Interner, MISSING
+
+MAGIC = b"JPGVNET1"
+
+# suffix used for binary networks converted from TSV files.
+BINARY_SUFFIX = ".netbin"
+
+SOURCE_DTYPE = "<i4"
+TARGET_DTYPE = "<i4"
+WEIGHT_DTYPE = "<f4"
+CODE_DTYPE = "<i4"
+
+
+def is_binary_network(filename):
+    "Test whether a file starts with the binary network magic string."
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_network(tsv_filename, binary_filename=None):
+    """
+    Convert a network TSV file (as read by getData.read_network)
+    to binary format.  Return the binary file name.
+    """
+    if binary_filename is None:
+        binary_filename = tsv_filename + BINARY_SUFFIX
+    with open(tsv_filename) as f:
+        headers = f.readline().strip().split("\t")
+        extra_headers = headers[3:]
+        node_ids = Interner()
+        column_ids = [Interner() for h in extra_headers]
+        sources = array("i")
+        targets = array("i")
+        weights = array("f")
+        codes = [array("i") for h in extra_headers]
+        for dataline in f:
+            columns = dataline.strip().split("\t")
+            [regulator, target, beta_s] = columns[:3]
+            beta = float(beta_s)
+            assert not math.isnan(beta), "nan beta in row " + repr(columns)
+            assert not math.isinf(beta), "inf beta in row " + repr(columns)
+            sources.append(node_ids(regulator))
+            targets.append(node_ids(target))
+            weights.append(beta)
+            extra = columns[3:]
+            for (i, column_codes) in enumerate(codes):
+                if i < len(extra):
+                    column_codes.append(column_ids[i](extra[i]))
+                else:
+                    column_codes.append(MISSING)
+    columns = [(h, interner.values, numpy.frombuffer(c, dtype=numpy.int32))
+               for (h, interner, c) in zip(extra_headers, column_ids, codes)]
+    write_arrays(binary_filename, node_ids.values,
+                 numpy.frombuffer(sources, dtype=numpy.int32),
+                 numpy.frombuffer(targets, dtype=numpy.int32),
+                 numpy.frombuffer(weights, dtype=numpy.float32),
+                 headers, columns)
+    return binary_filename
+
+
+def write_graph(G, binary_filename):
+    """
+    Store the edges of a WGraph in binary format.  Edge attributes are not stored.
+    """
+    node_ids = Interner()
+    ew = G.edge_weights
+    sources = numpy.array([node_ids(f) for (f, t) in ew], dtype=numpy.int32)
+    targets = numpy.array([node_ids(t) for (f, t) in ew], dtype=numpy.int32)
+    weights = numpy.array(list(ew.values()), dtype=numpy.float32)
+    headers = ["Regulator", "Target", "beta"]
+    write_arrays(binary_filename, node_ids.values, sources, targets, weights, headers, [])
+    return binary_filename
+
+
+def write_arrays(filename, names, sources, targets, weights, headers, columns):
+    """
+    Write a binary network file.  Columns is a sequence of
+    (header, string_table, codes_array) triples for extra attribute columns.
+    """
+    nedges = len(sources)
+    assert len(targets) == nedges and len(weights) == nedges, "array lengths must match"
+    data = [("sources", numpy.asarray(sources).astype(SOURCE_DTYPE)),
+            ("targets", numpy.asarray(targets).astype(TARGET_DTYPE)),
+            ("weights", numpy.asarray(weights).astype(WEIGHT_DTYPE))]
+    column_info = []
+    for (index, (header, table, codes)) in enumerate(columns):
+        assert len(codes) == nedges, "column length must match edges " + repr(header)
+        key = "column_%s" % index
+        data.append((key, numpy.asarray(codes).astype(CODE_DTYPE)))
+        column_info.append({"header": header, "table": list(table), "array": key})
+    arrays = {}
+    offset = 0
+    for (key, a) in data:
+        arrays[key] = {"offset": offset, "dtype": a.dtype.str, "length": len(a)}
+        offset = aligned(offset + a.nbytes)
+    header = {
+        "version": 1,
+        "nedges": nedges,
+        "names": list(names),
+        "headers": list(headers),
+        "columns": column_info,
+        "arrays": arrays,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes
+    with open(filename, "wb") as f:
+        f.write(prefix)
+        f.write(b"\0" * (aligned(len(prefix)) - len(prefix)))
+        for (key, a) in data:
+            start = f.tell()
+            f.write(a.tobytes())
+            f.write(b"\0" * (aligned(f.tell() - start) - (f.tell() - start)))
+
+
+def aligned(n, alignment=8):
+    return ((n + alignment - 1) // alignment) * alignment
+
+
+class NetworkArrays(object):
+
+    """
+    Memory mapped view of the arrays in a binary network file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("not a binary network file: " + repr(filename))
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        self.header = header
+        self.data_start = aligned(len(MAGIC) + 8 + header_length)
+        self.nedges = header["nedges"]
+        self.names = header["names"]
+        self.headers = header["headers"]
+        self.sources = self.map_array("sources")
+        self.targets = self.map_array("targets")
+        self.weights = self.map_array("weights")
+        # header -> (string table, codes array)
+        self.columns = [(c["header"], c["table"], self.map_array(c["array"]))
+                        for c in header["columns"]]
+
+    def map_array(self, key):
+        info = self.header["arrays"][key]
+        length = info["length"]
+        dtype = numpy.dtype(str(info["dtype"]))
+        if length == 0:
+            return numpy.zeros((0,), dtype=dtype)
+        return numpy.memmap(self.filename, dtype=dtype, mode="r",
+                            offset=self.data_start + info["offset"], shape=(length,))
+
+    def selection(self, limit=None, threshhold=None):
+        "Return the indices of edges passing the threshhold, respecting the limit."
+        weights = self.weights
+        if threshhold is None:
+            selected = numpy.arange(self.nedges)
+        else:
+            selected = numpy.flatnonzero(numpy.abs(weights) >= threshhold)
+        if limit is not None:
+            # read_network keeps limit + 1 edges.
+            selected = selected[:limit + 1]
+        return selected
+
+    def attribute_columns(self, selected):
+        """
+        (header, table, codes) triples for the selected edges, with the
+        regulator, target and beta columns reconstructed as strings.
+        """
+        headers = self.headers
+        names = self.names
+        weights = numpy.asarray(self.weights[selected])
+        (distinct, beta_codes) = numpy.unique(weights, return_inverse=True)
+        result = [
+            (headers[0], names, self.sources[selected]),
+            (headers[1], names, self.targets[selected]),
+            (headers[2], [repr(float(w)) for w in distinct], beta_codes),
+            ]
+        for (header, table, codes) in self.columns:
+            result.append((header, table, codes[selected]))
+        return result
+
+    def edge_attributes(self, index):
+        "Reconstruct the TSV attribute dictionary for one edge."
+        headers = self.headers
+        names = self.names
+        row = [names[self.sources[index]], names[self.targets[index]],
+               repr(float(self.weights[index]))]
+        result = dict(zip(headers, row))
+        for (header, table, codes) in self.columns:
+            code = codes[index]
+            if code != MISSING:
+                result[header] = table[code]
+        return result
+
+
+def read_network(filename, limit=None, threshhold=None, attributes=False, klass=None):
+    """
+    Load a binary network file as a WGraph (or an instance of klass).
+    Per edge attribute dictionaries are only built if attributes is true.
+    """
+    if klass is None:
+        klass = dGraph.WGraph
+    A = NetworkArrays(filename)
+    selected = A.selection(limit, threshhold)
+    G = klass()
+    G.add_edge_arrays(A.names, A.sources[selected], A.targets[selected], A.weights[selected])
+    if attributes:
+        # self edges are not recorded by add_edge_arrays.
+        selected = selected[A.sources[selected] != A.targets[selected]]
+        G.edge_attributes.extend(A.names, A.sources[selected], A.targets[selected],
+                                 A.attribute_columns(selected))
+    return G
@@ -1,19 +1,353 @@
-
 """
 This is an experimental class for holding WIG format data.
-At the moment it only supports files containing one track
-which uses the "variableStep" format:
+WIG files are parsed in a streaming fashion and may contain any number of
+"variableStep" and "fixedStep" blocks for any number of chromosomes:
 
 track type=wiggle_0 name="SL1041_SL972_treat_chrX" description="Extended bp"
 variableStep chrom=chrX span=10
 3000011 1
 3000021 1
 3000031 1
+fixedStep chrom=chrY start=100 step=10 span=10
+1
+2
+
+The data for each chromosome are kept as compact uint32 location and
+float32 height arrays (with a uint32 span array if the blocks for the
+chromosome have different spans).  One chromosome at a time is
+"selected" for drawing and queries.
 """
+import re
 import numpy
 import gzip
 import traitlets
 
+from jp_gene_viz import sidecar
+
+LOCATION_DTYPE = numpy.uint32
+HEIGHT_DTYPE = numpy.float32
+SPAN_DTYPE = numpy.uint32
+
+# Approximate number of bytes of text parsed at a time by load_file.
+CHUNK_SIZE = 1 << 22
+
+# Lines starting with anything other than a number declare tracks or blocks.
+# (Matched after a newline for speed, so chunks are searched with a newline prepended.)
+DECLARATION = re.compile(r"\n([^-+.\d\s][^\n]*)(?=\n)")
+
+
+class ChromosomeTrack(object):
+
+    """
+    Signal data for one chromosome: sorted locations, heights and the span
+    covered by each location.  span is the smallest span; spans is None if
+    every location has that span, or else the span of each location.
+    """
+
+    def __init__(self, chrom, locations, heights, span, spans=None):
+        self.chrom = chrom
+        self.locations = locations
+        self.heights = heights
+        self.span = span
+        self.spans = spans
+        self.numelts = len(heights)
+        self.maxheight = 0
+        if self.numelts:
+            self.maxheight = numpy.max(heights)
+        # ZoomPyramid, if built.
+        self.pyramid = None
+
+    def build_pyramid(self):
+        self.pyramid = build_pyramid(self.locations, self.heights, self.span)
+        return self.pyramid
+
+    def location_spans(self, indices):
+        "Spans of the locations at indices (a single span if they are all the same)."
+        if self.spans is None:
+            return self.span
+        return self.spans[indices]
+
+    _padded_heights = None
+
+    def padded_heights(self):
+        "Heights with a trailing 0 so reduceat can end a segment at the last location."
+        result = self._padded_heights
+        if result is None:
+            result = self._padded_heights = numpy.append(self.heights, HEIGHT_DTYPE(0))
+        return result
+
+    def window_values(self, starts, ends, summary="max"):
+        """
+        Summarize the heights in many windows [starts[i], ends[i]) at once.
+        summary is "max", "sum" or "mean" over the locations in each window.
+        An empty window takes the height of the next location if that is within
+        1.5 of its spans of the window start (the same rule as WigData.maximum),
+        and 0 otherwise.
+        """
+        starts = numpy.asarray(starts, dtype=numpy.float64)
+        ends = numpy.asarray(ends, dtype=numpy.float64)
+        result = numpy.zeros(starts.shape, dtype=numpy.float64)
+        n = self.numelts
+        if n == 0 or len(starts) == 0:
+            return result
+        locations = self.locations
+        first = location_index(locations, starts)
+        last = numpy.maximum(location_index(locations, ends), first)
+        # process windows in start order so the segments between windows
+        # reduced by reduceat cover the data at most once.
+        order = numpy.argsort(first, kind="mergesort")
+        bounds = numpy.empty((2 * len(order),), dtype=numpy.int64)
+        bounds[0::2] = first[order]
+        bounds[1::2] = last[order]
+        heights = self.padded_heights()
+        if summary == "max":
+            values = numpy.maximum.reduceat(heights, bounds)[0::2]
+        elif summary in ("sum", "mean"):
+            values = numpy.add.reduceat(heights, bounds, dtype=numpy.float64)[0::2]
+            if summary == "mean":
+                counts = (last - first)[order]
+                values = values / numpy.maximum(counts, 1)
+        else:
+            raise ValueError("summary should be 'max', 'sum' or 'mean': " + repr(summary))
+        result[order] = values
+        # fill empty windows from a nearby location
+        empty = numpy.flatnonzero(first >= last)
+        result[empty] = 0
+        fill = empty[first[empty] < n - 1]
+        next_locations = locations[first[fill]].astype(numpy.float64)
+        fill = fill[(next_locations - starts[fill]) <= self.location_spans(first[fill]) * 1.5]
+        result[fill] = self.heights[first[fill]]
+        return result
+
+
+class ZoomLevel(object):
+
+    """
+    Summary of a track over bins of bin_size bases.  Bin i covers
+    locations [i * bin_size, (i + 1) * bin_size).  Only bins containing
+    data are stored: sorted bin ids with the max, sum and count of the
+    heights at locations in each bin.
+    """
+
+    def __init__(self, bin_size, ids, maxima, sums, counts):
+        self.bin_size = bin_size
+        self.ids = ids
+        self.maxima = maxima
+        self.sums = sums
+        self.counts = counts
+
+    def coarser(self):
+        "The level with bins twice as large."
+        return summarize_bins(self.bin_size * 2, self.ids // 2,
+                              self.maxima, self.sums, self.counts)
+
+    def bin_range(self, start_location, end_location):
+        "Slice of stored bins which start before end_location and end after start_location."
+        size = float(self.bin_size)
+        first = location_index(self.ids, numpy.floor(start_location / size))
+        last = location_index(self.ids, end_location / size)
+        return slice(first, last)
+
+
+def summarize_bins(bin_size, ids, maxima, sums, counts):
+    "Combine summaries of sorted (possibly repeated) bin ids into a ZoomLevel."
+    if len(ids) == 0:
+        return ZoomLevel(bin_size, ids, maxima, sums, counts)
+    firsts = numpy.append(0, numpy.flatnonzero(ids[1:] != ids[:-1]) + 1)
+    if len(firsts) == len(ids):
+        return ZoomLevel(bin_size, ids, maxima, sums, counts)
+    return ZoomLevel(bin_size, ids[firsts],
+                     numpy.maximum.reduceat(maxima, firsts),
+                     numpy.add.reduceat(sums, firsts),
+                     numpy.add.reduceat(counts, firsts))
+
+
+# The finest pyramid bins are PYRAMID_BASE times the span of the data;
+# drawing at finer resolution uses the data directly.
+PYRAMID_BASE = 4
+
+
+def build_pyramid(locations, heights, span):
+    """
+    Build max/sum/count summaries of a track over bins of
+    PYRAMID_BASE * span * 2**k bases, up to the level where all the
+    data falls in one bin.
+    """
+    base = PYRAMID_BASE * max(int(span), 1)
+    ids = (locations // base).astype(LOCATION_DTYPE)
+    heights = heights.astype(HEIGHT_DTYPE)
+    level = summarize_bins(base, ids, heights, heights, numpy.ones(len(ids), dtype=numpy.uint32))
+    levels = [level]
+    while len(level.ids) > 1:
+        level = level.coarser()
+        levels.append(level)
+    return ZoomPyramid(levels)
+
+
+class ZoomPyramid(object):
+
+    """
+    Track summaries at power of two multiples of a base bin size,
+    for drawing a window of any size with a few vectorized operations.
+    """
+
+    fields = ("ids", "maxima", "sums", "counts")
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    def level_for(self, bin_size):
+        "The coarsest level with bins no larger than bin_size, or None."
+        result = None
+        for level in self.levels:
+            if level.bin_size <= bin_size:
+                result = level
+        return result
+
+    def pixel_values(self, start_location, end_location, width, summary="max"):
+        """
+        Max (or mean) height for each of width equal pixel columns over a window.
+        Each bin is counted in the pixel containing its start, so values may
+        be displaced by up to one bin (never more than a pixel).
+        Return None if the pixels are smaller than the finest bins.
+        """
+        width = int(width)
+        dlocation = (end_location - start_location) * 1.0 / width
+        level = self.level_for(dlocation)
+        if level is None:
+            return None
+        result = numpy.zeros((width,), dtype=numpy.float64)
+        bins = level.bin_range(start_location, end_location)
+        ids = level.ids[bins]
+        if len(ids) == 0:
+            return result
+        pixels = ((ids * float(level.bin_size) - start_location) / dlocation).astype(numpy.int64)
+        pixels = numpy.clip(pixels, 0, width - 1)
+        firsts = numpy.append(0, numpy.flatnonzero(pixels[1:] != pixels[:-1]) + 1)
+        if summary == "max":
+            values = numpy.maximum.reduceat(level.maxima[bins], firsts)
+        elif summary == "mean":
+            values = (numpy.add.reduceat(level.sums[bins], firsts) /
+                      numpy.add.reduceat(level.counts[bins], firsts))
+        else:
+            raise ValueError("summary should be 'max' or 'mean': " + repr(summary))
+        result[pixels[firsts]] = values
+        return result
+
+    def bin_sizes(self):
+        return [level.bin_size for level in self.levels]
+
+
+class TrackBuilder(object):
+
+    """
+    Accumulate parsed blocks of data for one chromosome.  Blocks may have
+    different spans: then the track records the span of every location.
+    """
+
+    def __init__(self, chrom):
+        self.chrom = chrom
+        self.location_arrays = []
+        self.height_arrays = []
+        self.block_spans = []
+
+    def add(self, locations, heights, span):
+        self.location_arrays.append(numpy.asarray(locations).astype(LOCATION_DTYPE))
+        self.height_arrays.append(numpy.asarray(heights).astype(HEIGHT_DTYPE))
+        self.block_spans.append(span)
+
+    def track(self):
+        locations = concatenate(self.location_arrays, LOCATION_DTYPE)
+        heights = concatenate(self.height_arrays, HEIGHT_DTYPE)
+        block_spans = self.block_spans
+        spans = None
+        if len(set(block_spans)) > 1:
+            counts = [len(a) for a in self.location_arrays]
+            spans = numpy.repeat(numpy.array(block_spans, dtype=SPAN_DTYPE), counts)
+        self.location_arrays = self.height_arrays = self.block_spans = None
+        if len(locations) > 1 and numpy.any(locations[1:] < locations[:-1]):
+            order = numpy.argsort(locations, kind="mergesort")
+            locations = locations[order]
+            heights = heights[order]
+            if spans is not None:
+                spans = spans[order]
+        span = min(block_spans) if block_spans else 1
+        return ChromosomeTrack(self.chrom, locations, heights, span, spans)
+
+
+# largest location representable in LOCATION_DTYPE
+LOCATION_LIMIT = numpy.iinfo(LOCATION_DTYPE).max
+
+
+def location_index(locations, location):
+    """
+    numpy.searchsorted(locations, location) for integer locations and a
+    (possibly fractional) location or array of locations.  The key is
+    converted to the locations dtype rather than converting the whole
+    locations array to float.
+    """
+    location = numpy.asarray(location, dtype=numpy.float64)
+    key = numpy.ceil(numpy.clip(location, 0, LOCATION_LIMIT)).astype(locations.dtype)
+    result = numpy.searchsorted(locations, key)
+    return numpy.where(location > LOCATION_LIMIT, len(locations), result)
+
+
+def concatenate(arrays, dtype):
+    if not arrays:
+        return numpy.zeros((0,), dtype=dtype)
+    if len(arrays) == 1:
+        return arrays[0]
+    return numpy.concatenate(arrays)
+
+
+def parse_declaration(line, filename=None):
+    """
+    Parse a "variableStep" or "fixedStep" line into a dictionary.
+    Return None for "track", "browser" and comment lines.
+    """
+    words = line.split()
+    kind = words[0]
+    if kind in ("track", "browser") or kind.startswith("#"):
+        return None
+    assert kind in ("variableStep", "fixedStep"), (
+        "not in variableStep or fixedStep format: " + repr((filename, line)))
+    try:
+        result = {"kind": kind, "span": 1, "step": 1}
+        for chunk in words[1:]:
+            [attr, value] = chunk.split("=")
+            result[attr] = value
+        for attr in ("span", "step", "start"):
+            if attr in result:
+                result[attr] = int(result[attr])
+        assert "chrom" in result, "no chrom: " + repr((filename, line))
+        if kind == "fixedStep":
+            assert "start" in result, "no start: " + repr((filename, line))
+    except Exception as e:
+        if type(e) == AssertionError:
+            raise
+        raise ValueError("Bad header: " + repr((filename, e)))
+    return result
+
+
+def text_chunks(f, chunk_size=CHUNK_SIZE):
+    "Generate chunks of text from a file, ending at line boundaries."
+    remainder = ""
+    while True:
+        data = f.read(chunk_size)
+        if not isinstance(data, str):
+            data = data.decode("utf-8")
+        if not data:
+            break
+        data = remainder + data
+        cut = data.rfind("\n") + 1
+        if cut == 0:
+            remainder = data
+            continue
+        remainder = data[cut:]
+        yield data[:cut]
+    if remainder:
+        yield remainder + "\n"
+
 
 class WigData(traitlets.HasTraits):
 
@@ -34,63 +368,165 @@ class WigData(traitlets.HasTraits):
         self.color = "green"
         self.header1 = self.header2 = None
         self.span = None
+        self.spans = None
         self.chrom = None
+        # chromosome name -> ChromosomeTrack, and the order they were seen.
+        self.chromosomes = {}
+        self.chromosome_names = []
+        # ZoomPyramid for the selected chromosome
+        self.pyramid = None
         # SVG canvas for drawing, if provided.
         svg = None
 
-    def load_file(self, f, filename=None):
+    def load_file(self, f, filename=None, chunk_size=CHUNK_SIZE, pyramid=True):
         """
-        Load data from a WIG file object.
+        Load data from a WIG file object, a chunk of text at a time.
+        Build zoom pyramids for drawing unless pyramid is false.
+        The first chromosome in the file is selected.
         """
         self.filename = filename
-        # skip 2 lines
-        self.header1 = f.readline()
-        header2 = self.header2 = f.readline()
-        hs = header2.split()
-        # parse and validate header info
-        try:
-            assert hs[0] == "variableStep", ("not in variableStep format: " +
-                                             repr((filename, header2)))
-            assert len(hs) == 3, ("unexpected header format: " +
-                                  repr((filename, header2)))
-            for (attr, chunk) in [("chrom", hs[1]), ("span", hs[2])]:
-                [attr2, value] = chunk.split("=")
-                assert attr2 == attr, ("bad variableStep format: " +
-                                       repr((filename, header2, chunk)))
-                setattr(self, attr, value)
-            self.span = int(self.span)
-        except Exception as e:
-            if type(e) == AssertionError:
-                raise
-            raise ValueError("Bad header: " + repr((filename, e)))
-        array_text = f.read()
-        A = numpy.fromstring(array_text, numpy.float, sep=" ")
-        (d,) = A.shape
-        B = A.reshape((d/2, 2))
-        self.locations = B[:, 0]
-        self.heights = B[:, 1]
-        self.maxheight = numpy.max(self.heights)
-        self.numelts = len(self.heights)
-
-    def load_filename(self, filename):
-        """
-        Load data using a file name.
+        builders = {}
+        names = []
+        block = None
+        for chunk in text_chunks(f, chunk_size):
+            chunk = "\n" + chunk
+            position = 1
+            for match in DECLARATION.finditer(chunk):
+                block = self.parse_block(chunk[position:match.start(1)], block, builders, filename)
+                line = match.group(1)
+                if self.header1 is None:
+                    self.header1 = line + "\n"
+                declaration = parse_declaration(line, filename)
+                if declaration is not None:
+                    if self.header2 is None:
+                        self.header2 = line + "\n"
+                    block = declaration
+                    chrom = block["chrom"]
+                    if chrom not in builders:
+                        builders[chrom] = TrackBuilder(chrom)
+                        names.append(chrom)
+                position = match.end(1) + 1
+            block = self.parse_block(chunk[position:], block, builders, filename)
+        self.chromosomes = dict((chrom, builders[chrom].track()) for chrom in names)
+        self.chromosome_names = names
+        if names:
+            self.select_chromosome(names[0])
+        if pyramid:
+            self.build_pyramids()
+
+    def parse_block(self, data, block, builders, filename):
+        """
+        Parse the numeric lines of part of a block.  Return the block
+        declaration updated to continue after these lines.
+        """
+        if not data.strip():
+            return block
+        if block is None:
+            raise ValueError("Bad header: data before variableStep or fixedStep " + repr(filename))
+        A = numpy.fromstring(data, numpy.float64, sep=" ")
+        nlines = data.count("\n")
+        expected = nlines * (2 if block["kind"] == "variableStep" else 1)
+        if len(A) != expected:
+            # allow for blank lines
+            nlines = len([line for line in data.split("\n") if line.strip()])
+        builder = builders[block["chrom"]]
+        if block["kind"] == "variableStep":
+            if len(A) != 2 * nlines:
+                raise ValueError("bad variableStep data in " + repr((filename, block)))
+            B = A.reshape((nlines, 2))
+            builder.add(B[:, 0], B[:, 1], block["span"])
+        else:
+            if len(A) != nlines:
+                raise ValueError("bad fixedStep data in " + repr((filename, block)))
+            start = block["start"]
+            step = block["step"]
+            locations = start + step * numpy.arange(nlines, dtype=numpy.int64)
+            builder.add(locations, A, block["span"])
+            block = dict(block)
+            block["start"] = start + step * nlines
+        return block
+
+    def select_chromosome(self, chrom):
+        """
+        Make the data for chrom the current data for drawing and queries.
+        """
+        track = self.chromosomes[chrom]
+        self.chrom = chrom
+        self.locations = track.locations
+        self.heights = track.heights
+        self.span = track.span
+        self.spans = track.spans
+        self.maxheight = track.maxheight
+        self.numelts = track.numelts
+        self.pyramid = track.pyramid
+
+    def load_filename(self, filename, cache=False):
+        """
+        Load data using a file name.  Signal track files (see signal_track)
+        are opened rather than loaded.  If cache is true a WIG file is
+        converted to a signal track sidecar file next to it, which is opened
+        instead of parsing the WIG file while the WIG file is unchanged.
         """
+        from jp_gene_viz import signal_track
+        if signal_track.is_signal_track(filename):
+            self.open_track(filename)
+            return
         if filename.endswith(".wig"):
-            f = open(filename)
+            opener = open
         elif filename.endswith(".wig.gz"):
-            f = gzip.GzipFile(filename)
+            opener = gzip.GzipFile
         else:
             raise ValueError("filename must end with .wig or .wig.gz")
-        self.load_file(f, filename)
+        suffix = signal_track.SIGNAL_SUFFIX
+        if cache and sidecar.read_index(filename, suffix) is not None:
+            self.open_track(sidecar.sidecar_path(filename, suffix))
+            return
+        signature = sidecar.source_signature(filename)
+        with opener(filename) as f:
+            self.load_file(f, filename)
+        if cache:
+            temp = sidecar.writable_path(filename, suffix)
+            if temp is not None:
+                self.save_track(temp)
+                sidecar.commit(filename, suffix, temp, {"signature": signature})
+
+    def build_pyramids(self):
+        for chrom in self.chromosome_names:
+            self.chromosomes[chrom].build_pyramid()
+        if self.chrom is not None:
+            self.select_chromosome(self.chrom)
+
+    def save_track(self, filename):
+        "Store the data in a signal track file."
+        from jp_gene_viz import signal_track
+        signal_track.write_signal_track(self, filename)
+        if self.chrom is not None:
+            self.select_chromosome(self.chrom)
+
+    def open_track(self, filename):
+        """
+        Use the data in a signal track file.  Only the blocks needed
+        to answer each query are read.  The first chromosome is selected.
+        """
+        from jp_gene_viz import signal_track
+        track_file = signal_track.SignalTrackFile(filename)
+        self.filename = filename
+        names = self.chromosome_names = track_file.chromosome_names
+        self.chromosomes = dict((chrom, signal_track.FileChromosomeTrack(track_file, chrom))
+                                for chrom in names)
+        if names:
+            self.select_chromosome(names[0])
 
     def maximum(self, start_location, end_location):
         """
         Determine the maximum value within a start/end range in the data.
         """
+        if self.locations is None and self.chrom is not None:
+            # data in a signal track file
+            return self.window_values([start_location], [end_location])[0]
         locations = self.locations
         heights = self.heights
-        ss = numpy.searchsorted
+        ss = location_index
         start_index = ss(locations, start_location)
         end_index = ss(locations, end_location)
         if start_index >= end_index:
@@ -98,12 +534,40 @@ class WigData(traitlets.HasTraits):
                 next_location = locations[start_index]
                 if next_location < start_location:
                     next_location = locations[start_index + 1]
-                if (next_location - start_location) <= self.span * 1.5:
+                span = self.span if self.spans is None else self.spans[start_index]
+                if (next_location - start_location) <= span * 1.5:
                     return heights[start_index]
             return 0  # missing value means 0
         choices = heights[start_index: end_index]
         return numpy.max(choices)
 
+    def window_values(self, starts, ends, summary="max", chrom=None):
+        """
+        Summarize the signal in many windows at once (see ChromosomeTrack.window_values).
+        Windows are on the selected chromosome unless chrom is given.
+        """
+        if chrom is None:
+            chrom = self.chrom
+        return self.chromosomes[chrom].window_values(starts, ends, summary)
+
+    def feature_values(self, features, summary="max"):
+        """
+        Summarize the signal over many GTF feature dictionaries (as produced by
+        gtf_format) at once.  Features on chromosomes without data get 0.
+        """
+        result = numpy.zeros((len(features),), dtype=numpy.float64)
+        by_chrom = {}
+        for (index, feature) in enumerate(features):
+            by_chrom.setdefault(feature["seqname"], []).append(index)
+        for chrom in by_chrom:
+            if chrom in self.chromosomes:
+                indices = by_chrom[chrom]
+                # GTF positions are inclusive.
+                starts = [features[i]["start"] for i in indices]
+                ends = [features[i]["end"] + 1 for i in indices]
+                result[indices] = self.window_values(starts, ends, summary, chrom)
+        return result
+
     def draw(self, svg=None, start_location=None, end_location=None,
              svg_width=None, svg_height=None):
         """
@@ -129,9 +593,15 @@ class WigData(traitlets.HasTraits):
             maxheight = self.maxheight
         yscale = (1.0 * svg_height) / maxheight
         dlocation = (end_location - start_location) * 1.0 / svg_width
+        pixel_heights = None
+        if self.pyramid is not None:
+            pixel_heights = self.pyramid.pixel_values(start_location, end_location, svg_width)
+        if pixel_heights is None:
+            # zoomed in closer than the pyramid resolution.
+            pixel_starts = start_location + dlocation * numpy.arange(svg_width)
+            pixel_heights = self.window_values(pixel_starts, pixel_starts + dlocation)
         for svgx in range(svg_width):
-            locationx = start_location + dlocation * svgx
-            maxh = self.maximum(locationx, locationx + dlocation)
+            maxh = pixel_heights[svgx]
             svgy = maxh * yscale
             svg.rect(repr((svgx, svgy)), svgx, svg_height - svgy,
                      1, svgy, color)
@@ -83,6 +83,18 @@ class breakpointConverter(object):
         return [(v, clr(*c)) for (v, c) in alist]
 
 
+# default number of precomputed colors for batch interpolation.
+# Odd, so the middle of a scale (often 0) is sampled exactly.
+LUT_SIZE = 1025
+
+
+def hex_colors(clrs):
+    "Format an N x 3 array of color channels as a list of hex color strings."
+    ints = numpy.asarray(clrs).astype(numpy.int64)
+    assert ints.size == 0 or (ints.min() >= 0 and ints.max() < 256)
+    return ["#%02x%02x%02x" % tuple(c) for c in ints.tolist()]
+
+
 class ColorInterpolator(JsonMixin):
 
     json_atts = "minvalue maxvalue".split()
@@ -92,6 +104,11 @@ class ColorInterpolator(JsonMixin):
         "breakpoints": breakpointConverter,
     }
 
+    # resolution of the lookup table used by interpolate_colors.
+    lut_size = LUT_SIZE
+    _lut = None
+    _lut_key = None
+
     def __init__(self, minclr=clr(0,0,0), maxclr=clr(255,0,0),
                 minvalue=0.0, maxvalue=1.0):
         assert minvalue <= maxvalue, (
@@ -104,6 +121,11 @@ class ColorInterpolator(JsonMixin):
         self.minvalue = minvalue
         self.maxvalue = maxvalue
         self.breakpoints = [(minvalue, minclr), (maxvalue, maxclr)]
+        self.invalidate()
+
+    def invalidate(self):
+        "Discard the color lookup table after the scale changes."
+        self._lut = None
 
     def set_color_mapping(self, value_to_color):
         """
@@ -135,6 +157,7 @@ class ColorInterpolator(JsonMixin):
         if b[-1][0] < self.maxvalue:
             b.append((self.maxvalue, self.maxclr))
         self.breakpoints = b
+        self.invalidate()
 
     def normalized_value(self, value):
         lowvalue = self.minvalue
@@ -168,6 +191,46 @@ class ColorInterpolator(JsonMixin):
         result = weighted_color(highcolor, lowcolor, highvalue - lowvalue, value - lowvalue)
         return result
 
+    def lookup_table(self):
+        """
+        Hex colors for lut_size values evenly spaced from minvalue to maxvalue,
+        computed on demand.
+        """
+        # attributes may also be replaced directly (for example from json).
+        key = (self.lut_size, self.minvalue, self.maxvalue,
+               id(self.minclr), id(self.maxclr), id(self.breakpoints))
+        if self._lut is None or self._lut_key != key:
+            values = numpy.linspace(self.minvalue, self.maxvalue, self.lut_size)
+            breakpoint_values = [v for (v, c) in self.breakpoints]
+            breakpoint_colors = numpy.array([c for (v, c) in self.breakpoints], dtype=numpy.float64)
+            clrs = numpy.column_stack([
+                numpy.interp(values, breakpoint_values, breakpoint_colors[:, channel])
+                for channel in range(3)])
+            # below the first breakpoint interpolate_color uses minclr.
+            clrs[values <= breakpoint_values[0]] = self.minclr
+            lut = numpy.empty((self.lut_size,), dtype=object)
+            lut[:] = hex_colors(clrs)
+            self._lut = lut
+            self._lut_key = key
+        return self._lut
+
+    def interpolate_colors(self, values):
+        """
+        Map a sequence of values to a list of hex colors in one pass, using
+        the nearest entry of the lookup table.  Values outside the scale get
+        the color of the nearest end, as for interpolate_color.
+        Raise ValueError for nan values, which have no color.
+        """
+        lut = self.lookup_table()
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        nans = numpy.isnan(values)
+        if nans.any():
+            raise ValueError("cannot color nan value at index %s" % numpy.flatnonzero(nans)[0])
+        scale = (len(lut) - 1) / float(self.maxvalue - self.minvalue)
+        indices = numpy.rint((values - self.minvalue) * scale)
+        indices = numpy.clip(indices, 0, len(lut) - 1).astype(numpy.int64)
+        return lut[indices].tolist()
+
 # Standard color choices.
 blue = clr(0,0,255)
 medBlue = clr(0,85,255)
@@ -0,0 +1,536 @@
+"""
+Array based storage for weighted directed graphs.
+
+CSRGraph has the public interface of dGraph.WGraph, but node names are
+interned to integer ids and edges are kept in numpy arrays sorted by
+(source id, target id) -- compressed sparse row order.  The edge_weights
+and node_weights attributes are dictionary-like views of the arrays, so
+existing code keeps working, while graph algorithms can use csr(), csc()
+and edge_arrays() to work on whole arrays at once.
+"""
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy
+
+from jp_gene_viz import dGraph
+
+# edge keys are source_id << KEY_SHIFT | target_id
+KEY_SHIFT = 32
+TARGET_MASK = (1 << KEY_SHIFT) - 1
+
+ID_DTYPE = numpy.int32
+
+
+def edge_key(source_id, target_id):
+    return (source_id << KEY_SHIFT) | target_id
+
+
+class EdgeWeightsView(MutableMapping):
+
+    """
+    Dictionary-like view of the edge weights of a CSRGraph, keyed by
+    (source_name, target_name).
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    @property
+    def revision(self):
+        "See dGraph.EdgeWeights.revision."
+        return self.graph._revision
+
+    def key(self, edge):
+        "The integer key for an edge, or None if a node is unknown."
+        ids = self.graph._ids
+        (f, t) = edge
+        f_id = ids.get(f)
+        t_id = ids.get(t)
+        if f_id is None or t_id is None:
+            return None
+        return edge_key(f_id, t_id)
+
+    def __getitem__(self, edge):
+        key = self.key(edge)
+        if key is not None:
+            weight = self.graph._get_edge(key)
+            if weight is not None:
+                return weight
+        raise KeyError(edge)
+
+    def __setitem__(self, edge, weight):
+        G = self.graph
+        (f, t) = edge
+        G._set_edge(edge_key(G._node_id(f), G._node_id(t)), weight)
+
+    def __delitem__(self, edge):
+        key = self.key(edge)
+        if key is None or not self.graph._delete_edge(key):
+            raise KeyError(edge)
+
+    def __contains__(self, edge):
+        key = self.key(edge)
+        return key is not None and self.graph._get_edge(key) is not None
+
+    def __len__(self):
+        return self.graph._nedges()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def targets(self, node):
+        "Nodes with an edge from node."
+        G = self.graph
+        node_id = G._ids.get(node)
+        if node_id is None:
+            return []
+        (indptr, targets, _) = G.csr()
+        return G.node_names(targets[indptr[node_id]:indptr[node_id + 1]])
+
+    def sources(self, node):
+        "Nodes with an edge to node."
+        G = self.graph
+        node_id = G._ids.get(node)
+        if node_id is None:
+            return []
+        (indptr, sources, _, _) = G.csc()
+        return G.node_names(sources[indptr[node_id]:indptr[node_id + 1]])
+
+    def edges_from(self, node):
+        return [(node, t) for t in self.targets(node)]
+
+    def edges_to(self, node):
+        return [(f, node) for f in self.sources(node)]
+
+    def keys(self):
+        (sources, targets, _) = self.graph.edge_arrays()
+        names = self.graph._name_array()
+        return list(zip(names[sources].tolist(), names[targets].tolist()))
+
+    def values(self):
+        return self.graph.edge_arrays()[2].tolist()
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class NodeWeightsView(MutableMapping):
+
+    """
+    Dictionary-like view of the node weights of a CSRGraph, keyed by node name.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, node):
+        G = self.graph
+        node_id = G._ids.get(node)
+        if node_id is None or not G._node_present[node_id]:
+            raise KeyError(node)
+        return float(G._node_w[node_id])
+
+    def __setitem__(self, node, weight):
+        G = self.graph
+        node_id = G._node_id(node)
+        G._node_w[node_id] = weight
+        G._node_present[node_id] = True
+
+    def __delitem__(self, node):
+        G = self.graph
+        node_id = G._ids.get(node)
+        if node_id is None or not G._node_present[node_id]:
+            raise KeyError(node)
+        G._node_present[node_id] = False
+
+    def __contains__(self, node):
+        G = self.graph
+        node_id = G._ids.get(node)
+        return node_id is not None and bool(G._node_present[node_id])
+
+    def __len__(self):
+        G = self.graph
+        return int(numpy.count_nonzero(G._node_present[:G._nnodes()]))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def present_ids(self):
+        G = self.graph
+        return numpy.flatnonzero(G._node_present[:G._nnodes()])
+
+    def keys(self):
+        return self.graph._name_array()[self.present_ids()].tolist()
+
+    def values(self):
+        return self.graph._node_w[self.present_ids()].tolist()
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class CSRGraph(dGraph.WGraph):
+
+    """
+    WGraph with interned node ids and edges in sorted numpy arrays.
+    Edges added one at a time are buffered and merged into the arrays
+    when array access or iteration needs them.
+    """
+
+    def __init__(self, node_color_interpolator=None, edge_color_interpolator=None):
+        self._names = []
+        self._ids = {}
+        self._node_w = numpy.zeros((0,), dtype=numpy.float64)
+        self._node_present = numpy.zeros((0,), dtype=bool)
+        self._clear_edges()
+        super(CSRGraph, self).__init__(node_color_interpolator, edge_color_interpolator)
+
+    def _clear_edges(self):
+        # sorted edge keys, their weights and which are not deleted.
+        self._keys = numpy.zeros((0,), dtype=numpy.int64)
+        self._w = numpy.zeros((0,), dtype=numpy.float64)
+        self._alive = numpy.zeros((0,), dtype=bool)
+        self._ndead = 0
+        # key -> weight for edges not yet merged into the arrays.
+        self._pending = {}
+        self._changed()
+
+    def _changed(self):
+        self._revision = next(dGraph.REVISIONS)
+        self._csr = self._csc = None
+        self._node_to_descendents = None
+
+    # node storage
+
+    def _nnodes(self):
+        return len(self._names)
+
+    def _name_array(self):
+        result = numpy.empty((len(self._names),), dtype=object)
+        result[:] = self._names
+        return result
+
+    def _node_id(self, name):
+        "Intern a node name."
+        node_id = self._ids.get(name)
+        if node_id is None:
+            node_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._reserve_nodes(len(self._names))
+        return node_id
+
+    def _node_ids(self, names):
+        "Intern a sequence of node names.  Return an array of ids."
+        get = self._ids.get
+        result = numpy.array([get(name, -1) for name in names], dtype=numpy.int64)
+        for index in numpy.flatnonzero(result < 0).tolist():
+            result[index] = self._node_id(names[index])
+        return result
+
+    def _reserve_nodes(self, count):
+        capacity = len(self._node_w)
+        if count > capacity:
+            capacity = max(count, 2 * capacity, 16)
+            node_w = numpy.zeros((capacity,), dtype=numpy.float64)
+            node_w[:len(self._node_w)] = self._node_w
+            present = numpy.zeros((capacity,), dtype=bool)
+            present[:len(self._node_present)] = self._node_present
+            self._node_w = node_w
+            self._node_present = present
+
+    # edge storage
+
+    def _find(self, key):
+        "Position of a live merged edge key, or None."
+        keys = self._keys
+        position = int(numpy.searchsorted(keys, key))
+        if position < len(keys) and keys[position] == key and self._alive[position]:
+            return position
+        return None
+
+    def _get_edge(self, key):
+        weight = self._pending.get(key)
+        if weight is None:
+            position = self._find(key)
+            if position is not None:
+                weight = float(self._w[position])
+        return weight
+
+    def _set_edge(self, key, weight):
+        position = self._find(key)
+        if position is not None:
+            self._w[position] = weight
+        else:
+            self._pending[key] = weight
+        self._changed()
+
+    def _delete_edge(self, key):
+        if key in self._pending:
+            del self._pending[key]
+        else:
+            position = self._find(key)
+            if position is None:
+                return False
+            self._alive[position] = False
+            self._ndead += 1
+        self._changed()
+        return True
+
+    def _nedges(self):
+        return len(self._keys) - self._ndead + len(self._pending)
+
+    def _compact(self):
+        "Merge pending edges into the sorted arrays and drop deleted edges."
+        if not self._pending and not self._ndead:
+            return
+        keys = self._keys[self._alive]
+        weights = self._w[self._alive]
+        if self._pending:
+            pending_keys = numpy.array(list(self._pending.keys()), dtype=numpy.int64)
+            pending_weights = numpy.array(list(self._pending.values()), dtype=numpy.float64)
+            keys = numpy.concatenate([keys, pending_keys])
+            weights = numpy.concatenate([weights, pending_weights])
+            order = numpy.argsort(keys, kind="mergesort")
+            keys = keys[order]
+            weights = weights[order]
+        self._keys = keys
+        self._w = weights
+        self._alive = numpy.ones(keys.shape, dtype=bool)
+        self._ndead = 0
+        self._pending = {}
+
+    def _add_edges(self, sources, targets, weights):
+        """
+        Add edges given as arrays of node ids.  Same rules as add_edge:
+        self edges are ignored, later weights replace earlier ones and every
+        added edge adds its absolute weight to both of its nodes.
+        """
+        self._changed()
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        keep = sources != targets
+        sources = sources[keep]
+        targets = targets[keep]
+        weights = weights[keep]
+        if not len(sources):
+            return
+        self._compact()
+        keys = numpy.concatenate([self._keys, edge_key(sources, targets)])
+        all_weights = numpy.concatenate([self._w, weights])
+        order = numpy.argsort(keys, kind="mergesort")
+        keys = keys[order]
+        all_weights = all_weights[order]
+        # keep the last weight given for each edge
+        last = numpy.append(keys[1:] != keys[:-1], True)
+        self._keys = keys[last]
+        self._w = all_weights[last]
+        self._alive = numpy.ones(self._keys.shape, dtype=bool)
+        nnodes = self._nnodes()
+        # interleaved, to add in the same order as add_edge
+        ends = numpy.column_stack([sources, targets]).ravel()
+        a = numpy.repeat(numpy.abs(weights), 2)
+        totals = numpy.bincount(ends, a, minlength=nnodes)
+        touched = numpy.bincount(ends, minlength=nnodes) > 0
+        node_w = self._node_w[:nnodes]
+        present = self._node_present[:nnodes]
+        node_w[touched & ~present] = 0
+        node_w += totals
+        present |= touched
+
+    # arrays for graph algorithms
+
+    def node_ids(self, names):
+        "Array of ids for node names (interning unknown names)."
+        return self._node_ids(list(names))
+
+    def node_names(self, ids):
+        "List of node names for an array of ids."
+        return self._name_array()[numpy.asarray(ids, dtype=numpy.int64)].tolist()
+
+    def graph_arrays(self):
+        (sources, targets, weights) = self.edge_arrays()
+        return (list(self._names), sources, targets, weights)
+
+    def edge_arrays(self):
+        "(source ids, target ids, weights) for all edges in CSR order."
+        self._compact()
+        keys = self._keys
+        return ((keys >> KEY_SHIFT).astype(ID_DTYPE),
+                (keys & TARGET_MASK).astype(ID_DTYPE),
+                self._w)
+
+    def node_weight_array(self):
+        "Node weights by id (0 for ids with no weight)."
+        nnodes = self._nnodes()
+        return numpy.where(self._node_present[:nnodes], self._node_w[:nnodes], 0.0)
+
+    def csr(self):
+        """
+        Out-adjacency (indptr, target ids, weights): the edges from node id i are
+        at positions indptr[i]:indptr[i+1].
+        """
+        result = self._csr
+        if result is None:
+            (sources, targets, weights) = self.edge_arrays()
+            indptr = numpy.zeros((self._nnodes() + 1,), dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(sources, minlength=self._nnodes()), out=indptr[1:])
+            result = self._csr = (indptr, targets, weights)
+        return result
+
+    def csc(self):
+        """
+        In-adjacency (indptr, source ids, weights, positions): the edges into
+        node id i are at indptr[i]:indptr[i+1] and positions gives the
+        corresponding positions in CSR order.
+        """
+        result = self._csc
+        if result is None:
+            (sources, targets, weights) = self.edge_arrays()
+            positions = numpy.argsort(targets, kind="mergesort")
+            indptr = numpy.zeros((self._nnodes() + 1,), dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(targets, minlength=self._nnodes()), out=indptr[1:])
+            result = self._csc = (indptr, sources[positions], weights[positions], positions)
+        return result
+
+    # dictionary views
+
+    def get_edge_weights(self):
+        return EdgeWeightsView(self)
+
+    def set_edge_weights(self, adict):
+        self._clear_edges()
+        if adict:
+            edges = list(adict.keys())
+            sources = self._node_ids([f for (f, t) in edges])
+            targets = self._node_ids([t for (f, t) in edges])
+            weights = numpy.array([adict[e] for e in edges], dtype=numpy.float64)
+            keys = edge_key(sources, targets)
+            order = numpy.argsort(keys, kind="mergesort")
+            self._keys = keys[order]
+            self._w = weights[order]
+            self._alive = numpy.ones(self._keys.shape, dtype=bool)
+
+    edge_weights = property(get_edge_weights, set_edge_weights)
+
+    def get_node_weights(self):
+        return NodeWeightsView(self)
+
+    def set_node_weights(self, adict):
+        self._node_present[:] = False
+        for node in adict:
+            node_id = self._node_id(node)
+            self._node_w[node_id] = adict[node]
+            self._node_present[node_id] = True
+
+    node_weights = property(get_node_weights, set_node_weights)
+
+    # WGraph methods using the arrays
+
+    def same_colors(self):
+        return CSRGraph(self._node_color_interpolator, self._edge_color_interpolator)
+
+    def clone(self):
+        result = CSRGraph()
+        self._compact()
+        result._names = list(self._names)
+        result._ids = self._ids.copy()
+        result._node_w = self._node_w.copy()
+        result._node_present = self._node_present.copy()
+        result._keys = self._keys.copy()
+        result._w = self._w.copy()
+        result._alive = self._alive.copy()
+        result.node_radius = self.node_radius.copy()
+        # share edge attributes for now
+        result.edge_attributes = self.edge_attributes
+        result.reset_colorization(self)
+        return result
+
+    def add_edge(self, from_node, to_node, weight, attributes=None):
+        if from_node == to_node:
+            return
+        if attributes is None:
+            attributes = {}
+        f_id = self._node_id(from_node)
+        t_id = self._node_id(to_node)
+        self._set_edge(edge_key(f_id, t_id), weight)
+        self.edge_attributes.update_edge((from_node, to_node), attributes)
+        a = abs(weight)
+        for node_id in (f_id, t_id):
+            if self._node_present[node_id]:
+                self._node_w[node_id] += a
+            else:
+                self._node_w[node_id] = a
+                self._node_present[node_id] = True
+
+    def add_edge_rows(self, headers, rows, weights):
+        rows = [row for row in rows]
+        sources = self._node_ids([row[0] for row in rows])
+        targets = self._node_ids([row[1] for row in rows])
+        self._add_edges(sources, targets, weights)
+        kept = [row for row in rows if row[0] != row[1]]
+        edges = [(row[0], row[1]) for row in kept]
+        self.edge_attributes.append_rows(edges, headers, kept)
+
+    def add_edge_arrays(self, names, sources, targets, weights):
+        ids = self._node_ids(list(names))
+        self._add_edges(ids[numpy.asarray(sources)], ids[numpy.asarray(targets)], weights)
+
+    def neighbors_dict(self):
+        (sources, targets, _) = self.edge_arrays()
+        names = self._name_array()
+        result = {}
+        for (a, b) in zip(names[sources].tolist(), names[targets].tolist()):
+            result.setdefault(a, set()).add(b)
+            result.setdefault(b, set()).add(a)
+        return result
+
+    def get_node_to_descendants(self):
+        result = self._node_to_descendents
+        if result is None:
+            (indptr, targets, _) = self.csr()
+            names = self._name_array()
+            result = {}
+            for node_id in numpy.flatnonzero(indptr[1:] > indptr[:-1]).tolist():
+                result[self._names[node_id]] = set(names[targets[indptr[node_id]:indptr[node_id + 1]]].tolist())
+            self._node_to_descendents = result
+        return result
+
+    def weights_extrema(self):
+        (_, _, ew) = self.edge_arrays()
+        nw = self._node_w[:self._nnodes()][self._node_present[:self._nnodes()]]
+        mn = Mn = me = Me = 0
+        if len(ew):
+            me = float(numpy.min(ew))
+            Me = float(numpy.max(ew))
+        if len(nw):
+            mn = float(numpy.min(nw))
+            Mn = float(numpy.max(nw))
+        return (Me, me, Mn, mn)
+
+
+def from_wgraph(G):
+    "Copy a WGraph into a CSRGraph (sharing edge attributes)."
+    result = CSRGraph()
+    result.edge_weights = G.edge_weights
+    result.node_weights = G.node_weights
+    result.node_radius = G.node_radius.copy()
+    result.edge_attributes = G.edge_attributes
+    result.reset_colorization(G)
+    return result
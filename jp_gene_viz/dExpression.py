@@ -5,10 +5,9 @@ from IPython.display import display
 from jp_svg_canvas import canvas
 from jp_gene_viz.widget_utils import set_visibility, is_visible
 import traitlets
-import fnmatch
 from jp_gene_viz import color_scale
 from jp_gene_viz import color_widget
-from jp_gene_viz import getData
+from jp_gene_viz import name_index
 from jp_svg_canvas.canvas import load_javascript_support
 from jp_gene_viz import array_transforms
 
@@ -59,12 +58,15 @@ class ExpressionDisplay(traitlets.HasTraits):
         self.dx = 10
         self.dy = 2
         self.data_heat_map = None
+        self.row_index = self.column_index = None
         self.display_heat_map = None
         self.row = self.col = None
         self.drawing = False
 
     def load_data(self, heat_map, side_length=None):
         self.data_heat_map = heat_map
+        self.row_index = name_index.NameIndex(heat_map.row_names)
+        self.column_index = name_index.NameIndex(heat_map.col_names)
         # project to at most 200 rows and columns
         rows = heat_map.row_names[:200]
         cols = heat_map.col_names[:200]
@@ -73,16 +75,15 @@ class ExpressionDisplay(traitlets.HasTraits):
         self.display_data(rows, cols, side_length)
 
     def display_data(self, rows, cols, side_length=None):
-        (data_rows, data_cols, data) = self.data_heat_map.get_data()
         if side_length is None:
             side_length = self.side_length
         if rows is not None:
-            rows = getData.caseless_intersection_list(rows, data_rows, use_left=False)
+            rows = self.row_index.lookup(rows)
             self.rows = rows
         else:
             rows = self.rows
         if cols is not None:
-            cols = getData.caseless_intersection_list(cols, data_cols, use_left=False)
+            cols = self.column_index.lookup(cols)
         heat_map = self.display_heat_map = self.data_heat_map.projection(rows, cols)
         (self.dx, self.dy) = heat_map.fit(self.svg, side_length, self.labels_space)
         self.row = self.col = None
@@ -177,28 +178,20 @@ class ExpressionDisplay(traitlets.HasTraits):
         self.info_area.value = "\t".join(genes)
 
     def genes_click(self, b=None):
-        patterns = [x.lower() for x in self.genes_text.value.lower().split()]
-        row_set = set()
-        rows = [x.lower() for x in self.data_heat_map.row_names]
-        for pattern in patterns:
-            row_set.update(fnmatch.filter(rows, pattern))
-        if not row_set:
+        rows = self.row_index.glob(self.genes_text.value.split())
+        if not rows:
             self.info_area.value = "No rows selected"
         else:
-            rows = sorted(row_set)[:200]
+            rows = rows[:200]
             columns = self.display_heat_map.col_names
             self.display_data(rows, columns)
 
     def match_click(self, b=None):
-        patterns = [x.lower() for x in self.match_text.value.split()]
-        column_set = set()
-        columns = [x.lower() for x in self.data_heat_map.col_names]
-        for pattern in patterns:
-            column_set.update(fnmatch.filter(columns, pattern))
-        if not column_set:
+        columns = self.column_index.glob(self.match_text.value.split())
+        if not columns:
             self.info_area.value = "No columns selected."
         else:
-            columns = sorted(column_set)[:200]
+            columns = columns[:200]
             rows = self.display_heat_map.row_names
             self.display_data(rows, columns)
 
@@ -274,7 +267,7 @@ class ExpressionDisplay(traitlets.HasTraits):
 def display_heat_map(filename, dexpr=None, side_length=550, show=False):
     from jp_gene_viz import getData
     H = HMap.HeatMap()
-    (r, c, d) = getData.read_tsv(filename)
+    (r, c, d) = getData.read_matrix(filename)
     H.set_data(r, c, d)
     if dexpr is None:
         dexpr = ExpressionDisplay()
@@ -1,63 +1,151 @@
 import numpy
+import scipy.sparse
 import heapq
+import itertools
 import json
 
 from jp_gene_viz.color_scale import (clr, clr_check, weighted_color, color)
 from jp_gene_viz import color_scale
 from jp_gene_viz.json_mixin import JsonMixin
 from jp_gene_viz import grid_forest
+from jp_gene_viz.edge_attributes import EdgeAttributeStore, Interner, intern_all
 from jp_svg_canvas import canvas as svg_canvas
 
 
+def adjacency_matrix(G):
+    """
+    (names, A) where A is the sparse n x n matrix with A[i, j] = 1 for each
+    edge from names[i] to names[j].
+    """
+    (names, sources, targets, weights) = G.graph_arrays()
+    n = len(names)
+    A = scipy.sparse.csr_matrix(
+        (numpy.ones((len(sources),), dtype=numpy.int32), (sources, targets)), shape=(n, n))
+    return (names, A)
+
+
+def reachable_sets(G, seeds, level=None):
+    """
+    For each seed node, the frozenset of nodes reachable from it (including
+    itself) in at most level steps, or any number of steps if level is None.
+    All seeds advance together, one sparse matrix product per step.
+    """
+    (names, A) = adjacency_matrix(G)
+    ids = dict((name, i) for (i, name) in enumerate(names))
+    seeds = list(seeds)
+    result = {}
+    known = [s for s in seeds if s in ids]
+    for s in seeds:
+        if s not in ids:
+            result[s] = frozenset([s])
+    if not known:
+        return result
+    n = len(names)
+    k = len(known)
+    # column j holds the nodes reached from seed j.
+    reached = scipy.sparse.csr_matrix(
+        (numpy.ones((k,), dtype=numpy.int32), ([ids[s] for s in known], numpy.arange(k))),
+        shape=(n, k))
+    frontier = reached
+    AT = A.T.tocsr()
+    steps = 0
+    while level is None or steps < level:
+        step = AT.dot(frontier)
+        step.data[:] = 1
+        # keep only nodes not reached before
+        step = step - step.multiply(reached)
+        step.eliminate_zeros()
+        if step.nnz == 0:
+            break
+        reached = reached + step
+        frontier = step
+        steps += 1
+    reached = reached.tocsc()
+    reached.sort_indices()
+    for (j, s) in enumerate(known):
+        node_ids = reached.indices[reached.indptr[j]:reached.indptr[j + 1]]
+        result[s] = frozenset(names[i] for i in node_ids.tolist())
+    return result
+
+
 def trim_leaves(Gin):
+    "Copy of Gin without the edges whose target is not also a source."
     #Gout = WGraph()
     Gout = Gin.same_colors()
-    ew = Gin.edge_weights
-    sources = set([a for (a,b) in ew])
-    for e in ew:
-        (a,b) = e
-        if a in sources and b in sources:
-            w = ew[e]
-            Gout.add_edge(a, b, w)
+    (names, sources, targets, weights) = Gin.graph_arrays()
+    is_source = numpy.zeros((len(names),), dtype=bool)
+    is_source[sources] = True
+    keep = is_source[targets]
+    Gout.add_edge_arrays(names, sources[keep], targets[keep], weights[keep])
+    # record (empty) attributes for the edges as add_edge does.
+    edges = [(names[f], names[t]) for (f, t) in zip(sources[keep].tolist(), targets[keep].tolist())]
+    Gout.edge_attributes.append_rows(edges, [], [()] * len(edges))
     return Gout
 
 
+def strongest_influencers(names, sources, targets, weights):
+    """
+    For every node of the edge arrays find the edge end at the other side of
+    its largest |weight| edge in either direction (the earliest edge on ties).
+    Return (nodes, influencers, influences): node ids in order of first
+    appearance and, indexed by node id, the influencer id and the weight.
+    """
+    nnodes = len(names)
+    # both directions of every edge, in edge order: edge k gives
+    # entry 2k (target influenced by source) and 2k+1 (the reverse).
+    influencer_ids = numpy.column_stack([sources, targets]).ravel()
+    influenced_ids = numpy.column_stack([targets, sources]).ravel()
+    both = numpy.repeat(numpy.asarray(weights, dtype=numpy.float64), 2)
+    influencers = numpy.zeros((nnodes,), dtype=numpy.int64)
+    influences = numpy.zeros((nnodes,), dtype=numpy.float64)
+    if not len(both):
+        return (numpy.zeros((0,), dtype=numpy.int64), influencers, influences)
+    # segment argmax: in a stable sort by decreasing |w| the first entry for
+    # each influenced node is its largest |w| entry, earliest on ties.
+    order = numpy.argsort(-numpy.abs(both), kind="mergesort")
+    (_, first) = numpy.unique(influenced_ids[order], return_index=True)
+    chosen = order[first]
+    influencers[influenced_ids[chosen]] = influencer_ids[chosen]
+    influences[influenced_ids[chosen]] = both[chosen]
+    (nodes, first) = numpy.unique(influenced_ids, return_index=True)
+    nodes = nodes[numpy.argsort(first)]
+    return (nodes, influencers, influences)
+
+
 def primary_influence(Gin, connect=False, connect_weight=1):
     #Gout = WGraph()
     Gout = Gin.same_colors()
     nw = Gin.node_weights
-    ew = Gin.edge_weights
-    influences = {}
-    influencers = {}
-    for e in ew:
-        w = ew[e]
-        (f, t) = e
-        for (a,b) in ((f,t), (t,f)):
-            influence = influences.get(b)
-            if influence is None or abs(influence) < abs(w):
-                influences[b] = w
-                influencers[b] = a
-    for a in influences:
-        b = influencers[a]
-        w = influences[b]
-        Gout.add_edge(b, a, w)
+    (names, sources, targets, weights) = Gin.graph_arrays()
+    (nodes, influencers, influences) = strongest_influencers(names, sources, targets, weights)
+    # edge from each node's influencer, weighted by the influence recorded
+    # for the influencer itself, as always done here.
+    out_sources = [influencers[nodes]]
+    out_targets = [nodes]
+    out_weights = [influences[influencers[nodes]]]
     if connect:
         influenced = {}
-        for a in influences:
-            b = influencers[a]
+        for (a, b) in zip(nodes.tolist(), influencers[nodes].tolist()):
             bset = influenced.setdefault(b, set())
             bset.add(a)
+        ring_sources = []
+        ring_targets = []
         for bset in influenced.values():
             if len(bset) > 1:
-                blist = sorted(bset)
-                last = first = None
-                for current in blist:
-                    if first is None:
-                        last = first = current
-                    else:
-                        Gout.add_edge(last, current, connect_weight)
-                        last = current
-                Gout.add_edge(last, first, connect_weight)
+                # ring through the influenced nodes in name order
+                blist = sorted(bset, key=names.__getitem__)
+                ring_sources.extend(blist)
+                ring_targets.extend(blist[1:] + blist[:1])
+        out_sources.append(numpy.array(ring_sources, dtype=numpy.int64))
+        out_targets.append(numpy.array(ring_targets, dtype=numpy.int64))
+        out_weights.append(numpy.repeat(float(connect_weight), len(ring_sources)))
+    out_sources = numpy.concatenate(out_sources)
+    out_targets = numpy.concatenate(out_targets)
+    # later edges replace earlier ones, as with add_edge.
+    Gout.add_edge_arrays(names, out_sources, out_targets, numpy.concatenate(out_weights))
+    # record (empty) attributes for the edges as add_edge does.
+    edges = [(names[f], names[t]) for (f, t) in zip(out_sources.tolist(), out_targets.tolist()) if f != t]
+    Gout.edge_attributes.append_rows(edges, [], [()] * len(edges))
     # preserve all nodes
     Gout.node_weights = nw.copy()
     return Gout
@@ -66,7 +154,44 @@ def primary_influence(Gin, connect=False, connect_weight=1):
 
 def skeleton(Gin):
     """
-    Maximal spanning forest of Gin (?)
+    Maximal spanning forest of Gin by absolute edge weight (Kruskal).
+    Edges keep their direction and signed weight; all nodes of Gin are kept.
+    """
+    (names, sources, targets, weights) = Gin.graph_arrays()
+    Gout = WGraph()
+    # preserve all nodes.
+    Gout.node_weights = Gin.node_weights.copy()
+    # heaviest edges first; stable so ties keep graph order.
+    order = numpy.argsort(-numpy.abs(weights), kind="mergesort")
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            # path halving
+            parent[i] = i = parent[parent[i]]
+        return i
+
+    sources = sources[order].tolist()
+    targets = targets[order].tolist()
+    weights = weights[order].tolist()
+    # a forest has fewer edges than nodes.
+    remaining = len(names) - 1
+    for (a, b, w) in zip(sources, targets, weights):
+        if remaining <= 0:
+            break
+        ra = find(a)
+        rb = find(b)
+        if ra != rb:
+            parent[ra] = rb
+            Gout.add_edge(names[a], names[b], w)
+            remaining -= 1
+    return Gout
+
+
+def skeleton_heap(Gin):
+    """
+    Heap based maximal spanning forest of Gin (?)
+    Previous implementation of skeleton, kept for comparison.
     """
     visited_edges = set()
     ew = Gin.edge_weights
@@ -85,7 +210,7 @@ def skeleton(Gin):
         (weight, next_edge) = edges.pop()
         (a, b) = next_edge
         if a not in added or b not in added:
-            H = [(-weight, weight, e)]
+            H = [(-weight, weight, next_edge)]
             #Gout.add_edge(a, b, ew[next_e])
             while H:
                 #print "H", H
@@ -108,6 +233,26 @@ def skeleton(Gin):
     return Gout
 
 
+def skeleton_benchmark(G, repeat=3):
+    """
+    Compare skeleton against skeleton_heap on G.
+    Return the best times in seconds and the total absolute edge weight of each result.
+    """
+    import time
+    result = {}
+    for function in (skeleton_heap, skeleton):
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            Gk = function(G)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        total = sum(abs(w) for w in Gk.edge_weights.values())
+        result[function.__name__] = (best, total)
+    return result
+
+
 class edgeDictConverter(object):
 
     @staticmethod
@@ -119,17 +264,158 @@ class edgeDictConverter(object):
         return dict((tuple(key), value) for (key, value) in alist)
 
 
+# source of EdgeWeights.revision numbers
+REVISIONS = itertools.count(1)
+
+
+class EdgeWeights(dict):
+
+    """
+    Dictionary of (from_node, to_node) -> weight which can find the edges
+    into or out of a node without scanning all edges.  The per node index
+    is built on the first such query and kept up to date as edges are
+    added or removed afterwards.
+    """
+
+    # node -> set of targets, node -> set of sources, or None if not built
+    _out = _in = None
+    # incremented whenever the set of edges changes
+    version = 0
+    # changed whenever an edge or weight changes, never shared by two
+    # different contents: caches of derived data can be keyed on it.
+    revision = 0
+
+    def __init__(self, *args, **kw):
+        dict.__init__(self)
+        self.update(*args, **kw)
+
+    def build_index(self):
+        out_index = {}
+        in_index = {}
+        for (f, t) in dict.keys(self):
+            out_index.setdefault(f, set()).add(t)
+            in_index.setdefault(t, set()).add(f)
+        self._out = out_index
+        self._in = in_index
+
+    def _link(self, edge):
+        (f, t) = edge
+        self._out.setdefault(f, set()).add(t)
+        self._in.setdefault(t, set()).add(f)
+
+    def _unlink(self, edge):
+        (f, t) = edge
+        for (index, a, b) in ((self._out, f, t), (self._in, t, f)):
+            nodes = index[a]
+            nodes.discard(b)
+            if not nodes:
+                del index[a]
+
+    def _changed(self, added=(), removed=(), reindex=False):
+        """
+        Bookkeeping after every change: count changes to the set of edges,
+        take a new revision and keep the index (if built) up to date, or
+        drop it if reindex is true.
+        """
+        if added or removed or reindex:
+            self.version += 1
+        self.revision = next(REVISIONS)
+        if self._out is not None:
+            if reindex:
+                self._out = self._in = None
+                return
+            for edge in added:
+                self._link(edge)
+            for edge in removed:
+                self._unlink(edge)
+
+    def __setitem__(self, edge, weight):
+        added = () if edge in self else (edge,)
+        dict.__setitem__(self, edge, weight)
+        self._changed(added)
+
+    def __delitem__(self, edge):
+        dict.__delitem__(self, edge)
+        self._changed(removed=(edge,))
+
+    def update(self, *args, **kw):
+        if self._out is None:
+            dict.update(self, *args, **kw)
+            self._changed(reindex=True)
+        else:
+            items = dict(*args, **kw)
+            added = [edge for edge in items if edge not in self]
+            dict.update(self, items)
+            self._changed(added)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    @classmethod
+    def fromkeys(cls, edges, weight=None):
+        return cls((edge, weight) for edge in edges)
+
+    def setdefault(self, edge, weight=None):
+        if edge not in self:
+            self[edge] = weight
+        return dict.__getitem__(self, edge)
+
+    def pop(self, edge, *default):
+        present = edge in self
+        result = dict.pop(self, edge, *default)
+        if present:
+            self._changed(removed=(edge,))
+        return result
+
+    def popitem(self):
+        (edge, weight) = dict.popitem(self)
+        self._changed(removed=(edge,))
+        return (edge, weight)
+
+    def clear(self):
+        dict.clear(self)
+        self._changed(reindex=True)
+
+    def copy(self):
+        return EdgeWeights(self)
+
+    def targets(self, node):
+        "Set of nodes with an edge from node (do not modify)."
+        if self._out is None:
+            self.build_index()
+        return self._out.get(node, ())
+
+    def sources(self, node):
+        "Set of nodes with an edge to node (do not modify)."
+        if self._in is None:
+            self.build_index()
+        return self._in.get(node, ())
+
+    def edges_from(self, node):
+        return [(node, t) for t in self.targets(node)]
+
+    def edges_to(self, node):
+        return [(f, node) for f in self.sources(node)]
+
+
 class WGraph(JsonMixin):
 
     arrow_ratio = 0.75  # how far down an arc to position an arrowhead mark
-    
+
+    # maximum number of (node, level) results remembered by descendant_set
+    reachable_cache_size = 1000
+    # edge_weights.version when the descendants map was built
+    _descendants_version = None
+
     def __init__(self, node_color_interpolator=None, edge_color_interpolator=None):
-        self.edge_weights = {}
+        self.edge_weights = EdgeWeights()
         self.node_weights = {}
         self.node_radius = {}
-        self.edge_attributes = {}
+        self.edge_attributes = EdgeAttributeStore()
         # populate on demand
         self._node_to_descendents = None
+        self._reachable_cache = None
         self._edge_color_interpolator = edge_color_interpolator
         self._node_color_interpolator = node_color_interpolator
 
@@ -139,22 +425,44 @@ class WGraph(JsonMixin):
     json_atts = ["node_weights"]
     json_objects = {
         "edge_weights": edgeDictConverter,
-        "edge_attributes": edgeDictConverter,
+        "edge_attributes": EdgeAttributeStore,
         "_node_color_interpolator": color_scale.ColorInterpolator, 
         "_edge_color_interpolator": color_scale.ColorInterpolator,
         }
 
+    def to_json_value(self):
+        result = super(WGraph, self).to_json_value()
+        # node_weights may be a dictionary-like view.
+        if not isinstance(result["node_weights"], dict):
+            result["node_weights"] = dict(result["node_weights"].items())
+        return result
+
+    def get_edge_weights(self):
+        return self._edge_weights
+
+    def set_edge_weights(self, adict):
+        if not isinstance(adict, EdgeWeights):
+            adict = EdgeWeights(adict)
+        self._edge_weights = adict
+        self._node_to_descendents = None
+
+    edge_weights = property(get_edge_weights, set_edge_weights)
+
     def uncache(self):
         "clear all caching data structures (for safety)."
         self._node_to_descendents = None
+        self._reachable_cache = None
 
     def get_node_to_descendants(self):
         result = self._node_to_descendents
-        if result is None:
+        ew = self.edge_weights
+        # also rebuild if edges were changed directly in edge_weights.
+        if result is None or self._descendants_version != ew.version:
             result = {}
-            for (f, t) in self.edge_weights.keys():
+            for (f, t) in ew.keys():
                 result.setdefault(f, set()).add(t)
             self._node_to_descendents = result
+            self._descendants_version = ew.version
         return result
 
     def clone(self):
@@ -201,13 +509,82 @@ class WGraph(JsonMixin):
         # add the edge
         e[edge] = weight
         # extend or add attributes
-        atts = self.edge_attributes.get(edge, {})
-        atts.update(attributes)
-        self.edge_attributes[edge] = atts
+        self.edge_attributes.update_edge(edge, attributes)
         a = abs(weight)
         for node in edge:
             n[node] = n.get(node, 0) + a
-            
+
+    def add_edge_rows(self, headers, rows, weights):
+        """
+        Add many edges at once from rows of TSV columns.  row[0] and row[1]
+        name the source and target of each edge and the whole row is recorded
+        as its attributes.  Same rules as add_edge otherwise.
+        """
+        self._node_to_descendents = None
+        e = self.edge_weights
+        n = self.node_weights
+        edges = []
+        kept = []
+        for (row, weight) in zip(rows, weights):
+            (from_node, to_node) = row[:2]
+            # ignore self edges (?)
+            if from_node == to_node:
+                continue
+            edge = (from_node, to_node)
+            e[edge] = weight
+            a = abs(weight)
+            n[from_node] = n.get(from_node, 0) + a
+            n[to_node] = n.get(to_node, 0) + a
+            edges.append(edge)
+            kept.append(row)
+        self.edge_attributes.append_rows(edges, headers, kept)
+
+    def graph_arrays(self):
+        """
+        (names, sources, targets, weights) for the edges, where names[i] is
+        the node with id i.  Nodes without edges are included.
+        """
+        interner = Interner()
+        intern_all(interner, list(self.node_weights))
+        ew = self.edge_weights
+        edges = list(ew.keys())
+        sources = intern_all(interner, [f for (f, t) in edges])
+        targets = intern_all(interner, [t for (f, t) in edges])
+        # values() is in the same order as keys() for an unchanged dictionary.
+        weights = numpy.array(list(ew.values()), dtype=numpy.float64)
+        return (interner.values, sources, targets, weights)
+
+    def add_edge_arrays(self, names, sources, targets, weights):
+        """
+        Add many edges at once from parallel arrays of interned node ids.
+        names[i] is the name of node id i; sources, targets and weights
+        are equal length arrays.  Weights and node weights follow the
+        same rules as add_edge, but no per-edge attributes are recorded.
+        """
+        self._node_to_descendents = None
+        names = numpy.asarray(names, dtype=object)
+        sources = numpy.asarray(sources)
+        targets = numpy.asarray(targets)
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        # ignore self edges (?)
+        keep = sources != targets
+        sources = sources[keep]
+        targets = targets[keep]
+        weights = weights[keep]
+        edges = zip(names[sources].tolist(), names[targets].tolist())
+        self.edge_weights.update(zip(edges, weights.tolist()))
+        # accumulate absolute weights at both ends of every edge
+        # (interleaved, to add in the same order as add_edge)
+        nnames = len(names)
+        ends = numpy.column_stack([sources, targets]).ravel()
+        a = numpy.repeat(numpy.abs(weights), 2)
+        totals = numpy.bincount(ends, a, minlength=nnames)
+        touched = numpy.bincount(ends, minlength=nnames) > 0
+        n = self.node_weights
+        for index in numpy.flatnonzero(touched):
+            node = names[index]
+            n[node] = n.get(node, 0) + float(totals[index])
+
     def weights_extrema(self):
         ew = self.edge_weights.values()
         nw = self.node_weights.values()
@@ -279,95 +656,75 @@ class WGraph(JsonMixin):
         ew = self.edge_weights
         ea = self.edge_attributes
         # only layout positioned edges
-        pos_e = [(abs(ew[e]), e) 
-                 for e in ew if e[0] in positions and e[1] in positions]
+        pos_e = [(abs(w), e, w)
+                 for (e, w) in ew.items() if e[0] in positions and e[1] in positions]
         # "heavier" edges on top
         pos_e.sort()
         #print ("pos_e", pos_e)
         #markradius = (edgewidth+1)/2
         outdegree = {}
         eci = self.get_edge_color_interpolator()
-        arrow_ratio = self.arrow_ratio
-        for (absw, e) in pos_e:
-            w = ew[e]
-            a = ea[e] or {}
+        # compute all line and arrow mark coordinates at once
+        edges = [e for (absw, e, w) in pos_e]
+        weights = [w for (absw, e, w) in pos_e]
+        (lines, marks) = edge_geometry(
+            [positions[f] for (f, t) in edges], [positions[t] for (f, t) in edges],
+            weights, edgewidth, self.arrow_ratio)
+        # only materialize edge attributes if some of them style strokes
+        stroke_attributes = [att for att in svg_canvas.STROKE_ATTRIBUTES if att in ea.columns]
+        a = {}
+        edge_colors = eci.interpolate_colors(weights)
+        for (e, line, mark, ecolor) in zip(edges, lines.tolist(), marks.tolist(), edge_colors):
+            if stroke_attributes:
+                a = ea.get(e) or {}
             (f, t) = e
             name = self.edge_name(f, t)  # "EDGE_" + json.dumps([f,t])
             edge_overrides = styling_overrides.get_overrides(name)
             other_atts = {}
-            for att in svg_canvas.STROKE_ATTRIBUTES:
-                value = edge_overrides.get(att) or a.get(att)
-                if value and str(value).upper()!="NONE":
-                    other_atts[att] = value
+            if edge_overrides or a:
+                for att in svg_canvas.STROKE_ATTRIBUTES:
+                    value = edge_overrides.get(att) or a.get(att)
+                    if value and str(value).upper()!="NONE":
+                        other_atts[att] = value
             outdegree[f] = outdegree.get(f, 0) + 1
-            fp = positions[f]
-            tp = positions[t]
-            n = towards(fp, tp)
-            d = distance(fp, tp)
-            no = orthogonal(n)
-            # shift positions so reverse edges don't overlap
-            edgeshift = (edgewidth/2.0) * no
-            # don't modify arrays in place
-            fp = fp + edgeshift
-            tp = tp + edgeshift
-            #ecolor = self.edge_color(w, me, Me)
-            ecolor = eci.interpolate_color(w)
-            #name = self.edge_name(f, t)  # "EDGE_" + json.dumps([f,t])
-            #ecolor = color_overrides.get(name, ecolor)
             ecolor = edge_overrides.get("color", ecolor)
-            canvas.line(name, fp[0], fp[1], tp[0], tp[1], ecolor, edgewidth, **other_atts)
+            canvas.line(name, line[0], line[1], line[2], line[3], ecolor, edgewidth, **other_atts)
             # add a mark to indicate target
-            #p = tp - (2 * nodesize) * n
-            p = fp + arrow_ratio * (tp - fp)
             markname = "mark" + name
-            if w>0:
-                m = p - edgewidth * 5 * (n + no)
-                canvas.line(markname, p[0], p[1], m[0], m[1], ecolor, edgewidth, **other_atts)
-                #canvas.circle(None, m[0], m[1], markradius, pcolor)
-            else:
-                m = p - edgewidth * 5 * no
-                canvas.line(markname, p[0], p[1], m[0], m[1], ecolor, edgewidth, **other_atts)
-                #canvas.rect(None, m[0]-markradius, m[1]-markradius, 
-                #            markradius*2, markradius*2, ncolor)
+            canvas.line(markname, mark[0], mark[1], mark[2], mark[3], ecolor, edgewidth, **other_atts)
         # layout nodes (after edges)
         nw = self.node_weights
         node_radius = self.node_radius
         if not nw:
             return
-        pos_n = [(nw[n], n) for n in self.node_weights if n in positions]
-        pos_n.sort()
-        example_pos = positions[pos_n[0][1]]
+        drawn = [n for n in nw if n in positions]
+        points = numpy.array([positions[n] for n in drawn], dtype=numpy.float64).reshape((-1, 2))
         # keep track of min/max position in order to adjust view box later to include all nodes.
-        minimum = maximum = example_pos
+        minimum = points.min(axis=0)
+        maximum = points.max(axis=0)
         nci = self.get_node_color_interpolator()
-        for n in nw:
-            if n in positions:
-                p = positions[n]
-                (x,y) = p
-                minimum = numpy.minimum(minimum, p)
-                maximum = numpy.maximum(maximum, p)
-                w = nw[n]
-                #ncol = self.node_color(w, Mn)
-                #ncol = weighted_color(pnode, znode, Mn, w)
-                ncol = nci.interpolate_color(w)
-                name = self.node_name(n)  # "NODE_" + str(n) 
-                node_overrides = styling_overrides.get_overrides(name)
-                #ncol = color_overrides.get(name, ncol)
-                ncol = node_overrides.get("color", ncol)
-                degree = min(outdegree.get(n, 1) - 1, 4)
-                radius = nodesize + degree
-                # use node radius override if defined for this node
-                #radius = node_radius.get(n, radius)
-                radius = node_overrides.get("radius", radius)
-                shape = "circle"
-                if n in outdegree:
-                    shape = "rect"
-                shape = node_overrides.get("shape", shape)
-                if shape=="rect":
-                    canvas.rect(name, x-radius, y-radius, 2*radius, 2*radius, ncol)
-                else:
-                    assert shape=="circle"
-                    canvas.circle(name, x, y, radius, ncol) 
+        node_colors = nci.interpolate_colors([nw[n] for n in drawn])
+        for (n, (x, y), ncol) in zip(drawn, points.tolist(), node_colors):
+            #ncol = self.node_color(w, Mn)
+            #ncol = weighted_color(pnode, znode, Mn, w)
+            name = self.node_name(n)  # "NODE_" + str(n) 
+            node_overrides = styling_overrides.get_overrides(name)
+            #ncol = color_overrides.get(name, ncol)
+            ncol = node_overrides.get("color", ncol)
+            degree = min(outdegree.get(n, 1) - 1, 4)
+            radius = nodesize + degree
+            # use node radius override if defined for this node
+            #radius = node_radius.get(n, radius)
+            radius = node_overrides.get("radius", radius)
+            shape = "circle"
+            if n in outdegree:
+                shape = "rect"
+            shape = node_overrides.get("shape", shape)
+            if shape=="rect":
+                canvas.rect(name, x-radius, y-radius, 2*radius, 2*radius, ncol)
+            else:
+                assert shape=="circle"
+                canvas.circle(name, x, y, radius, ncol) 
         if send:
             canvas.send_commands()
         # adjust the viewBox
@@ -393,28 +750,87 @@ class WGraph(JsonMixin):
         return "NODE_" + str(n)
 
     def descendant_set(self, n, level, accumulator=None):
-        if accumulator is None:
-            accumulator = set()
-        if n not in accumulator:
-            accumulator.add(n)
-            if level is None or level > 0:
-                next_level = None
-                if level is not None:
-                    next_level = level - 1
-                n2d = self.get_node_to_descendants()
-                descendants = n2d.get(n, ())
-                for d in descendants:
-                    self.descendant_set(d, next_level, accumulator)
+        """
+        Nodes reachable from n (including n) in at most level steps, or any
+        number of steps if level is None.  Without an accumulator the result
+        is a frozenset cached per (n, level) until the graph changes.  With an
+        accumulator, nodes already in it are not expanded and it is updated
+        and returned.
+        """
+        if accumulator is not None:
+            return self.breadth_first(n, level, accumulator)
+        cache = self.reachable_cache()
+        key = (n, level)
+        result = cache.get(key)
+        if result is None:
+            if len(cache) >= self.reachable_cache_size:
+                cache.clear()
+            result = cache[key] = frozenset(self.breadth_first(n, level, set()))
+        return result
+
+    def descendant_sets(self, nodes, level):
+        """
+        descendant_set for many nodes at once, computed with sparse matrix
+        products.  Return a dictionary node -> frozenset.
+        """
+        cache = self.reachable_cache()
+        result = {}
+        missing = []
+        for n in nodes:
+            reached = cache.get((n, level))
+            if reached is None:
+                missing.append(n)
+            else:
+                result[n] = reached
+        if missing:
+            computed = reachable_sets(self, missing, level)
+            if len(cache) + len(computed) > self.reachable_cache_size:
+                cache.clear()
+            for n in computed:
+                result[n] = cache[(n, level)] = computed[n]
+        return result
+
+    def reachable_cache(self):
+        "(node, level) -> reachable set, valid for the current descendants map."
+        n2d = self.get_node_to_descendants()
+        cache = self._reachable_cache
+        if cache is None or cache[0] is not n2d:
+            cache = self._reachable_cache = (n2d, {})
+        return cache[1]
+
+    def breadth_first(self, n, level, accumulator):
+        "Add nodes within level steps of n to accumulator, not expanding nodes already there."
+        if n in accumulator:
+            return accumulator
+        n2d = self.get_node_to_descendants()
+        accumulator.add(n)
+        frontier = [n]
+        while frontier and (level is None or level > 0):
+            next_frontier = []
+            for m in frontier:
+                for d in n2d.get(m, ()):
+                    if d not in accumulator:
+                        accumulator.add(d)
+                        next_frontier.append(d)
+            frontier = next_frontier
+            if level is not None:
+                level -= 1
         return accumulator
 
     def move_descendants(self, canvas, positions, n, x, y, depth=0, add_edges=True):
+        "Move n and its descendants to depth by the same offset.  Return the moved nodes."
         descendants = self.descendant_set(n, int(depth))
         offset = pos(x, y) - positions[n]
         for d in descendants:
             positions[d] = positions[d] + offset
         # move edges attached to descendants
         if add_edges:
-            for (f, t) in self.edge_weights:
+            ew = self.edge_weights
+            edges = set()
+            for d in descendants:
+                edges.update(ew.edges_from(d))
+                edges.update(ew.edges_to(d))
+            for (f, t) in edges:
                 for (n0, xname, yname) in ((f, "x1", "y1"), (t, "x2", "y2")):
                     if n0 in descendants:
                         (x0, y0) = positions[n0]
@@ -430,12 +846,13 @@ class WGraph(JsonMixin):
             attributes = {"cx": xd, "cy": yd, "x": xd, "y": yd}
             canvas.change_element(dname, attributes)
         canvas.send_commands()
+        return descendants
 
     def move_node(self, canvas, positions, n, x, y):
         # deprecate in favor of move_descendents?
         positions[n] = pos(x, y)
         ew = self.edge_weights
-        for (f, t) in ew:
+        for (f, t) in ew.edges_from(n) + ew.edges_to(n):
             if f == n:
                 # move x1 y1 for edge
                 name = self.edge_name(f, t)
@@ -505,3 +922,30 @@ def orthogonal(v):
 
 def distance(a,b):
     return numpy.linalg.norm(b-a)
+
+
+def edge_geometry(from_positions, to_positions, weights, edgewidth=1, arrow_ratio=WGraph.arrow_ratio):
+    """
+    Line and arrow mark coordinates for many edges at once.
+    from_positions and to_positions are sequences of edge end points.
+    Return N x 4 arrays (x1, y1, x2, y2) of the edge lines, shifted sideways
+    so reverse edges don't overlap, and of the marks indicating targets:
+    a barb for positive weights and a perpendicular tick otherwise.
+    """
+    fp = numpy.array(from_positions, dtype=numpy.float64).reshape((-1, 2))
+    tp = numpy.array(to_positions, dtype=numpy.float64).reshape((-1, 2))
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    # unit directions as computed by towards(), arbitrary for coincident points
+    diff = tp - fp
+    norm = numpy.sqrt((diff * diff).sum(axis=1))
+    short = norm < 0.01
+    n = diff / numpy.where(short, 1.0, norm)[:, numpy.newaxis]
+    n[short] = 1
+    no = numpy.column_stack([-n[:, 1], n[:, 0]])
+    edgeshift = (edgewidth / 2.0) * no
+    fp += edgeshift
+    tp += edgeshift
+    p = fp + arrow_ratio * (tp - fp)
+    barb = no + numpy.where(weights > 0, 1, 0)[:, numpy.newaxis] * n
+    m = p - edgewidth * 5 * barb
+    return (numpy.hstack([fp, tp]), numpy.hstack([p, m]))
@@ -23,11 +23,20 @@ from jp_gene_viz import simple_tree
 from jp_gene_viz import cluster_layout
 from jp_gene_viz import category_layout
 from jp_gene_viz import getData
+from jp_gene_viz import graph_view
+from jp_gene_viz import scene
+from jp_gene_viz import undo_log
+from jp_gene_viz import level_of_detail
+from jp_gene_viz import layout_worker
+from jp_gene_viz import layout_cache
+from jp_gene_viz import name_index
+from jp_gene_viz import spatial_index
 #from threading import Timer
-import fnmatch
 import igraph
 import json
+import numpy
 import os
+import random
 import traitlets
 import time
 import zlib
@@ -57,6 +66,33 @@ LAYOUT_METHODS = {
     CATEGORY: category_layout.category_layout,
 }
 
+
+def compute_layout(G, layout_selection, fit, node_categories=None, seed=None):
+    """
+    (positions, rectangles) for the layout of G named layout_selection:
+    one of LAYOUT_METHODS or else a python-igraph layout.  The random
+    number generators are seeded first if seed is given.
+    """
+    if seed is not None:
+        random.seed(seed)
+        numpy.random.seed(seed)
+    if layout_selection in LAYOUT_METHODS:
+        method = LAYOUT_METHODS[layout_selection]
+        return method(G, fit=fit, node_categories=node_categories)
+    return (dLayout.iGraphLayout(G, layout_selection, fit), {})
+
+
+def layout_graph(G):
+    """
+    A WGraph with only the node and edge weights of G, for a layout worker
+    process: unlike a drawn display graph (whose styling_overrides refer to
+    the widget) it can be pickled.
+    """
+    result = dGraph.WGraph()
+    result.edge_weights = dGraph.EdgeWeights(G.edge_weights.items())
+    result.node_weights = dict(G.node_weights.items())
+    return result
+
 # python-igraph layouts which don't work (in 2d) or abbreviations.
 BROKEN_LAYOUTS = set([
     'bipartite',
@@ -164,12 +200,54 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
     # Flag to move attached edges when a node is moved via cursor interaction
     rubber_band_edges = False
 
+    # Canvas events this close to a node (in view coordinates) refer to the node.
+    pick_radius = 8
+
+    # spatial index over display_positions, built on demand
+    _position_index = None
+    _display_positions = None
+
+    # Most nodes and node groups drawn: larger networks are drawn with
+    # groups of nodes collapsed, opening the groups in view when zooming.
+    # None to always draw every node.
+    detail_budget = 2000
+
+    # Most edges drawn between single nodes, and most drawn between
+    # collapsed groups (the heaviest are kept).  None for no limit.
+    detail_link_budget = 5000
+
+    # (group_rectangles, level_of_detail.Hierarchy) over display_positions, built on demand
+    _detail_hierarchy = None
+
+    # view box for level of detail drawing, None for the whole network
+    detail_view_box = None
+
     # Flag to label rectangles when present
     label_rectangles = False
 
     dialog_timeout = 5
 
-    undo_limit = 10
+    # Graphs with more nodes and edges than this are laid out in a worker
+    # process, keeping the widget responsive.  None to always lay out here.
+    background_layout_size = 2000
+
+    # layout_worker.LayoutJob for the layout in progress, if any
+    layout_job = None
+
+    # Directory of the layout cache (for example layout_cache.DEFAULT_DIRECTORY),
+    # None to always compute layouts.  Only layouts with a layout_seed are cached.
+    layout_cache_directory = None
+    layout_cache_bytes = 200 * 1024 * 1024
+    _layout_cache = None
+
+    # Random seed for layouts, None for different layouts each time.
+    layout_seed = None
+
+    # maximum number of undo (and of redo) steps
+    undo_limit = 100
+
+    # memory for undo and redo history in bytes
+    undo_budget = 50 * 1024 * 1024
 
     label_style = OUTLINE_LABEL_STYLE
 
@@ -183,7 +261,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         super(NetworkDisplay, self).__init__(*pargs, **kwargs)
         # initially no node radius overrides
         #self.node_radius_override = {}
-        self.undo_stack = []
+        self.undo_history = undo_log.UndoLog(self.undo_budget, self.undo_limit)
         containers = [SVG, CANVAS]
         assert container in containers, "valid containers: " + repr(containers)
         self.title_html = widgets.HTML("Gene network")
@@ -192,8 +270,11 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         cd.on_trait_change(self.handle_container_change, "value")
         self.zoom_button = self.make_button("zoom", self.zoom_click, True)
         self.undo_button = self.make_button("undo", self.undo_click, False)
+        self.redo_button = self.make_button("redo", self.redo_click, False)
         self.trim_button = self.make_button("trim", self.trim_click)
         self.layout_button = self.make_button("layout", self.layout_click)
+        self.cancel_layout_button = self.make_button("cancel layout", self.cancel_layout_click)
+        set_visibility(self.cancel_layout_button, False)
         self.expand_button = self.make_button("expand", self.expand_click)
         self.regulates_button = self.make_button("regulates", self.regulates_click)
         self.regulates_edges_button = self.make_button("reg edges", self.regulates_edges_click)
@@ -225,6 +306,9 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         set_visibility(self.settings_assembly, False)
         # Display containers
         svg = self.svg = canvas.SVGCanvasWidget()
+        # Drawings and changes to drawn elements go through svg_scene,
+        # which only sends what changed since the last drawing.
+        self.svg_scene = scene.RetainedCanvas(svg)
         self.canvas = proxy_html5_canvas.HTML5CanvasProxy()
         sslider = self.size_slider = widgets.IntSlider(value=500, min=100, max=2000, step=10,
             readout=False, width="150px")
@@ -252,10 +336,17 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         svg.add_style("background-color", "white")
         svg.watch_event = "click mousedown mouseup mousemove mouseover"
         svg.default_event_callback = self.svg_callback
+        # The canvas has no elements to name in events: find nodes by position.
+        self.canvas.watch_event = "click mousedown mouseup mousemove"
+        self.canvas.default_event_callback = self.canvas_callback
+        self.canvas_hover = None
         hr = self.hideable_right = widgets.VBox(
             children=[self.threshhold_assembly, self.pattern_assembly, self.info_area, self.settings_assembly])
         #traitlets.directional_link((self, "maximize"), (hr, "visible"))
         self.on_trait_change(self.handle_maximize_change, "maximize")
+        # Show edge and node counts for the slider threshhold as it moves.
+        self.on_trait_change(self.show_threshhold_counts, "threshhold")
+        self.threshhold_sign_dropdown.on_trait_change(self.show_threshhold_counts, "value")
         right_panel = [self.title_html,
                       self.svg,
                       self.canvas.widget,
@@ -263,6 +354,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         self.vertical = widgets.VBox(children=right_panel)
         buttons = [self.container_dropdown,
                    self.undo_button,
+                   self.redo_button,
                    self.zoom_button,
                    self.focus_button,
                    self.ignore_button,
@@ -277,6 +369,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                    self.connected_only_button,
                    self.layout_dropdown,
                    self.layout_button,
+                   self.cancel_layout_button,
                    self.nodes_button,
                    self.edges_button,
                    self.labels_button,
@@ -500,8 +593,10 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         sign_default = sign_options[0]
         self.threshhold_sign_dropdown = widgets.Dropdown(options=sign_options, value=sign_default, width="50px")
         self.threshhold_sign_dropdown.layout.width = "50px"
+        self.threshhold_counts = widgets.HTML("")
         assembly = widgets.HBox(
-            children=[self.apply_button, self.threshhold_slider, self.threshhold_sign_dropdown])
+            children=[self.apply_button, self.threshhold_slider, self.threshhold_sign_dropdown,
+                      self.threshhold_counts])
         return assembly
 
     def make_settings_assembly(self):
@@ -670,7 +765,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         except Exception:
             return self.alert("could not parse as JSON " + repr(filename))
         try:
-            self.undo_stack = []
+            self.undo_history.clear()
             self.from_json_value(json_object)
             pass
         except Exception:
@@ -716,16 +811,32 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
             L.append("\t".join([f,t,str(w)]))
         self.info_area.value = "EDGES\n" + "\n".join(L)
 
-    def do_threshhold(self, value=None):
-        "Restrict viewable edges to have abs(weight) greater than value (respect sign dropdown)."
-        if value is None:
-            value = self.threshhold_slider.value
+    def threshhold_signs(self):
+        "(add_positives, add_negatives) for the sign dropdown."
         add_positives = add_negatives = True
         sign_dropdown_value = self.threshhold_sign_dropdown.value
         if "+" not in sign_dropdown_value:
             add_positives = False
         elif "-" not in sign_dropdown_value:
             add_negatives = False
+        return (add_positives, add_negatives)
+
+    def show_threshhold_counts(self, *args):
+        "Show how many data graph edges and nodes the slider threshhold selects."
+        value = self.threshhold_slider.value
+        if self.data_graph is None or value < 0:
+            self.threshhold_counts.value = ""
+            return
+        (add_positives, add_negatives) = self.threshhold_signs()
+        table = graph_view.edge_table(self.data_graph)
+        (edges, nodes) = table.threshold_counts(value, add_positives, add_negatives)
+        self.threshhold_counts.value = "%d edges, %d nodes" % (edges, nodes)
+
+    def do_threshhold(self, value=None):
+        "Restrict viewable edges to have abs(weight) greater than value (respect sign dropdown)."
+        if value is None:
+            value = self.threshhold_slider.value
+        (add_positives, add_negatives) = self.threshhold_signs()
         # negative value means no threshhold
         if value < 0:
             return
@@ -733,69 +844,81 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         if self.display_graph is None:
             return
         dG = self.data_graph
-        G = self.display_graph.clone()
-        ew = dG.edge_weights
-        nw = G.node_weights
+        G = self.display_graph
+        table = graph_view.edge_table(dG)
         # find edges between viewable nodes that satisfy threshhold and sign constraint.
-        ewG = {}
-        for e in ew:
-            w = ew[e]
-            if w > 0 and not add_positives:
-                continue
-            if w < 0 and not add_negatives:
-                continue
-            (f, t) = e
-            if f in nw and t in nw and abs(w) >= value:
-                ewG[e] = w
-        G.edge_weights = ewG
-        self.display_graph = G
+        mask = table.threshold_mask(value, add_positives, add_negatives, G.node_weights)
+        # the new display graph shares the data graph edges: it only allocates the mask.
+        self.display_graph = graph_view.view(table, mask, G)
         self.set_node_weights()
 
     def undo_click(self, b=None):
-        if len(self.undo_stack) < 1:
+        if len(self.undo_history) < 1:
             self.info_area.value = "No previous state to restore."
         else:
             self.pop_state()
 
+    def redo_click(self, b=None):
+        history = self.undo_history
+        if not history.can_redo():
+            self.info_area.value = "No undone state to restore."
+        else:
+            undo_log.restore(self, history.redo(undo_log.capture(self)))
+            self.draw()
+        self.show_undo_buttons()
+
     def pop_state(self):
-        s = self.undo_stack
-        if len(s) > 0:
-            last_state = s.pop()
-            self.from_json_value(last_state)
+        history = self.undo_history
+        if len(history) > 0:
+            undo_log.restore(self, history.undo(undo_log.capture(self)))
             self.draw()
-        set_visibility(self.undo_button, len(s) > 0)
+        self.show_undo_buttons()
 
     def push_state(self):
-        s = self.undo_stack
-        state = self.to_json_value()
-        s.append(state)
-        if len(s) > self.undo_limit:
-            del s[0]
-        set_visibility(self.undo_button, len(s) > 0)
+        checkpoint = undo_log.capture(self)
+        if checkpoint is not None:
+            history = self.undo_history
+            # undo_budget and undo_limit may have been changed on this instance.
+            history.budget = self.undo_budget
+            history.limit = self.undo_limit
+            history.push(checkpoint)
+        self.show_undo_buttons()
+
+    def show_undo_buttons(self):
+        history = self.undo_history
+        set_visibility(self.undo_button, len(history) > 0)
+        set_visibility(self.redo_button, history.can_redo())
 
     def load_data(self, graph, positions=None, draw=True):
-        "Load and draw a graph and positions to the network display."
-        self.undo_stack = []
-        self.pop_state()
+        """
+        Load and draw a graph and positions to the network display.
+        Without positions the default layout is computed first, in the
+        background for large graphs.
+        """
+        self.cancel_layout()
         if positions is None:
             self.info_area.value = "Computing default layout: " + repr(graph.sizes())
             fit = self.fit_heuristic(graph)
-            positions = dLayout.group_layout(graph, fit=fit)[0]
-        else:
-            # match names ignoring case
-            nodes = list(graph.node_weights.keys())
-            lcmap = getData.lower_case_map(graph.node_weights.keys())
-            fix = {}
-            for name in positions:
-                location = positions[name]
-                fix_name = lcmap.get(name.lower(), name)
-                fix[fix_name] = location
-            positions = fix
+            def apply(positions, rectangles):
+                self.load_data(graph, positions, draw)
+            self.start_layout(graph, SKELETON, fit, apply)
+            return
+        self.undo_history.clear()
+        self.pop_state()
+        # match names ignoring case
+        nodes = list(graph.node_weights.keys())
+        lcmap = getData.lower_case_map(graph.node_weights.keys())
+        fix = {}
+        for name in positions:
+            location = positions[name]
+            fix_name = lcmap.get(name.lower(), name)
+            fix[fix_name] = location
+        positions = fix
         self.data_positions = positions
         #self.display_positions = positions.copy()
         self.set_layout(positions.copy())
         self.data_graph = graph
-        self.display_graph = graph.clone()
+        self.display_graph = graph_view.graph_view(graph)
         #self.override_node_colors = None
         self.override_node_weights = None
         ew = graph.edge_weights
@@ -803,6 +926,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
             maxw = max(abs(ew[e]) for e in ew) + 1.0
             self.threshhold_slider.max = maxw
             self.do_threshhold()
+        self.show_threshhold_counts()
         self.reset_interactive_bookkeeping()
         if draw:
             self.draw()
@@ -824,8 +948,8 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
     #    t = Timer(0.1, self.draw, [fit, svg])
     #    t.start()
 
-    def draw(self, fit=True, svg=None):
-        "Draw the network."
+    def draw(self, fit=True, svg=None, keep_selection=False):
+        "Draw the network, cancelling the selection unless keep_selection."
         # prevent overflow for display and containers
         no_overflow(self.dialog)
         G = self.display_graph
@@ -846,7 +970,13 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         if svg is None:
             #svg = self.svg
             svg = self.chosen_container()
+            if svg is self.svg:
+                svg = self.svg_scene
             svg.empty()
+        summary = self.level_of_detail(fit)
+        if summary is not None and rectangles is not None and len(rectangles) > self.detail_budget:
+            # too many borders to draw
+            rectangles = None
         rcolor = self.rectangle_color.strip()
         rectangle_color_overrides = self.rectangle_color_overrides
         if rcolor and rectangles is not None:
@@ -854,16 +984,31 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                 this_rect_color = rectangle_color_overrides.get(key, rcolor)
                 xw = x + w
                 yh = y + h
-                svg.line("group_border", x, y, xw, y, this_rect_color)
-                svg.line("group_border", xw, y, xw, yh, this_rect_color)
-                svg.line("group_border", xw, yh, x, yh, this_rect_color)
-                svg.line("group_border", x, yh, x, y, this_rect_color)
+                # distinct names so that the borders can be redrawn individually.
+                border = "group_border_" + json.dumps(key) + "_"
+                svg.line(border + "top", x, y, xw, y, this_rect_color)
+                svg.line(border + "right", xw, y, xw, yh, this_rect_color)
+                svg.line(border + "bottom", xw, yh, x, yh, this_rect_color)
+                svg.line(border + "left", x, yh, x, y, this_rect_color)
                 if self.label_rectangles:
                     rlabel = str(key)[:10]
-                    svg.text(None, x, yh, rlabel, this_rect_color)
-        self.svg_origin = G.draw(svg, P, 
-            fit=fit, styling_overrides=styling_overrides, send=False)
-        self.cancel_selection()
+                    svg.text("group_label_" + json.dumps(key), x, yh, rlabel, this_rect_color)
+        if summary is None:
+            self.svg_origin = G.draw(svg, P,
+                fit=fit, styling_overrides=styling_overrides, send=False)
+        else:
+            # collapsed groups go below the single nodes and their edges.
+            level_of_detail.draw_summary(svg, summary, G, labels=self.labels_button.value)
+            # label only the single nodes.
+            G = summary.graph
+            G.draw(svg, P, fit=False, styling_overrides=styling_overrides, send=False)
+            (minx, miny, maxx, maxy) = self.detail_hierarchy().bounds[0].tolist()
+            self.svg_origin = dGraph.pos(int(minx) - 10, int(miny) - 10)
+            if fit:
+                side = max(int(maxx) - int(minx), int(maxy) - int(miny)) + 20
+                svg.set_view_box(self.svg_origin[0], self.svg_origin[1], side, side)
+        if not keep_selection:
+            self.cancel_selection()
         self.info_area.value = "Done drawing: " + repr((G.sizes(), len(P)))
         font_size = self.font_size_slider.value
         tf_font_size = self.tf_font_size_slider.value
@@ -903,15 +1048,17 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                 svg.fit(False)
             self.info_area.value = "Labels added."
         svg.send_commands()
+        if keep_selection:
+            self.redraw_selection()
         if is_visible(self.settings_assembly):
             #G.reset_colorization()
             self.info_area.value = "Displaying color choosers."
             ecc = self.edge_color_chooser
             ncc = self.node_color_chooser
-            ecc.scale = G.get_edge_color_interpolator()
-            ecc.count_values(G.edge_weights.values(), True)
-            ncc.scale = G.get_node_color_interpolator()
-            ncc.count_values(G.node_weights.values(), True)
+            ecc.scale = self.display_graph.get_edge_color_interpolator()
+            ecc.count_values(self.display_graph.edge_weights.values(), True)
+            ncc.scale = self.display_graph.get_node_color_interpolator()
+            ncc.count_values(self.display_graph.node_weights.values(), True)
             ecc.draw()
             ncc.draw()
 
@@ -923,18 +1070,12 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         "Restrict viewable graph to nodes matching text input."
         self.push_state()
         self.info_area.value = "match click"
-        patterns = self.pattern_text.value.lower().split()
+        patterns = self.pattern_text.value.split()
         #print ("patterns", patterns)
         if not patterns:
             self.info_area.value = "No patterns to match."
             return
-        nodes = list(self.data_graph.node_weights.keys())
-        lowernodes = [s.lower() for s in nodes]
-        selected_nodes_lower = set()
-        for pattern in patterns:
-            selected_nodes_lower.update(fnmatch.filter(lowernodes, pattern))
-        selected_nodes = getData.caseless_intersection_list(nodes, selected_nodes_lower)
-        #print ("found", len(selected_nodes), "of", len(nodes))
+        selected_nodes = self.node_index().glob(patterns)
         self.focus_on_nodes(selected_nodes)
 
     def focus_on_nodes(self, selected_nodes):
@@ -986,7 +1127,10 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         Split nodes with positive end points above, negative below, interior middle.
         """
         self.push_state()
-        self.layout_click(draw=False)
+        self.layout_click(draw=False, then=self.split_layout)
+
+    def split_layout(self):
+        "Split the current layout for split_click."
         layout_positions = self.display_positions
         dG = self.display_graph
         height = self.fit_heuristic(dG)
@@ -1014,7 +1158,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
             split_positions[d] = dGraph.pos(p[0], p[1] * scale + negative_shift)
         #self.display_positions = split_positions
         self.set_layout(split_positions)
-        self.svg.empty()
+        self.svg_scene.clear()
         self.draw()
 
     def apply_layout(self, layout, rectangles=None):
@@ -1028,6 +1172,84 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         self.display_positions = layout
         self.group_rectangles = rectangles
 
+    def get_display_positions(self):
+        return self._display_positions
+
+    def set_display_positions(self, positions):
+        self._display_positions = positions
+        self._position_index = None
+        self._detail_hierarchy = None
+
+    display_positions = property(get_display_positions, set_display_positions)
+
+    def position_index(self):
+        "SpatialIndex over display_positions."
+        index = self._position_index
+        if index is None and self.display_positions is not None:
+            index = self._position_index = spatial_index.SpatialIndex(self.display_positions)
+        return index
+
+    def display_positions_changed(self, nodes):
+        "Keep the spatial index in sync after display_positions of nodes changed in place."
+        index = self._position_index
+        if index is not None:
+            index.update(nodes)
+        self._detail_hierarchy = None
+
+    def detail_hierarchy(self):
+        "level_of_detail.Hierarchy over display_positions and group_rectangles."
+        rectangles = self.group_rectangles
+        cached = self._detail_hierarchy
+        if cached is None or cached[0] is not rectangles:
+            hierarchy = level_of_detail.Hierarchy(self.display_positions, rectangles)
+            cached = self._detail_hierarchy = (rectangles, hierarchy)
+        return cached[1]
+
+    def detailed(self):
+        "Test whether the display graph is too large to draw every node or every edge."
+        G = self.display_graph
+        budget = self.detail_budget
+        if budget is not None and len(G.node_weights) > budget:
+            return True
+        link_budget = self.detail_link_budget
+        return link_budget is not None and len(G.edge_weights) > link_budget
+
+    def level_of_detail(self, fit=True):
+        """
+        level_of_detail.Summary of the display graph for detail_view_box
+        (the whole network if fit), or None if every node and edge is drawn.
+        """
+        if fit:
+            self.detail_view_box = None
+        if not self.detailed():
+            return None
+        hierarchy = self.detail_hierarchy()
+        collapsed = hierarchy.cut(self.detail_view_box, self.detail_budget)
+        link_budget = self.detail_link_budget
+        return level_of_detail.summarize(hierarchy, collapsed, self.display_graph,
+                                         link_budget, link_budget, self.detail_view_box)
+
+    def node_at(self, x, y, radius=None):
+        "The displayed node nearest to (x, y) within radius, or None."
+        if radius is None:
+            radius = self.pick_radius
+        index = self.position_index()
+        G = self.display_graph
+        if index is None or G is None or x is None or y is None:
+            return None
+        nw = G.node_weights
+        P = self.display_positions
+        best = None
+        for node in index.within(x, y, radius):
+            if node in nw:
+                (px, py) = P[node]
+                d = (px - x) ** 2 + (py - y) ** 2
+                if best is None or d < best[0]:
+                    best = (d, node)
+        if best is None:
+            return None
+        return best[1]
+
     def save_view_positions(self, to_file_name):
         f = open(to_file_name, "w")
         #nodes = {}
@@ -1066,8 +1288,11 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         self.info_area.value = result
         return result
 
-    def layout_click(self, b=None, draw=True):
-        "Apply the current layout to the viewable graph."
+    def layout_click(self, b=None, draw=True, then=None):
+        """
+        Apply the current layout to the viewable graph, then call then()
+        if given.  Large graphs are laid out in the background.
+        """
         self.push_state()
         self.reset_interactive_bookkeeping()
         self.info_area.value = "layout clicked"
@@ -1076,22 +1301,94 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         dG = self.display_graph
         fit = self.fit_heuristic(dG)
         layout_selection = self.layout_dropdown.value
-        rectangles = {}
-        try:
-            if layout_selection in LAYOUT_METHODS:
-                method = LAYOUT_METHODS[layout_selection]
-                (display_positions, rectangles) = method(dG, fit=fit, 
-                    node_categories=self.node_categories)
-            else:
-                display_positions = dLayout.iGraphLayout(dG, layout_selection, fit)
-        except Exception as e:
-            self.info_area.value = repr(layout_selection) + " layout failed: " + repr(e)
-        else:
+        def apply(display_positions, rectangles):
             self.set_layout(display_positions, rectangles)
             if draw:
-                self.svg.empty()
+                self.svg_scene.clear()
                 self.draw()
             #self.svg.empty()
+            if then is not None:
+                then()
+        self.start_layout(dG, layout_selection, fit, apply)
+
+    def start_layout(self, G, layout_selection, fit, callback):
+        """
+        Compute the layout of G named layout_selection and call
+        callback(positions, rectangles) with it.  For graphs larger than
+        background_layout_size this happens in a worker process: progress
+        is shown in the info area and the cancel layout button stops it,
+        and the result is applied by the kernel's event loop.
+        Only the latest layout started is applied.
+        """
+        self.cancel_layout()
+        description = "%s layout of %s nodes" % (layout_selection, len(G.node_weights))
+        seed = self.layout_seed
+        cache = self.get_layout_cache()
+        key = None
+        # without a seed each layout is a new random one, so it is not cached.
+        if cache is not None and seed is not None:
+            key = layout_cache.layout_key(G, layout_selection, fit, seed, self.node_categories)
+            cached = cache.get(key)
+            if cached is not None:
+                self.info_area.value = description + ": found in the layout cache"
+                (positions, rectangles) = cached
+                callback(positions, rectangles)
+                return None
+        size = len(G.node_weights) + len(G.edge_weights)
+        background = self.background_layout_size is not None and size > self.background_layout_size
+        def done(result):
+            if self.layout_job is job:
+                self.layout_job = None
+                set_visibility(self.cancel_layout_button, False)
+                (positions, rectangles) = result
+                if key is not None:
+                    try:
+                        cache.put(key, positions, rectangles)
+                    except (IOError, OSError) as e:
+                        self.info_area.value = "Could not cache layout: " + repr(e)
+                callback(positions, rectangles)
+        def failed(message):
+            if self.layout_job is job:
+                self.layout_job = None
+                set_visibility(self.cancel_layout_button, False)
+                self.info_area.value = repr(layout_selection) + " layout failed: " + message
+        def progress(message):
+            self.info_area.value = message
+        if background:
+            G = layout_graph(G)
+        job = self.layout_job = layout_worker.LayoutJob(
+            compute_layout, (G, layout_selection, fit, self.node_categories, seed),
+            done, failed, progress, description)
+        if background:
+            set_visibility(self.cancel_layout_button, True)
+            job.start()
+        else:
+            job.run()
+        return job
+
+    def get_layout_cache(self):
+        "The layout_cache.LayoutCache in layout_cache_directory, or None."
+        directory = self.layout_cache_directory
+        cache = self._layout_cache
+        if directory is None:
+            return None
+        if cache is None or cache.directory != directory:
+            cache = self._layout_cache = layout_cache.LayoutCache(directory, self.layout_cache_bytes)
+        cache.max_bytes = self.layout_cache_bytes
+        return cache
+
+    def cancel_layout(self):
+        "Stop the layout in progress, if any, without applying it."
+        job = self.layout_job
+        if job is not None:
+            self.layout_job = None
+            job.cancel()
+            set_visibility(self.cancel_layout_button, False)
+        return job
+
+    def cancel_layout_click(self, b=None):
+        if self.cancel_layout() is not None:
+            self.info_area.value = "layout cancelled"
 
     def regulates_click(self, b=None):
         return self.expand_click(b, incoming=False, outgoing=True, crosslink=True)
@@ -1118,38 +1415,40 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         dnw = dG.node_weights.copy()
         nodes = set(dnw)
         threshhold = self.threshhold_slider.value
-        # find nodes for expansion
-        for e in ew:
+        # find nodes for expansion: only edges at displayed nodes need checking.
+        candidates = set()
+        for n in dnw:
+            if incoming:
+                candidates.update(ew.edges_to(n))
+            if outgoing:
+                candidates.update(ew.edges_from(n))
+        for e in candidates:
             # observe threshhold
             w = ew[e]
             if abs(w) < threshhold:
                 continue
             if not e in dew:
                 (f, t) = e
-                addit = False
-                if incoming and t in dnw:
-                    addit = True
-                if outgoing and f in dnw:
-                    addit = True
-                if addit:
-                    nodes.add(f)
-                    nodes.add(t)
-                    dG.add_edge(f, t, w)
+                nodes.add(f)
+                nodes.add(t)
+                dG.add_edge(f, t, w)
         if crosslink:
             # add new edges for the nodes
-            for e in ew:
-                if not e in dew:
-                    (f, t) = e
-                    if f in nodes and t in nodes:
-                        w = ew[e]
-                        # observe threshhold
-                        dG.add_edge(f, t, w)
+            for f in nodes:
+                for e in ew.edges_from(f):
+                    if not e in dew:
+                        t = e[1]
+                        if t in nodes:
+                            w = ew[e]
+                            # observe threshhold
+                            dG.add_edge(f, t, w)
         # position new nodes
         P = self.data_positions
         dP = self.display_positions
-        for n in nodes:
-            if n not in dP and n in P:
-                dP[n] = P[n]
+        added = [n for n in nodes if n not in dP and n in P]
+        for n in added:
+            dP[n] = P[n]
+        self.display_positions_changed(added)
         if crosslink:
             self.do_threshhold()
         self.set_node_weights()
@@ -1177,16 +1476,10 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         # use square area
         maxx = minx + maxdiff
         maxy = miny + maxdiff
-        P = self.display_positions
         G = self.display_graph
-        selected = set()
         nw = G.node_weights
-        for node in nw:
-            npos = P.get(node)
-            if npos is not None:
-                (px, py) = npos
-                if minx <= px and px <= maxx and miny <= py and py <= maxy:
-                    selected.add(node)
+        candidates = self.position_index().in_rectangle(minx, miny, maxx, maxy)
+        selected = set(node for node in candidates if node in nw)
         return selected
 
     def alert_no_selection(self, operation):
@@ -1288,6 +1581,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         for (node, (x, y)) in node_to_positions.items():
             positions[node] = dGraph.pos(x, y)
             self.display_graph.node_weights[node] = self.data_graph.node_weights[node]
+        self.display_positions_changed(node_to_positions)
         for ((src, dst), weight) in edges.items():
             if src in view_nodes and dst in view_nodes:
                 self.display_graph.edge_weights[(src, dst)] = weight
@@ -1297,12 +1591,15 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         "Get nodes list for currently viewable nodes."
         return sorted(self.display_graph.node_weights.keys())
 
+    def node_index(self):
+        "name_index.NameIndex for the nodes of the data graph."
+        return name_index.node_index(self.data_graph)
+
     def get_data_nodes(self, matching_nodes=None):
-        dnodes = set(self.data_graph.node_weights.keys())
         if matching_nodes is None:
-            return sorted(dnodes)
+            return sorted(self.data_graph.node_weights.keys())
         else:
-            return getData.caseless_intersection_list(matching_nodes, dnodes, use_left=False)
+            return self.node_index().lookup(matching_nodes)
 
     def select_nodes(self, nodes, from_graph, from_positions):
         "Get network restricted to nodes list and positions for nodes."
@@ -1368,6 +1665,10 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         extrema = self.selection_extrema()
         if extrema:
             (minx, miny, maxx, maxy, maxdiff) = extrema
+            if self.detailed():
+                # open the groups in the new view.
+                self.detail_view_box = (minx, miny, maxdiff, maxdiff)
+                self.draw(fit=False, keep_selection=True)
             svg = self.svg
             svg.set_view_box(minx, miny, maxdiff, maxdiff)
             self.info_area.value = "set_view_box" + repr((minx, miny, maxdiff, maxdiff))
@@ -1380,7 +1681,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
     def restore_click(self, b=None):
         "Restore button click: restore data to loaded state."
         self.push_state()
-        new_display_graph = self.data_graph.clone()
+        new_display_graph = graph_view.graph_view(self.data_graph)
         new_display_graph.reset_colorization(self.display_graph)
         self.display_graph = new_display_graph
         #self.display_positions = self.data_positions.copy()
@@ -1416,6 +1717,20 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
             #self.info_area.value = "No callback for event: " + repr(typ)
             pass
 
+    def canvas_callback(self, info):
+        "Dispatch events over the HTML5 canvas, naming the node under the pointer."
+        if not info.get("name"):
+            node = self.node_at(info.get("svgX"), info.get("svgY"))
+            if node is not None:
+                info["name"] = self.display_graph.node_name(node)
+        name = info.get("name")
+        # the pointer moving onto a node acts as a mouseover of the node.
+        if info.get("type") == "mousemove" and name != self.canvas_hover:
+            self.canvas_hover = name
+            if name:
+                self.svg_mouseover(info)
+        return self.svg_callback(info)
+
     def event_position(self, info):
         "Get the position array for an event info descriptor."
         x = info.get("svgX")
@@ -1436,6 +1751,8 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                 if indicator == "NODE":
                     L.append(self.node_detail(data))
                     self.close_dialog()
+                elif indicator == "GROUP":
+                    L.append(self.group_detail(int(data)))
                 elif indicator == "EDGE":
                     e = json.loads(data)
                     L.append(self.edge_detail(e))
@@ -1520,20 +1837,25 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         d(d.window().alert(message))
         d.flush()
 
+    def group_detail(self, group):
+        "Return a string describing a collapsed group of nodes."
+        hierarchy = self.detail_hierarchy()
+        nw = self.display_graph.node_weights
+        members = hierarchy.names[hierarchy.start[group]:hierarchy.end[group]]
+        members = [node for node in members if node in nw]
+        lines = ["group of %s nodes (zoom in to show them)" % len(members)]
+        lines.extend(sorted(members)[:20])
+        if len(members) > 20:
+            lines.append("...")
+        return "\n".join(lines)
+
     def node_detail(self, node):
         "Return a string describing a node of the network."
         dg = self.display_graph
         ew = dg.edge_weights
         nw = dg.node_weights
-        incoming = []
-        outgoing = []
-        for e in ew:
-            (f, t) = e
-            w = ew[e]
-            if f == node:
-                outgoing.append((w, e))
-            if t == node:
-                incoming.append((w, e))
+        outgoing = [(ew[e], e) for e in ew.edges_from(node)]
+        incoming = [(ew[e], e) for e in ew.edges_to(node)]
         for L in (incoming, outgoing):
             L.sort()
             L.reverse()
@@ -1612,7 +1934,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         moving_label = self.moving_label
         svgX = info["svgX"]
         svgY = info["svgY"]
-        svg = self.svg
+        svg = self.svg_scene
         overrides = self.label_position_overrides
         overrides[moving_label] = (svgX, svgY + 4)
         attributes = {"x": svgX, "y": svgY}
@@ -1627,12 +1949,13 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
         moving_node = self.moving_node
         svgX = info["svgX"]
         svgY = info["svgY"]
-        svg = self.svg
+        svg = self.svg_scene
         positions = self.display_positions
         dG = self.display_graph
         depth = self.depth_slider.value
-        dG.move_descendants(svg, positions, moving_node, svgX, svgY, depth, 
+        moved = dG.move_descendants(svg, positions, moving_node, svgX, svgY, depth,
             add_edges=self.rubber_band_edges)
+        self.display_positions_changed(moved)
 
     def update_selection(self, info):
         svg = self.svg
@@ -1658,7 +1981,7 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                 self.styling_overrides.set_overrides(name, {"color": color})
                 # change the color of the object selected
                 atts = {"stroke": color, "fill": color}
-                self.svg.change_element(name, atts)
+                self.svg_scene.change_element(name, atts)
                 svg.send_commands()
             # don't respond to any other behavior if colorizing.
             return
@@ -1688,6 +2011,18 @@ class NetworkDisplay(traitlets.HasTraits, JsonMixin):
                 nodename = name[6:]
                 self.moving_label = nodename
 
+    def redraw_selection(self):
+        "Draw the selection rectangle again, above anything drawn since."
+        extrema = self.selection_extrema()
+        if not self.selection_id or extrema is None:
+            return
+        (minx, miny, maxx, maxy, maxdiff) = extrema
+        svg = self.svg
+        svg.delete_names([self.selection_id])
+        svg.rect(self.selection_id, minx, miny, maxdiff, maxdiff, "black",
+            style_dict={"fill-opacity": 0.2})
+        svg.send_commands()
+
     def cancel_selection(self):
         "Remove the circular selection area, if present."
         svg = self.svg
@@ -1826,38 +2161,51 @@ class StylingOverrides:
 
 
 def display_network(filename, N=None, threshhold=20.0, save_layout=True, show=True, size_limit=2000):
+    """
+    Read a network, lay it out (in the background if it is large) or load
+    the layout saved for it, and display it.
+    """
     from jp_gene_viz import dLayout
     assert os.path.exists(filename)
     print ("Reading network", filename)
     G = getData.read_network(filename)
     size = len(G.node_weights) + len(G.edge_weights)
     layoutpath = filename + ".layout.json"
-    if os.path.exists(layoutpath):
-        print ("Loading saved layout", layoutpath)
-        layout = dLayout.load(layoutpath)
-    else:
-        print ("Computing layout")
-        if size < size_limit:
-            # Use the slow but prettier method
-            (layout, rectangles) = dLayout.group_layout(G)
-            assert type(layout) is dict, type(layout)
-        else:
-            print ("Using fast layout because the network is large.")
-            (layout, rectangles) = grid_forest.forest_layout(G)
-            assert type(layout) is dict, type(layout)
-        if save_layout:
-            print ("Saving layout", layoutpath)
-            dLayout.dump(layout, layoutpath)
     if N is None:
         N = NetworkDisplay()
     if threshhold:
         N.threshhold_slider.value = threshhold
-    N.load_data(G, layout, draw=show)
     if size > size_limit:
-        print("Omitting edges, using canvas, and fast layout default because the network is large")
-        N.container_dropdown.value = CANVAS
+        # level of detail bounds what is drawn, so the svg container (and zooming
+        # into groups) stays usable.
+        print("Grouping nodes and using fast layout default because the network is large")
         N.layout_dropdown.value = SPOKE
-        N.limit_edges(size_limit)
+
+    def apply(layout, rectangles=None):
+        assert type(layout) is dict, type(layout)
+        N.load_data(G, layout, draw=False)
+        if size > size_limit:
+            # level of detail drawing groups nodes by the layout's subtrees.
+            N.group_rectangles = rectangles
+        if show:
+            N.draw()
+
+    def computed(layout, rectangles):
+        if save_layout:
+            dLayout.dump(layout, layoutpath)
+            N.info_area.value = "Saved layout " + layoutpath
+        apply(layout, rectangles)
+
+    if os.path.exists(layoutpath):
+        print ("Loading saved layout", layoutpath)
+        apply(dLayout.load(layoutpath))
+    elif size < size_limit:
+        # Use the slow but prettier method
+        print ("Computing layout")
+        N.start_layout(G, SKELETON, 1000, computed)
+    else:
+        print ("Computing fast layout in the background because the network is large.")
+        N.start_layout(G, FOREST, 1000, computed)
     if show:
         N.show()
     return N
@@ -0,0 +1,280 @@
+"""
+Column oriented storage for per-edge attributes of a WGraph.
+
+Rather than a dictionary per edge, every attribute header (Regulator,
+Target, beta, Motifs, etcetera) is stored as one column of int32 codes
+into an interned table of that column's distinct values.  Edges are
+stored as int32 codes into a shared table of node names.  The
+{edge: {header: value}} view used by the rest of the package is
+materialized lazily, one edge at a time, by get() and friends.
+"""
+
+import itertools
+from array import array
+from collections import defaultdict
+
+import numpy
+
+# code for a missing value in an attribute column.
+MISSING = -1
+
+CODE_TYPECODE = "i"
+
+
+class Interner(object):
+
+    """
+    Map values to consecutive integer ids.
+    """
+
+    def __init__(self):
+        # defaultdict only to allow bulk interning by intern_all.
+        self.index = defaultdict()
+        self.values = []
+
+    def __call__(self, value):
+        index = self.index
+        try:
+            result = index.get(value)
+        except TypeError:
+            # unhashable values are stored without sharing.
+            self.values.append(value)
+            return len(self.values) - 1
+        if result is None:
+            result = index[value] = len(self.values)
+            self.values.append(value)
+        return result
+
+    def __len__(self):
+        return len(self.values)
+
+    def copy(self):
+        result = Interner()
+        result.index = defaultdict(None, self.index)
+        result.values = list(self.values)
+        return result
+
+
+def code_array(codes=()):
+    "Compact growable array of int32 codes."
+    result = array(CODE_TYPECODE)
+    extend_codes(result, codes)
+    return result
+
+
+def extend_codes(codes, more):
+    "Append a sequence or numpy array of codes to a code array."
+    if isinstance(more, numpy.ndarray):
+        data = more.astype(numpy.int32).tobytes()
+        if hasattr(codes, "frombytes"):
+            codes.frombytes(data)
+        else:
+            codes.fromstring(data)
+    else:
+        codes.extend(more)
+
+
+def intern_all(interner, values):
+    "Intern a list of hashable values.  Return a numpy array of their codes."
+    index = interner.index
+    start = len(interner.values)
+    # number new values consecutively from start in order of first appearance.
+    counter = itertools.count(start)
+    index.default_factory = lambda: next(counter)
+    try:
+        codes = numpy.array([index[value] for value in values], dtype=numpy.int32)
+    finally:
+        index.default_factory = None
+    new = numpy.flatnonzero(codes >= start)
+    (_, first) = numpy.unique(codes[new], return_index=True)
+    interner.values.extend([values[p] for p in new[first].tolist()])
+    return codes
+
+
+class EdgeAttributeStore(object):
+
+    """
+    Dictionary-like mapping of edge -> attribute dictionary, stored by column.
+    Only values present for an edge appear in its materialized dictionary.
+    """
+
+    def __init__(self):
+        self.nodes = Interner()
+        self.sources = code_array()
+        self.targets = code_array()
+        self.headers = []
+        # header -> (Interner, code array)
+        self.columns = {}
+        # edge -> row, built on demand after bulk loads.
+        self._index = {}
+
+    def nrows(self):
+        return len(self.sources)
+
+    def get_index(self):
+        index = self._index
+        if index is None:
+            names = self.nodes.values
+            edges = zip([names[s] for s in self.sources], [names[t] for t in self.targets])
+            # later rows for the same edge take precedence.
+            index = self._index = dict(zip(edges, range(len(self.sources))))
+        return index
+
+    def add_column(self, header):
+        "Add an empty column (all values missing) if it is not present."
+        if header not in self.columns:
+            self.headers.append(header)
+            self.columns[header] = (Interner(), code_array([MISSING]) * self.nrows())
+        return self.columns[header]
+
+    def new_row(self, edge):
+        index = self.get_index()
+        row = index[edge] = self.nrows()
+        (f, t) = edge
+        self.sources.append(self.nodes(f))
+        self.targets.append(self.nodes(t))
+        for header in self.headers:
+            self.columns[header][1].append(MISSING)
+        return row
+
+    def update_edge(self, edge, attributes):
+        "Merge attributes into the attributes of edge, adding the edge if needed."
+        row = self.get_index().get(edge)
+        if row is None:
+            row = self.new_row(edge)
+        for header in attributes:
+            (interner, codes) = self.add_column(header)
+            codes[row] = interner(attributes[header])
+
+    def append_rows(self, edges, headers, rows):
+        """
+        Append many edges at once.  Each row is a sequence of values aligned
+        with headers; values missing from the end of a short row are missing.
+        A row for an edge already in the store replaces its attributes.
+        """
+        nrows = self.nrows()
+        extend_codes(self.sources, intern_all(self.nodes, [f for (f, t) in edges]))
+        extend_codes(self.targets, intern_all(self.nodes, [t for (f, t) in edges]))
+        shortest = min(len(row) for row in rows) if rows else 0
+        given = set()
+        for (position, header) in enumerate(headers):
+            given.add(header)
+            (interner, codes) = self.add_column(header)
+            # a new column was created with the new rows already counted.
+            del codes[nrows:]
+            if position < shortest:
+                extend_codes(codes, intern_all(interner, [row[position] for row in rows]))
+            else:
+                extend_codes(codes, [interner(row[position]) if position < len(row) else MISSING
+                                     for row in rows])
+        for header in self.headers:
+            if header not in given:
+                self.columns[header][1].extend(code_array([MISSING]) * len(edges))
+        if self._index is not None:
+            self._index.update(zip(edges, range(nrows, self.nrows())))
+
+    def extend(self, names, sources, targets, columns):
+        """
+        Append many edges at once from parallel arrays of node ids into names.
+        Columns is a sequence of (header, table, codes) triples where codes
+        index into table with MISSING for absent values.
+        """
+        nrows = self.nrows()
+        for (header, table, codes) in columns:
+            self.add_column(header)
+        node_codes = numpy.array([self.nodes(name) for name in names] + [MISSING], dtype=numpy.int32)
+        extend_codes(self.sources, node_codes[numpy.asarray(sources)])
+        extend_codes(self.targets, node_codes[numpy.asarray(targets)])
+        added = self.nrows() - nrows
+        given = set()
+        for (header, table, codes) in columns:
+            given.add(header)
+            (interner, column_codes) = self.columns[header]
+            # remap table codes to this store's codes; MISSING (-1) maps to the last entry.
+            mapping = numpy.array([interner(value) for value in table] + [MISSING], dtype=numpy.int32)
+            extend_codes(column_codes, mapping[numpy.asarray(codes)])
+        for header in self.headers:
+            if header not in given:
+                self.columns[header][1].extend(code_array([MISSING]) * added)
+        self._index = None
+
+    def row_attributes(self, row):
+        result = {}
+        for header in self.headers:
+            (interner, codes) = self.columns[header]
+            code = codes[row]
+            if code != MISSING:
+                result[header] = interner.values[code]
+        return result
+
+    def value(self, edge, header, default=None):
+        "Get one attribute of an edge without materializing its dictionary."
+        row = self.get_index().get(edge)
+        column = self.columns.get(header)
+        if row is None or column is None:
+            return default
+        (interner, codes) = column
+        code = codes[row]
+        if code == MISSING:
+            return default
+        return interner.values[code]
+
+    # dictionary interface
+
+    def get(self, edge, default=None):
+        row = self.get_index().get(edge)
+        if row is None:
+            return default
+        return self.row_attributes(row)
+
+    def __getitem__(self, edge):
+        return self.row_attributes(self.get_index()[edge])
+
+    def __setitem__(self, edge, attributes):
+        row = self.get_index().get(edge)
+        if row is not None:
+            for header in self.headers:
+                self.columns[header][1][row] = MISSING
+        self.update_edge(edge, attributes)
+
+    def __contains__(self, edge):
+        return edge in self.get_index()
+
+    def __len__(self):
+        return len(self.get_index())
+
+    def __iter__(self):
+        return iter(self.get_index())
+
+    def keys(self):
+        return list(self.get_index())
+
+    def items(self):
+        return [(edge, self.row_attributes(row)) for (edge, row) in self.get_index().items()]
+
+    def copy(self):
+        result = EdgeAttributeStore()
+        result.nodes = self.nodes.copy()
+        result.sources = code_array(self.sources)
+        result.targets = code_array(self.targets)
+        result.headers = list(self.headers)
+        result.columns = dict((header, (interner.copy(), code_array(codes)))
+                              for (header, (interner, codes)) in self.columns.items())
+        result._index = None
+        return result
+
+    def nbytes(self):
+        "Approximate size of the code arrays in bytes."
+        arrays = [self.sources, self.targets] + [codes for (_, codes) in self.columns.values()]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    # json_mixin protocol; same encoding as a plain edge dictionary.
+
+    def to_json_value(self):
+        return list(self.items())
+
+    def from_json_value(self, alist):
+        result = EdgeAttributeStore()
+        for (edge, attributes) in alist:
+            result.update_edge(tuple(edge), attributes)
+        return result
@@ -109,9 +109,8 @@ class ExonExplorer(traitlets.HasTraits):
         svg.change_element(sname, atts)
 
     def load_gtf(self, filename):
-        f = open(filename)
         self.info.value = "loading GTF data from file " + repr(filename)
-        self.data.load(f)
+        self.data.load_file(filename)
         self.info.value = "loaded " + repr(filename)
 
     def view_genes(self, gene_ids, old_gene_ids=None):
@@ -69,9 +69,13 @@ class GenomeWiggle(traitlets.HasTraits):
         print ("done", gtf_file_name)
         #self.draw()
 
-    def load_wiggle(self, wig_file_name):
+    def load_wiggle(self, wig_file_name, cache=False):
+        """
+        Load a WIG or signal track file.  If cache is true a WIG file is
+        converted to a signal track file next to it (see WigData.load_filename).
+        """
         wig = bindings.WigData()
         print ("loading", wig_file_name)
-        wig.load_filename(wig_file_name)
+        wig.load_filename(wig_file_name, cache=cache)
         print ("done", wig_file_name)
         self.wigs.append(wig)
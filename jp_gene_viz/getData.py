@@ -1,5 +1,9 @@
 from jp_gene_viz import dGraph
-import math
+from jp_gene_viz import binary_network
+from jp_gene_viz import sidecar
+from contextlib import contextmanager
+import gc
+import numpy
 
 
 network0 = ("../../../misc/networks/"
@@ -7,7 +11,7 @@ network0 = ("../../../misc/networks/"
             "Prior_50_weight_1_TFA_tau1.tsv")
 
 
-def read_network(fn=network0, limit=None, threshhold=None):
+def read_network(fn=network0, limit=None, threshhold=None, klass=None):
     """
     Read a tab delimited file containing at least 3 columns:
     regulator_name, target_name, beta_value_number.
@@ -15,26 +19,152 @@ def read_network(fn=network0, limit=None, threshhold=None):
     the specified weights.
 
     The first line of the file is assumed to be a header line.  It is skipped.
+
+    Files in the compact binary network format (see binary_network.write_network)
+    are memory mapped instead of parsed.
+
+    klass is the graph class to build (default dGraph.WGraph); for example
+    csr_graph.CSRGraph for array based storage.
     """
-    f = open(fn)
-    headers = f.readline().strip().split("\t")
-    G = dGraph.WGraph()
+    if klass is None:
+        klass = dGraph.WGraph
+    if binary_network.is_binary_network(fn):
+        return binary_network.read_network(fn, limit, threshhold, klass=klass)
+    f = open(fn, "rb")
+    headers = text(f.readline()).strip().split("\t")
+    G = klass()
     count = 0
-    for dataline in f:
-        columns = dataline.strip().split("\t")
-        [regulator, target, beta_s] = columns[:3]
-        beta = float(beta_s)
-        assert not math.isnan(beta), "nan beta in row " + repr(columns)
-        assert not math.isinf(beta), "inf beta in row " + repr(columns)
-        if threshhold is not None and  abs(beta) < threshhold:
-            continue
-        attributes = dict(zip(headers, columns))
-        G.add_edge(regulator, target, beta, attributes)
-        count += 1
-        if limit is not None and count > limit:
-            break
+    with gc_paused():
+        for chunk in text_chunks(f):
+            (starts, ends, betas) = parse_beta_column(chunk)
+            if threshhold is not None:
+                # filter on the parsed betas before building any per-edge objects.
+                selected = numpy.abs(betas) >= threshhold
+                starts = starts[selected]
+                ends = ends[selected]
+                betas = betas[selected]
+            if limit is not None:
+                # read_network keeps limit + 1 edges.
+                remaining = limit + 1 - count
+                starts = starts[:remaining]
+                ends = ends[:remaining]
+                betas = betas[:remaining]
+            rows = [text(chunk[start:end]).strip().split("\t")
+                    for (start, end) in zip(starts.tolist(), ends.tolist())]
+            G.add_edge_rows(headers, rows, betas.tolist())
+            count += len(rows)
+            if limit is not None and count > limit:
+                break
     return G
 
+
+# Approximate number of bytes of text parsed at a time by read_network.
+CHUNK_SIZE = 1 << 22
+
+NEWLINE = ord("\n")
+TAB = ord("\t")
+CARRIAGE_RETURN = ord("\r")
+SPACE = ord(" ")
+
+
+def text(line):
+    "Convert a line of bytes read from a file to a native string."
+    if isinstance(line, str):
+        return line
+    return line.decode("utf-8")
+
+
+def text_chunks(f, chunk_size=CHUNK_SIZE):
+    "Generate chunks of about chunk_size bytes from a file, ending at line boundaries."
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        if not chunk.endswith(b"\n"):
+            chunk += f.readline()
+        yield chunk
+
+
+def parse_beta_column(chunk):
+    """
+    Find the lines of a chunk of tab separated text and parse the
+    third (beta) column of every line using numpy only.
+    Return arrays of line start offsets, line end offsets and beta values.
+    Blank lines are skipped.
+    """
+    buf = numpy.frombuffer(chunk, dtype=numpy.uint8)
+    n = len(buf)
+    newlines = numpy.flatnonzero(buf == NEWLINE)
+    ends = newlines
+    if not len(newlines) or newlines[-1] != n - 1:
+        ends = numpy.append(newlines, n)
+    starts = numpy.append(0, newlines + 1)[:len(ends)]
+    tabs = numpy.flatnonzero(buf == TAB)
+    first_tab = numpy.searchsorted(tabs, starts)
+    ntabs = numpy.searchsorted(tabs, ends) - first_tab
+    # skip blank lines
+    nonblank = numpy.array([bool(chunk[a:b].strip()) for (a, b) in
+                            zip(starts[ntabs == 0].tolist(), ends[ntabs == 0].tolist())],
+                           dtype=bool)
+    keep = ntabs > 0
+    keep[ntabs == 0] = nonblank
+    starts = starts[keep]
+    ends = ends[keep]
+    first_tab = first_tab[keep]
+    ntabs = ntabs[keep]
+    if not len(starts):
+        # nothing but blank lines.
+        return (starts, ends, numpy.zeros((0,), dtype=numpy.float64))
+    short = numpy.flatnonzero(ntabs < 2)
+    if len(short):
+        index = short[0]
+        raise ValueError("too few columns in row " + repr(chunk[starts[index]:ends[index]]))
+    # the beta column lies between the second tab and the third tab or the line end.
+    beta_starts = tabs[first_tab + 1] + 1
+    beta_ends = ends.copy()
+    more = ntabs > 2
+    beta_ends[more] = tabs[first_tab[more] + 2]
+    # blank out everything but the beta column and parse what remains.
+    delta = numpy.zeros(n + 1, dtype=numpy.int8)
+    delta[beta_starts] += 1
+    delta[beta_ends] -= 1
+    in_column = numpy.cumsum(delta[:n]) > 0
+    column_text = numpy.where(in_column & (buf != CARRIAGE_RETURN), buf, SPACE).astype(numpy.uint8)
+    betas = numpy.fromstring(column_text.tobytes(), dtype=numpy.float64, sep=" ")
+    if len(betas) != len(starts):
+        # report the first unparseable beta the way float() would.
+        for (a, b) in zip(beta_starts.tolist(), beta_ends.tolist()):
+            float(text(chunk[a:b]))
+        raise ValueError("could not parse beta column " + repr(chunk[:100]))
+    check_betas(betas, chunk, starts, ends)
+    return (starts, ends, betas)
+
+
+@contextmanager
+def gc_paused():
+    """
+    Suspend cyclic garbage collection while building many small objects.
+    (Bulk loading otherwise triggers repeated full collections.)
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def check_betas(betas, chunk, starts, ends):
+    "Reject nan or inf beta values in a parsed chunk."
+    bad = numpy.flatnonzero(~numpy.isfinite(betas))
+    if len(bad):
+        index = bad[0]
+        columns = text(chunk[starts[index]:ends[index]]).strip().split("\t")
+        kind = "nan" if numpy.isnan(betas[index]) else "inf"
+        raise AssertionError(kind + " beta in row " + repr(columns))
+
+
 expr0 = ("../../../misc/networks/"
          "th17_whole_KC_cut_prcnt_20_num_tfs_"
          "28_sam_0_deseq_cut_0.25_Aug_8_2012_priorCut1p0.tsv")
@@ -79,3 +209,80 @@ def read_tsv(fn=expr1):
         row_names.append(rowname)
         all_data.append(values)
     return (row_names, column_names, all_data)
+
+
+# sidecar holding the parsed array of an expression matrix TSV file.
+MATRIX_SUFFIX = ".matrix.npy"
+
+
+def read_matrix(fn=expr1, dtype=numpy.float64, cache=True):
+    """
+    Read a table of numbers in the format of read_tsv, returning
+    (row_names, column_names, array) with the values in a numpy array of dtype.
+
+    Rows are parsed directly into a preallocated array.  If cache is true
+    the array is saved in a sidecar .npy file next to the source, and later
+    loads of the unchanged source memory map the sidecar (copy on write)
+    instead of parsing.
+    """
+    dtype = numpy.dtype(dtype)
+    if cache:
+        metadata = sidecar.read_index(fn, MATRIX_SUFFIX)
+        if metadata is not None and metadata.get("dtype") == dtype.str:
+            path = sidecar.sidecar_path(fn, MATRIX_SUFFIX)
+            try:
+                array = numpy.load(path, mmap_mode="c")
+            except (IOError, ValueError):
+                array = None
+            if array is not None and array.shape == (len(metadata["rows"]), len(metadata["columns"])):
+                return (metadata["rows"], metadata["columns"], array)
+    signature = sidecar.source_signature(fn)
+    (row_names, column_names, array) = parse_matrix(fn, dtype)
+    if cache:
+        temp = sidecar.writable_path(fn, MATRIX_SUFFIX)
+        if temp is not None:
+            with open(temp, "wb") as f:
+                numpy.save(f, array)
+            metadata = {"dtype": dtype.str, "rows": row_names, "columns": column_names,
+                        "signature": signature}
+            sidecar.commit(fn, MATRIX_SUFFIX, temp, metadata)
+    return (row_names, column_names, array)
+
+
+def parse_matrix(fn, dtype=numpy.float64):
+    "Parse a read_tsv format file into (row_names, column_names, array)."
+    nlines = count_lines(fn)
+    with open(fn, "rb") as f:
+        heading = text(f.readline())
+        assert heading[0] == "\t", "expect tab first in headings " + repr(heading)
+        column_names = [x.strip() for x in heading[1:].split("\t")]
+        ncols = len(column_names)
+        array = numpy.empty((max(nlines - 1, 0), ncols), dtype=dtype)
+        row_names = []
+        nrows = 0
+        for dataline in f:
+            (rowname, valuestr) = (text(dataline).split("\t", 1) + [""])[:2]
+            if not rowname.strip() and not valuestr.strip():
+                continue
+            values = numpy.fromstring(valuestr, dtype=numpy.float64, sep="\t")
+            assert len(values) == ncols, repr((len(values), ncols))
+            array[nrows] = values
+            row_names.append(rowname.strip())
+            nrows += 1
+    return (row_names, column_names, array[:nrows])
+
+
+def count_lines(fn, chunk_size=CHUNK_SIZE):
+    "Count the lines in a file, including a final unterminated line."
+    count = 0
+    last = b"\n"
+    with open(fn, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            count += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        count += 1
+    return count
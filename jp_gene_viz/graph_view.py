@@ -0,0 +1,485 @@
+"""
+Lightweight filtered views of a graph.
+
+An EdgeTable holds the edges of a graph in numpy arrays sorted by
+(source id, target id).  A GraphView is a WGraph showing the edges of a
+table selected by a boolean mask, with its own node weights.  Making a
+view allocates only the mask: the table is shared by every view of the
+same graph contents, and the node weights are shared with the graph they
+came from.  The first change to the edges or the node weights of a view
+copies them (copy on write), so a view behaves like an independent graph.
+"""
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy
+
+from jp_gene_viz import dGraph
+from jp_gene_viz import csr_graph
+
+
+class EdgeTable(object):
+
+    """
+    The edges of a graph as arrays sorted by (source id, target id), where
+    names[i] is the node with id i.  A table is a snapshot: it does not
+    follow later changes to the graph it was made from.
+    """
+
+    def __init__(self, G):
+        (names, sources, targets, weights) = G.graph_arrays()
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        keys = csr_graph.edge_key(sources, targets)
+        order = numpy.argsort(keys, kind="mergesort")
+        self.names = names
+        self.ids = dict((name, i) for (i, name) in enumerate(names))
+        self.keys = keys[order]
+        self.sources = sources[order]
+        self.targets = targets[order]
+        self.weights = numpy.asarray(weights, dtype=numpy.float64)[order]
+        # edges of node i are at out_indptr[i]:out_indptr[i+1] and
+        # in_order[in_indptr[i]:in_indptr[i+1]]; built on demand.
+        self._out_indptr = None
+        self._in_index = None
+        # weight ordered edges and node strengths for thresholds; built on demand.
+        self._weight_index = None
+        self._node_strengths = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def position(self, edge):
+        "Index of edge in the table, or None if it is not there."
+        ids = self.ids
+        (f, t) = edge
+        f_id = ids.get(f)
+        t_id = ids.get(t)
+        if f_id is None or t_id is None:
+            return None
+        key = csr_graph.edge_key(f_id, t_id)
+        keys = self.keys
+        i = int(numpy.searchsorted(keys, key))
+        if i < len(keys) and keys[i] == key:
+            return i
+        return None
+
+    def positions_of(self, edges):
+        "Array of the positions of a list of edges in the table, -1 for edges not there."
+        ids = self.ids
+        sources = numpy.array([ids.get(f, -1) for (f, t) in edges], dtype=numpy.int64)
+        targets = numpy.array([ids.get(t, -1) for (f, t) in edges], dtype=numpy.int64)
+        known = (sources >= 0) & (targets >= 0)
+        keys = csr_graph.edge_key(sources, targets)
+        result = numpy.searchsorted(self.keys, keys)
+        found = known & (result < len(self.keys))
+        found[found] = self.keys[result[found]] == keys[found]
+        result[~found] = -1
+        return result
+
+    def edges(self, positions):
+        "List of (source, target) name pairs for the edges at positions."
+        names = self.names
+        sources = self.sources[positions].tolist()
+        targets = self.targets[positions].tolist()
+        return [(names[f], names[t]) for (f, t) in zip(sources, targets)]
+
+    def node_mask(self, nodes):
+        "Boolean array over node ids marking the nodes (unknown ones are ignored)."
+        ids = self.ids
+        result = numpy.zeros((len(self.names),), dtype=bool)
+        result[[ids[n] for n in nodes if n in ids]] = True
+        return result
+
+    def out_positions(self, node):
+        "Positions of the edges from node."
+        i = self.ids.get(node)
+        if i is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        if self._out_indptr is None:
+            self._out_indptr = numpy.searchsorted(self.sources, numpy.arange(len(self.names) + 1))
+        indptr = self._out_indptr
+        return numpy.arange(indptr[i], indptr[i + 1])
+
+    def in_positions(self, node):
+        "Positions of the edges to node."
+        i = self.ids.get(node)
+        if i is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        if self._in_index is None:
+            order = numpy.argsort(self.targets, kind="mergesort")
+            indptr = numpy.searchsorted(self.targets[order], numpy.arange(len(self.names) + 1))
+            self._in_index = (order, indptr)
+        (order, indptr) = self._in_index
+        return order[indptr[i]:indptr[i + 1]]
+
+    def weight_index(self):
+        """
+        ((positive, positive_abs), (negative, negative_abs), zero): the
+        positions of the positive and of the negative weight edges in
+        order of increasing abs(weight), with those abs(weight) values,
+        and the positions of the zero weight edges.
+        """
+        if self._weight_index is None:
+            weights = self.weights
+            runs = []
+            for selected in (weights > 0, weights < 0):
+                positions = numpy.flatnonzero(selected)
+                absolute = numpy.abs(weights[positions])
+                order = numpy.argsort(absolute, kind="mergesort")
+                runs.append((positions[order], absolute[order]))
+            zero = numpy.flatnonzero(weights == 0)
+            self._weight_index = (runs[0], runs[1], zero)
+        return self._weight_index
+
+    def threshold_positions(self, value, positives=True, negatives=True):
+        """
+        Positions of the edges with abs(weight) >= value, leaving out
+        positive or negative weights if requested.  Zero weights have no
+        sign and are kept if value <= 0.
+        """
+        (positive, negative, zero) = self.weight_index()
+        pieces = []
+        for (include, (positions, absolute)) in ((positives, positive), (negatives, negative)):
+            if include:
+                pieces.append(positions[numpy.searchsorted(absolute, value, "left"):])
+        if value <= 0:
+            pieces.append(zero)
+        if not pieces:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        return numpy.concatenate(pieces)
+
+    def threshold_mask(self, value, positives=True, negatives=True, nodes=None):
+        """
+        Edge mask selecting the threshold_positions edges, leaving out
+        edges with an end not in nodes if nodes is given.
+        """
+        positions = self.threshold_positions(value, positives, negatives)
+        if nodes is not None:
+            node_mask = self.node_mask(nodes)
+            positions = positions[node_mask[self.sources[positions]] & node_mask[self.targets[positions]]]
+        result = numpy.zeros((len(self),), dtype=bool)
+        result[positions] = True
+        return result
+
+    def node_strengths(self, positives=True, negatives=True):
+        """
+        Sorted array of, for each node with edges of the allowed signs, the
+        largest abs(weight) of those edges.
+        """
+        key = (bool(positives), bool(negatives))
+        result = self._node_strengths.get(key)
+        if result is None:
+            positions = self.threshold_positions(0, positives, negatives)
+            absolute = numpy.abs(self.weights[positions])
+            strength = numpy.zeros((len(self.names),), dtype=numpy.float64) - 1
+            numpy.maximum.at(strength, self.sources[positions], absolute)
+            numpy.maximum.at(strength, self.targets[positions], absolute)
+            result = self._node_strengths[key] = numpy.sort(strength[strength >= 0])
+        return result
+
+    def threshold_counts(self, value, positives=True, negatives=True):
+        """
+        (edges, nodes): the number of edges threshold_positions would select
+        and the number of nodes at their ends, found by binary search.
+        """
+        (positive, negative, zero) = self.weight_index()
+        edges = 0
+        for (include, (positions, absolute)) in ((positives, positive), (negatives, negative)):
+            if include:
+                edges += len(absolute) - int(numpy.searchsorted(absolute, value, "left"))
+        if value <= 0:
+            edges += len(zero)
+        strengths = self.node_strengths(positives, negatives)
+        nodes = len(strengths) - int(numpy.searchsorted(strengths, value, "left"))
+        return (edges, nodes)
+
+
+def edge_table(G):
+    "The EdgeTable for the edges of G, rebuilt only after they change."
+    revision = getattr(G.edge_weights, "revision", None)
+    cached = getattr(G, "_edge_table", None)
+    if revision is not None and cached is not None and cached[0] == revision:
+        return cached[1]
+    result = EdgeTable(G)
+    G._edge_table = (revision, result)
+    return result
+
+
+class CopyOnWriteDict(MutableMapping):
+
+    """
+    Dictionary reading from a dictionary shared with others, which is
+    copied before the first change.
+    """
+
+    def __init__(self, data=None, owned=False):
+        if data is None:
+            data = {}
+            owned = True
+        self._data = data
+        self._owned = owned
+
+    def share(self):
+        "A CopyOnWriteDict with the same contents; both copy before changing."
+        self._owned = False
+        return CopyOnWriteDict(self._data)
+
+    def _own(self):
+        if not self._owned:
+            self._data = dict(self._data)
+            self._owned = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._own()[key] = value
+
+    def __delitem__(self, key):
+        del self._own()[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def copy(self):
+        return dict(self._data)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+def shared(node_weights):
+    "Copy on write version of a node weights dictionary, sharing its storage."
+    if isinstance(node_weights, CopyOnWriteDict):
+        return node_weights.share()
+    return CopyOnWriteDict(node_weights)
+
+
+class MaskedEdgeWeights(MutableMapping):
+
+    """
+    Dictionary-like view of the edge weights of a GraphView.  Reads come
+    from the table entries selected by the mask; the first change copies
+    the selected edges into an ordinary EdgeWeights dictionary, which is
+    used from then on.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        # the mask never changes, so neither do the unmaterialized contents.
+        self._revision = next(dGraph.REVISIONS)
+        self._positions = None
+
+    @property
+    def materialized(self):
+        return self.graph._edge_weights
+
+    @property
+    def version(self):
+        ew = self.materialized
+        if ew is not None:
+            return ew.version
+        return 0
+
+    @property
+    def revision(self):
+        ew = self.materialized
+        if ew is not None:
+            return ew.revision
+        return self._revision
+
+    def positions(self):
+        "Table positions of the visible edges."
+        if self._positions is None:
+            self._positions = numpy.flatnonzero(self.graph.edge_mask)
+        return self._positions
+
+    def __getitem__(self, edge):
+        ew = self.materialized
+        if ew is not None:
+            return ew[edge]
+        graph = self.graph
+        position = graph.table.position(edge)
+        if position is None or not graph.edge_mask[position]:
+            raise KeyError(edge)
+        return float(graph.table.weights[position])
+
+    def __setitem__(self, edge, weight):
+        self.graph.materialize_edges()[edge] = weight
+
+    def __delitem__(self, edge):
+        del self.graph.materialize_edges()[edge]
+
+    def __contains__(self, edge):
+        ew = self.materialized
+        if ew is not None:
+            return edge in ew
+        position = self.graph.table.position(edge)
+        return position is not None and bool(self.graph.edge_mask[position])
+
+    def __iter__(self):
+        ew = self.materialized
+        if ew is not None:
+            return iter(ew)
+        return iter(self.keys())
+
+    def __len__(self):
+        ew = self.materialized
+        if ew is not None:
+            return len(ew)
+        return len(self.positions())
+
+    def keys(self):
+        ew = self.materialized
+        if ew is not None:
+            return list(ew.keys())
+        return self.graph.table.edges(self.positions())
+
+    def values(self):
+        ew = self.materialized
+        if ew is not None:
+            return list(ew.values())
+        return self.graph.table.weights[self.positions()].tolist()
+
+    def items(self):
+        ew = self.materialized
+        if ew is not None:
+            return list(ew.items())
+        return list(zip(self.keys(), self.values()))
+
+    def copy(self):
+        return dGraph.EdgeWeights(self.items())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def _visible(self, positions):
+        return positions[self.graph.edge_mask[positions]]
+
+    def targets(self, node):
+        ew = self.materialized
+        if ew is not None:
+            return ew.targets(node)
+        table = self.graph.table
+        return [table.names[t] for t in table.targets[self._visible(table.out_positions(node))].tolist()]
+
+    def sources(self, node):
+        ew = self.materialized
+        if ew is not None:
+            return ew.sources(node)
+        table = self.graph.table
+        return [table.names[f] for f in table.sources[self._visible(table.in_positions(node))].tolist()]
+
+    def edges_from(self, node):
+        return [(node, t) for t in self.targets(node)]
+
+    def edges_to(self, node):
+        return [(f, node) for f in self.sources(node)]
+
+
+class GraphView(dGraph.WGraph):
+
+    """
+    WGraph showing the edges of an EdgeTable selected by a boolean edge
+    mask (all edges if None).  node_weights is shared copy on write.
+    The mask must not be changed after the view is made.
+    """
+
+    def __init__(self, table, edge_mask=None, node_weights=None,
+                 node_color_interpolator=None, edge_color_interpolator=None):
+        super(GraphView, self).__init__(node_color_interpolator, edge_color_interpolator)
+        if edge_mask is None:
+            edge_mask = numpy.ones((len(table),), dtype=bool)
+        assert len(edge_mask) == len(table), "edge mask does not match the table"
+        self.table = table
+        self.edge_mask = edge_mask
+        self._edge_weights = None
+        self._masked = MaskedEdgeWeights(self)
+        if node_weights is not None:
+            self.node_weights = node_weights
+
+    def get_edge_weights(self):
+        result = self._edge_weights
+        if result is None:
+            result = self._masked
+        return result
+
+    edge_weights = property(get_edge_weights, dGraph.WGraph.set_edge_weights)
+
+    def get_node_weights(self):
+        return self._nodes
+
+    def set_node_weights(self, adict):
+        if not isinstance(adict, CopyOnWriteDict):
+            adict = CopyOnWriteDict(adict, owned=True)
+        self._nodes = adict
+
+    node_weights = property(get_node_weights, set_node_weights)
+
+    def materialize_edges(self):
+        "Copy the visible edges into an EdgeWeights dictionary and return it."
+        if self._edge_weights is None:
+            self.edge_weights = self._masked.copy()
+        return self._edge_weights
+
+    def clone(self):
+        if self._edge_weights is not None:
+            return super(GraphView, self).clone()
+        result = GraphView(self.table, self.edge_mask, shared(self.node_weights))
+        result.node_radius = self.node_radius.copy()
+        result.edge_attributes = self.edge_attributes
+        result.reset_colorization(self)
+        return result
+
+    def weights_extrema(self):
+        if self._edge_weights is not None:
+            return super(GraphView, self).weights_extrema()
+        ew = self.table.weights[self.edge_mask]
+        nw = list(self.node_weights.values())
+        mn = Mn = me = Me = 0
+        if len(ew):
+            me = float(ew.min())
+            Me = float(ew.max())
+        if nw:
+            mn = min(nw)
+            Mn = max(nw)
+        return (Me, me, Mn, mn)
+
+
+def view(table, edge_mask, like):
+    """
+    GraphView of the table edges selected by edge_mask, sharing the node
+    weights, node radii, edge attributes and colors of the graph like.
+    """
+    result = GraphView(table, edge_mask, shared(like.node_weights))
+    result.node_radius = like.node_radius.copy()
+    result.edge_attributes = like.edge_attributes
+    result.reset_colorization(like)
+    return result
+
+
+def edge_positions(G):
+    "(table, positions): an EdgeTable holding the edges of G, and their positions in it."
+    if isinstance(G, GraphView) and G._edge_weights is None:
+        return (G.table, G.edge_weights.positions())
+    table = edge_table(G)
+    return (table, numpy.arange(len(table)))
+
+
+def graph_view(G, edge_mask=None):
+    "GraphView of the edges of G selected by edge_mask (all by default)."
+    return view(edge_table(G), edge_mask, G)
@@ -3,8 +3,22 @@ Parse GTF format into a JSON compatible sequence of dictionaries.
 
 GTF format is described here:
 http://useast.ensembl.org/info/website/upload/gff.html?redirect=no
+
+Large annotation files may be indexed once (see GTFIndex) so that the
+features of a few genes or a genomic range can be read without parsing
+the whole file.
 """
 
+import numpy
+
+from jp_gene_viz import sidecar
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
 def gtf_attributes(attr_str):
     """
     Parse an attribute list like
@@ -25,6 +39,50 @@ def gtf_attributes(attr_str):
     return result
 
 
+def gtf_attribute_value(attr_str, key):
+    """
+    Find the value for one key in an attribute list without parsing the rest.
+    Return None if the key is not present.
+    """
+    for chunk in attr_str.split(";"):
+        chunk = chunk.strip()
+        if chunk.startswith(key + " "):
+            v = chunk[len(key) + 1:]
+            if v.startswith('"') and v.endswith('"'):
+                v = v[1:-1]
+            return v
+    return None
+
+
+class LazyAttributes(Mapping):
+
+    """
+    Read only mapping for an attribute list, parsed on first access.
+    """
+
+    def __init__(self, attr_str):
+        self.attr_str = attr_str
+        self._parsed = None
+
+    def parsed(self):
+        result = self._parsed
+        if result is None:
+            result = self._parsed = gtf_attributes(self.attr_str)
+        return result
+
+    def __getitem__(self, key):
+        return self.parsed()[key]
+
+    def __iter__(self):
+        return iter(self.parsed())
+
+    def __len__(self):
+        return len(self.parsed())
+
+    def __repr__(self):
+        return repr(self.parsed())
+
+
 # Indices are 1-based in the docs; zero based here
 parse = [
     (0, "seqname", str),
@@ -39,7 +97,7 @@ parse = [
     ]
 
 
-def gtf_line_to_dict(line):
+def gtf_line_to_dict(line, lazy_attributes=False):
     result = {}
     line = line.strip()
     fields = line.split("\t")
@@ -47,7 +105,10 @@ def gtf_line_to_dict(line):
         value = None
         field = fields[index]
         if field != ".":
-            value = parser(field)
+            if lazy_attributes and parser is gtf_attributes:
+                value = LazyAttributes(field)
+            else:
+                value = parser(field)
         result[keyname] = value
     return result
 
@@ -76,12 +137,22 @@ class GTFData(object):
     def __init__(self):
         self.all_dicts = []
         self.gene_id_to_dicts = {}
+        # GTFIndex when loaded with load_file
+        self.index = None
 
     def load(self, lines):
         self.all_dicts.extend(gtf_lines_to_dicts(lines))
         self.gene_id_to_dicts = gtf_dicts_by_gene_id(self.all_dicts)
 
+    def load_file(self, filename):
+        """
+        Use the (cached) index of a GTF file instead of loading every line.
+        """
+        self.index = GTFIndex(filename)
+
     def get_gene_features(self, gene_ids, feature='exon'):
+        if self.index is not None:
+            return self.index.get_gene_features(gene_ids, feature)
         g2d = self.gene_id_to_dicts
         result = {}
         for gene_id in gene_ids:
@@ -91,6 +162,159 @@ class GTFData(object):
         return result
 
 
+# sidecar holding the index table of a GTF file.
+INDEX_SUFFIX = ".index.npy"
+
+# columns of the index table, which has one row per feature line
+# sorted by seqname code and start position.
+OFFSET = 0      # byte offset of the line in the file
+SEQNAME = 1     # code of the seqname
+START = 2
+END = 3
+FEATURE = 4     # code of the feature kind
+GENE = 5        # code of the lower cased gene_id, MISSING if none
+BY_GENE = 6     # rows in order of gene code (a permutation, not a per-row value)
+GENE_SORTED = 7 # GENE of the row BY_GENE refers to
+NCOLUMNS = 8
+
+MISSING = -1
+
+
+class GTFIndex(object):
+
+    """
+    On disk index of a GTF file: gene ids and a sorted per-seqname interval
+    table mapped to byte offsets of the feature lines.  The index is built
+    in one pass over the file and saved as a sidecar next to it; later uses
+    memory map the sidecar as long as the GTF file is unchanged.
+    Lines are only parsed (with lazily decoded attributes) when requested.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        metadata = sidecar.read_index(filename, INDEX_SUFFIX)
+        table = None
+        if metadata is not None:
+            try:
+                table = numpy.load(sidecar.sidecar_path(filename, INDEX_SUFFIX), mmap_mode="r")
+            except (IOError, ValueError):
+                table = None
+        if table is None:
+            (metadata, table) = self.build(filename)
+        self.table = table
+        self.seqnames = metadata["seqnames"]
+        self.features = metadata["features"]
+        self.genes = metadata["genes"]
+        self.max_length = metadata["max_length"]
+        self.seqname_codes = dict((name, i) for (i, name) in enumerate(self.seqnames))
+        self.feature_codes = dict((name, i) for (i, name) in enumerate(self.features))
+        self.gene_codes = dict((name, i) for (i, name) in enumerate(self.genes))
+
+    def build(self, filename):
+        "Scan the GTF file and save the index sidecar.  Return (metadata, table)."
+        signature = sidecar.source_signature(filename)
+        codes = {"seqnames": {}, "features": {}, "genes": {}}
+
+        def code(kind, name):
+            table = codes[kind]
+            return table.setdefault(name, len(table))
+
+        rows = []
+        offset = 0
+        with open(filename, "rb") as f:
+            for line in f:
+                length = len(line)
+                text = line.decode("utf-8") if not isinstance(line, str) else line
+                if text.strip() and not text.startswith("#"):
+                    fields = text.rstrip("\r\n").split("\t")
+                    gene_id = gtf_attribute_value(fields[8], "gene_id")
+                    gene = MISSING if gene_id is None else code("genes", gene_id.lower())
+                    start = int(fields[3]) if fields[3] != "." else MISSING
+                    end = int(fields[4]) if fields[4] != "." else MISSING
+                    rows.append((offset, code("seqnames", fields[0]), start, end,
+                                 code("features", fields[2]), gene))
+                offset += length
+        table = numpy.zeros((len(rows), NCOLUMNS), dtype=numpy.int64)
+        if rows:
+            table[:, :BY_GENE] = numpy.array(rows, dtype=numpy.int64)
+            order = numpy.lexsort((table[:, START], table[:, SEQNAME]))
+            table[:, :BY_GENE] = table[order, :BY_GENE]
+            by_gene = numpy.argsort(table[:, GENE], kind="mergesort")
+            table[:, BY_GENE] = by_gene
+            table[:, GENE_SORTED] = table[by_gene, GENE]
+        lengths = table[:, END] - table[:, START]
+        max_length = [0] * len(codes["seqnames"])
+        for (seqcode, length) in zip(table[:, SEQNAME].tolist(), lengths.tolist()):
+            max_length[seqcode] = max(max_length[seqcode], length)
+
+        def names(kind):
+            table = codes[kind]
+            return sorted(table, key=table.get)
+
+        metadata = {"seqnames": names("seqnames"), "features": names("features"),
+                    "genes": names("genes"), "max_length": max_length,
+                    "signature": signature}
+        temp = sidecar.writable_path(filename, INDEX_SUFFIX)
+        if temp is not None:
+            with open(temp, "wb") as f:
+                numpy.save(f, table)
+            sidecar.commit(filename, INDEX_SUFFIX, temp, metadata)
+        return (metadata, table)
+
+    def gene_rows(self, gene_id):
+        "Index table rows for a (lower case) gene_id."
+        code = self.gene_codes.get(gene_id)
+        if code is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        column = self.table[:, GENE_SORTED]
+        first = numpy.searchsorted(column, code, "left")
+        last = numpy.searchsorted(column, code, "right")
+        return numpy.asarray(self.table[first:last, BY_GENE])
+
+    def range_rows(self, seqname, start, end):
+        "Index table rows for features overlapping [start, end] on seqname."
+        code = self.seqname_codes.get(seqname)
+        if code is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        table = self.table
+        first = numpy.searchsorted(table[:, SEQNAME], code, "left")
+        last = numpy.searchsorted(table[:, SEQNAME], code, "right")
+        starts = table[first:last, START]
+        # features starting more than max_length before start cannot overlap.
+        low = numpy.searchsorted(starts, start - self.max_length[code], "left")
+        high = numpy.searchsorted(starts, end, "right")
+        rows = numpy.arange(first + low, first + high)
+        return rows[table[rows, END] >= start]
+
+    def read_rows(self, rows, feature=None):
+        "Parse the lines for index table rows in file order, optionally only one feature kind."
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        if feature is not None:
+            code = self.feature_codes.get(feature)
+            if code is None:
+                return []
+            rows = rows[self.table[rows, FEATURE] == code]
+        offsets = numpy.sort(self.table[rows, OFFSET])
+        result = []
+        with open(self.filename, "rb") as f:
+            for offset in offsets.tolist():
+                f.seek(offset)
+                line = f.readline()
+                if not isinstance(line, str):
+                    line = line.decode("utf-8")
+                result.append(gtf_line_to_dict(line, lazy_attributes=True))
+        return result
+
+    def get_gene_features(self, gene_ids, feature='exon'):
+        result = {}
+        for gene_id in gene_ids:
+            result[gene_id] = self.read_rows(self.gene_rows(gene_id), feature)
+        return result
+
+    def get_range_features(self, seqname, start, end, feature=None):
+        return self.read_rows(self.range_rows(seqname, start, end), feature)
+
+
 def smoke_test():
     import pprint
     atts_s = 'gene_id "Rp1"; gene_name "Rp1"; p_id "P15705"; transcript_id "NM_011283";'
@@ -0,0 +1,206 @@
+"""
+On-disk cache of computed layouts.
+
+Entries are keyed by a hash of the graph laid out (its nodes, edges and
+edge weights, independent of their order), the layout name, the fit, the
+random seed and the node categories, so a layout is reused whenever the
+same subnetwork is laid out the same way again.  Each entry is a .npz
+file holding the node names, their positions as a float array and the
+group rectangles, with node set keys stored as arrays of node numbers.
+The least recently used entries are deleted to keep the cache directory
+within max_bytes.
+
+Nothing is cached unless a directory is chosen: DEFAULT_DIRECTORY is the
+conventional place for a per-user cache.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy
+
+from jp_gene_viz import dGraph
+from jp_gene_viz import graph_view
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".jp_gene_viz", "layout_cache")
+
+SUFFIX = ".npz"
+
+
+def graph_hash(G):
+    "Hex digest of the nodes, edges and edge weights of G."
+    (table, positions) = graph_view.edge_positions(G)
+    nodes = sorted(G.node_weights)
+    rank = dict((node, i) for (i, node) in enumerate(nodes))
+    ranks = numpy.array([rank.get(name, -1) for name in table.names], dtype=numpy.int64)
+    sources = ranks[table.sources[positions]]
+    targets = ranks[table.targets[positions]]
+    weights = table.weights[positions]
+    order = numpy.lexsort((targets, sources))
+    digest = hashlib.sha1()
+    digest.update(json.dumps(nodes).encode("utf-8"))
+    for array in (sources[order], targets[order], weights[order]):
+        digest.update(numpy.ascontiguousarray(array))
+    return digest.hexdigest()
+
+
+def layout_key(G, layout_name, fit, seed=None, node_categories=None):
+    "Cache key for the layout_name layout of G with fit, seed and node_categories."
+    categories = None
+    if node_categories is not None:
+        categories = sorted((str(node), str(category)) for (node, category) in node_categories.items())
+    description = json.dumps([graph_hash(G), layout_name, fit, seed, categories])
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def encode_layout(positions, rectangles):
+    """
+    Dictionary of arrays for savez holding positions and rectangles, or
+    None if the rectangles cannot be stored.
+    """
+    names = list(positions)
+    number = dict((name, i) for (i, name) in enumerate(names))
+    xy = [positions[name] for name in names]
+    keys = []
+    members = []
+    boxes = []
+    for (key, rectangle) in (rectangles or {}).items():
+        try:
+            box = numpy.array(rectangle, dtype=numpy.float64).reshape((4,))
+        except (TypeError, ValueError):
+            return None
+        if isinstance(key, (frozenset, set)):
+            start = len(members)
+            for node in key:
+                if node not in number:
+                    number[node] = len(names)
+                    names.append(node)
+                    xy.append((numpy.nan, numpy.nan))
+                members.append(number[node])
+            keys.append(["nodes", start, len(members)])
+        else:
+            keys.append(["key", key])
+        boxes.append(box)
+    names = numpy.array(names)
+    try:
+        keys = numpy.array(json.dumps(keys))
+    except (TypeError, ValueError):
+        return None
+    if names.dtype.kind not in "SU":
+        # only strings are stored without pickling.
+        return None
+    return {
+        "names": names,
+        "positions": numpy.array(xy, dtype=numpy.float64).reshape((-1, 2)),
+        "members": numpy.array(members, dtype=numpy.int32),
+        "boxes": numpy.array(boxes, dtype=numpy.float64).reshape((-1, 4)),
+        "keys": keys,
+        }
+
+
+def decode_layout(arrays):
+    "(positions, rectangles) for arrays from encode_layout."
+    names = arrays["names"].tolist()
+    xy = arrays["positions"]
+    members = arrays["members"].tolist()
+    positioned = numpy.flatnonzero(~numpy.isnan(xy[:, 0])).tolist()
+    positions = dict((names[i], dGraph.pos(*xy[i])) for i in positioned)
+    rectangles = {}
+    for (key, box) in zip(json.loads(arrays["keys"].tolist()), arrays["boxes"]):
+        if key[0] == "nodes":
+            key = frozenset(names[i] for i in members[key[1]:key[2]])
+        else:
+            key = key[1]
+            if isinstance(key, list):
+                # JSON has no tuples
+                key = tuple(key)
+        rectangles[key] = box.copy()
+    return (positions, rectangles)
+
+
+class LayoutCache(object):
+
+    """
+    Layouts stored as files in directory, keyed by layout_key, using at
+    most max_bytes (the entry stored last is kept regardless).
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        "(positions, rectangles) stored for key, or None."
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                arrays = numpy.load(f, allow_pickle=False)
+                result = decode_layout(dict((name, arrays[name]) for name in arrays.files))
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        try:
+            # mark the entry as recently used.
+            os.utime(path, None)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, positions, rectangles=None):
+        "Store a layout for key, returning False if it cannot be stored."
+        arrays = encode_layout(positions, rectangles)
+        if arrays is None:
+            return False
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # write a temporary file and rename it, so readers never see part of an entry.
+        (handle, temporary) = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as f:
+                numpy.savez_compressed(f, **arrays)
+            os.rename(temporary, self.path(key))
+        except Exception:
+            os.remove(temporary)
+            raise
+        self.evict(keep=key)
+        return True
+
+    def entries(self):
+        "List of (last use time, bytes, key) for the entries, oldest first."
+        result = []
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith(SUFFIX):
+                    try:
+                        status = os.stat(os.path.join(self.directory, filename))
+                    except OSError:
+                        continue
+                    result.append((status.st_mtime, status.st_size, filename[:-len(SUFFIX)]))
+        result.sort()
+        return result
+
+    def nbytes(self):
+        return sum(size for (used, size, key) in self.entries())
+
+    def evict(self, keep=None):
+        "Delete least recently used entries other than keep while over max_bytes."
+        entries = self.entries()
+        total = sum(size for (used, size, key) in entries)
+        for (used, size, key) in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for (used, size, key) in self.entries():
+            os.remove(self.path(key))
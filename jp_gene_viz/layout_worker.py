@@ -0,0 +1,171 @@
+"""
+Layouts computed in a worker process.
+
+A LayoutJob runs a layout function in a multiprocessing.Process, so the
+kernel stays free to handle widget events while it runs.  A watcher
+thread in the kernel waits for the result and the progress reports (the
+stages of the worker and the time elapsed) and hands them to the kernel's
+event loop, which passes them to callbacks: the callbacks change widgets,
+so they only run on the thread which runs the cells.  Cancelling a job
+terminates the process and drops its result.
+"""
+
+import multiprocessing
+import threading
+import time
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+
+def work(queue, function, args):
+    "Run function(*args) in the worker process, reporting on queue."
+    try:
+        queue.put(("progress", "computing"))
+        result = function(*args)
+        queue.put(("progress", "sending the result"))
+        queue.put(("done", result))
+    except Exception as e:
+        queue.put(("error", "%s: %s" % (type(e).__name__, e)))
+
+
+class LayoutJob(object):
+
+    """
+    Compute function(*args) and call on_done(result), or on_error(message)
+    if it fails.  on_progress(message) is called as the job runs.  With
+    start() the computation runs in a worker process and the callbacks are
+    called by io_loop (by default the event loop of the thread calling
+    start(); without one they are called from the watcher thread); run()
+    computes in the calling thread.
+    """
+
+    # seconds between progress reports while waiting for the worker
+    progress_interval = 1.0
+
+    def __init__(self, function, args, on_done, on_error=None, on_progress=None,
+                 description="layout", io_loop=None):
+        self.function = function
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.description = description
+        self.io_loop = io_loop
+        self.process = None
+        self.thread = None
+        self.cancelled = False
+        self.finished = False
+        self.started = None
+
+    def report(self, message):
+        if self.on_progress is not None and not self.cancelled:
+            self.on_progress("%s: %s (%d seconds)" % (
+                self.description, message, time.time() - self.started))
+
+    def finish(self, kind, value):
+        if self.cancelled:
+            return
+        self.finished = True
+        if kind == "done":
+            self.on_done(value)
+        elif self.on_error is not None:
+            self.on_error(value)
+
+    def run(self):
+        "Compute the layout in this thread."
+        self.started = time.time()
+        self.report("computing")
+        try:
+            result = self.function(*self.args)
+        except Exception as e:
+            self.finish("error", "%s: %s" % (type(e).__name__, e))
+        else:
+            self.finish("done", result)
+
+    def make_process(self):
+        "The worker process, not yet started."
+        process = multiprocessing.Process(target=work, args=(self.queue, self.function, self.args))
+        process.daemon = True
+        return process
+
+    def start(self):
+        """
+        Compute the layout in a worker process, watched by a thread.
+        If the worker cannot be started (for example because the arguments
+        cannot be pickled, as spawning a process on Windows requires) the
+        error is passed to on_error at once.
+        """
+        self.started = time.time()
+        self.queue = multiprocessing.Queue()
+        if self.io_loop is None:
+            self.io_loop = current_io_loop()
+        self.process = self.make_process()
+        try:
+            self.process.start()
+        except Exception as e:
+            self.process = None
+            self.finish("error", "could not start worker: %s: %s" % (type(e).__name__, e))
+            return
+        self.thread = threading.Thread(target=self.watch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def watch(self):
+        "Wait for the worker, reporting progress."
+        queue = self.queue
+        process = self.process
+        while not self.cancelled:
+            try:
+                (kind, value) = queue.get(timeout=self.progress_interval)
+            except Empty:
+                if process.is_alive():
+                    self.deliver(self.report, "running")
+                    continue
+                try:
+                    # the result may have arrived just before the exit.
+                    (kind, value) = queue.get(timeout=self.progress_interval)
+                except Empty:
+                    (kind, value) = ("error", "worker exited with code %s" % process.exitcode)
+            if kind == "progress":
+                self.deliver(self.report, value)
+                continue
+            # read the result before joining, or a large result blocks the worker.
+            process.join()
+            self.deliver(self.finish, kind, value)
+            return
+
+    def deliver(self, method, *args):
+        "Call method(*args) on the event loop, if there is one."
+        io_loop = self.io_loop
+        if io_loop is None:
+            method(*args)
+        else:
+            io_loop.add_callback(method, *args)
+
+    def running(self):
+        return self.started is not None and not (self.finished or self.cancelled)
+
+    def cancel(self):
+        "Stop the job; its callbacks are not called afterwards."
+        self.cancelled = True
+        process = self.process
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join()
+
+    def wait(self, timeout=None):
+        "Wait for the watcher thread (if any) to finish (callbacks may still be queued on io_loop)."
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+def current_io_loop():
+    "The tornado IOLoop of the calling thread (the kernel's, in a notebook), or None."
+    try:
+        from tornado.ioloop import IOLoop
+    except ImportError:
+        return None
+    return IOLoop.current(instance=False)
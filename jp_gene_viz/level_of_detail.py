@@ -0,0 +1,339 @@
+"""
+Level of detail drawing for large networks.
+
+A Hierarchy groups positioned nodes into a tree.  The groups come from a
+layout's group_rectangles where they are keyed by node collections that
+nest (as for grid_forest layouts), and the nodes of any group holding too
+many nodes directly are split further by a quadtree over their positions,
+which makes the whole tree for layouts without groups.  Nodes are numbered
+in tree order, so the members of each group are a range of numbers.
+
+Hierarchy.cut chooses the groups to draw collapsed, as single meta-nodes,
+for a view box and a budget of drawn items: the groups covering most of
+the view are opened first, until opening another would go over budget.
+Zooming in on part of the network opens the groups there, down to single
+nodes.  summarize turns a cut into the graph of the single nodes and the
+meta-nodes and meta-edges (summing edge weights) to draw with it.
+"""
+
+import heapq
+import json
+
+import numpy
+
+from jp_gene_viz import graph_view
+
+
+def nested_groups(rectangles, index):
+    """
+    Arrays of the node numbers (from index) of the groups keyed by node
+    collections in rectangles, largest first.  Groups of less than two
+    positioned nodes, or of all of them, are left out.
+    """
+    result = []
+    if rectangles:
+        for key in rectangles:
+            if isinstance(key, (frozenset, set, tuple, list)):
+                members = [index[n] for n in key if n in index]
+                if 1 < len(members) < len(index):
+                    result.append(numpy.array(sorted(members), dtype=numpy.int64))
+    result.sort(key=len, reverse=True)
+    return result
+
+
+class Hierarchy(object):
+
+    """
+    Tree of groups over the nodes of a positions dictionary.  Group 0 holds
+    every node; group g holds the nodes numbered start[g] to end[g] - 1, of
+    which the first direct[g] are not in any child group.
+    """
+
+    # most nodes held directly by a group before they are split by position
+    leaf_size = 8
+    # deepest quadtree split (it stops for nodes at the same position)
+    max_depth = 32
+
+    def __init__(self, positions, rectangles=None):
+        names = list(positions)
+        points = numpy.array([positions[n] for n in names], dtype=numpy.float64).reshape((-1, 2))
+        index = dict((name, i) for (i, name) in enumerate(names))
+        # owner[i] is the smallest group holding node i.
+        owner = numpy.zeros((len(names),), dtype=numpy.int64)
+        parents = [-1]
+        for members in nested_groups(rectangles, index):
+            parent = owner[members[0]]
+            if (owner[members] == parent).all():
+                owner[members] = len(parents)
+                parents.append(parent)
+            # otherwise the group overlaps another one and is left out.
+        order = numpy.argsort(owner, kind="mergesort")
+        splits = numpy.searchsorted(owner[order], numpy.arange(len(parents) + 1))
+        direct = [order[splits[g]:splits[g + 1]] for g in range(len(parents))]
+        children = [[] for g in parents]
+        for (g, parent) in enumerate(parents):
+            if parent >= 0:
+                children[parent].append(g)
+        self.parents = parents
+        self.children = children
+        self.direct_nodes = direct
+        for g in range(len(parents)):
+            self.split(g, points)
+        self.number_nodes(names, points)
+
+    def add_group(self, parent, nodes):
+        g = len(self.parents)
+        self.parents.append(parent)
+        self.children.append([])
+        self.children[parent].append(g)
+        self.direct_nodes.append(nodes)
+        return g
+
+    def split(self, g, points):
+        "Split the nodes held directly by group g into quadrants, as needed."
+        stack = [(g, 0)]
+        while stack:
+            (g, depth) = stack.pop()
+            nodes = self.direct_nodes[g]
+            if len(nodes) <= self.leaf_size or depth >= self.max_depth:
+                continue
+            P = points[nodes]
+            (low, high) = (P.min(axis=0), P.max(axis=0))
+            if (low == high).all():
+                continue
+            middle = (low + high) * 0.5
+            quadrant = (P[:, 0] > middle[0]) * 1 + (P[:, 1] > middle[1]) * 2
+            parts = [nodes[quadrant == q] for q in range(4)]
+            # single nodes stay in g.
+            self.direct_nodes[g] = numpy.concatenate([nodes[:0]] + [part for part in parts if len(part) < 2])
+            for part in parts:
+                if len(part) > 1:
+                    stack.append((self.add_group(g, part), depth + 1))
+
+    def number_nodes(self, names, points):
+        "Number the nodes in tree order and find the ranges and bounds of the groups."
+        ngroups = len(self.parents)
+        start = numpy.zeros((ngroups,), dtype=numpy.int64)
+        end = numpy.zeros((ngroups,), dtype=numpy.int64)
+        direct = numpy.array([len(d) for d in self.direct_nodes], dtype=numpy.int64)
+        order = []
+        stack = [(0, False)]
+        while stack:
+            (g, done) = stack.pop()
+            if done:
+                end[g] = len(order)
+            else:
+                start[g] = len(order)
+                order.extend(self.direct_nodes[g].tolist())
+                stack.append((g, True))
+                stack.extend((c, False) for c in reversed(self.children[g]))
+        order = numpy.array(order, dtype=numpy.int64)
+        self.names = [names[i] for i in order.tolist()]
+        self.number = dict((name, i) for (i, name) in enumerate(self.names))
+        self.points = points[order].reshape((-1, 2))
+        self.start = start
+        self.end = end
+        self.direct = direct
+        # bounds (minx, miny, maxx, maxy), children before parents.
+        bounds = numpy.zeros((ngroups, 4), dtype=numpy.float64)
+        bounds[:, :2] = numpy.inf
+        bounds[:, 2:] = -numpy.inf
+        P = self.points
+        for g in range(ngroups - 1, -1, -1):
+            if direct[g]:
+                own = P[start[g]:start[g] + direct[g]]
+                bounds[g, :2] = numpy.minimum(bounds[g, :2], own.min(axis=0))
+                bounds[g, 2:] = numpy.maximum(bounds[g, 2:], own.max(axis=0))
+            parent = self.parents[g]
+            if parent >= 0:
+                bounds[parent, :2] = numpy.minimum(bounds[parent, :2], bounds[g, :2])
+                bounds[parent, 2:] = numpy.maximum(bounds[parent, 2:], bounds[g, 2:])
+        self.bounds = bounds
+        del self.direct_nodes
+
+    def __len__(self):
+        return len(self.names)
+
+    def extent(self, g, view_box):
+        "Size of the part of group g inside the view box (x, y, width, height), or None if outside."
+        (minx, miny, maxx, maxy) = self.bounds[g].tolist()
+        if view_box is not None:
+            (x, y, w, h) = view_box
+            (minx, miny) = (max(minx, x), max(miny, y))
+            (maxx, maxy) = (min(maxx, x + w), min(maxy, y + h))
+            if minx > maxx or miny > maxy:
+                return None
+        return max(maxx - minx, maxy - miny)
+
+    def inside(self, numbers, view_box):
+        "Boolean array: is the node with each of the node numbers inside the view box (x, y, width, height)?"
+        if view_box is None:
+            return numpy.ones((len(numbers),), dtype=bool)
+        (x, y, w, h) = view_box
+        points = self.points[numbers]
+        return ((points[:, 0] >= x) & (points[:, 0] <= x + w) &
+                (points[:, 1] >= y) & (points[:, 1] <= y + h))
+
+    def cut(self, view_box=None, budget=1000):
+        """
+        Sorted array of the groups to draw collapsed so that at most budget
+        items (collapsed groups and single nodes) are drawn, opening the
+        groups with the largest extent in the view box first.  Groups
+        outside the view box stay collapsed.
+        """
+        if len(self) <= budget:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        children = self.children
+        direct = self.direct
+        collapsed = set([0])
+        items = 1
+        heap = [(-(self.extent(0, view_box) or 0), 0)]
+        while heap:
+            (_, g) = heapq.heappop(heap)
+            cost = len(children[g]) + direct[g] - 1
+            if items + cost > budget:
+                continue
+            items += cost
+            collapsed.remove(g)
+            for c in children[g]:
+                collapsed.add(c)
+                extent = self.extent(c, view_box)
+                if extent is not None:
+                    heapq.heappush(heap, (-extent, c))
+        return numpy.array(sorted(collapsed), dtype=numpy.int64)
+
+    def representatives(self, collapsed):
+        """
+        Array mapping each node number to itself, or to len(self) + g for
+        nodes in the collapsed group g.
+        """
+        n = len(self)
+        result = numpy.arange(n)
+        for g in collapsed.tolist():
+            result[self.start[g]:self.end[g]] = n + g
+        return result
+
+    def numbers(self, names):
+        "Array of the node numbers of names, -1 for names not in the hierarchy."
+        number = self.number
+        return numpy.array([number.get(name, -1) for name in names], dtype=numpy.int64).reshape((-1,))
+
+
+def group_name(g):
+    return "GROUP_%d" % g
+
+
+class Summary(object):
+
+    """
+    What to draw for a graph at a level of detail: graph holds the single
+    nodes and the edges between them, groups is a list of
+    (group, (x, y), count, mean node weight) for the meta-nodes and links
+    a list of (name, (x1, y1), (x2, y2), summed weight, count) for the
+    meta-edges, which have a meta-node at one end at least.
+    """
+
+    def __init__(self, graph, groups, links):
+        self.graph = graph
+        self.groups = groups
+        self.links = links
+
+
+def summarize(hierarchy, collapsed, G, max_links=None, max_edges=None, view_box=None):
+    """
+    Summary of the graph G for the collapsed groups of hierarchy, with
+    only the max_links meta-edges of largest abs(summed weight) and the
+    max_edges edges between single nodes of largest abs(weight) if given.
+    Edges with an end in the view box are kept before any others, so
+    zooming in shows every edge in view eventually.
+    """
+    n = len(hierarchy)
+    nw = G.node_weights
+    # present[i]: node i is in G; its weight is weights[i].
+    present = numpy.zeros((n,), dtype=bool)
+    weights = numpy.zeros((n,), dtype=numpy.float64)
+    number = hierarchy.number
+    for (node, w) in nw.items():
+        i = number.get(node)
+        if i is not None:
+            present[i] = True
+            weights[i] = w
+    rep = hierarchy.representatives(collapsed)
+    rep[~present] = -1
+    # meta-nodes at the centers of their nodes in G.
+    counts = numpy.concatenate([[0], numpy.cumsum(present)])
+    sums = numpy.zeros((n + 1, 3), dtype=numpy.float64)
+    sums[1:, :2] = numpy.cumsum(hierarchy.points * present[:, numpy.newaxis], axis=0)
+    sums[1:, 2] = numpy.cumsum(weights * present)
+    centers = {}
+    groups = []
+    for g in collapsed.tolist():
+        (s, e) = (hierarchy.start[g], hierarchy.end[g])
+        count = int(counts[e] - counts[s])
+        if count:
+            (x, y, total) = ((sums[e] - sums[s]) / count).tolist()
+            centers[n + g] = (x, y)
+            groups.append((g, (x, y), count, total))
+    # edges between single nodes are drawn as they are.
+    (table, positions) = graph_view.edge_positions(G)
+    ids_to_numbers = hierarchy.numbers(table.names)
+    f = ids_to_numbers[table.sources[positions]]
+    t = ids_to_numbers[table.targets[positions]]
+    known = (f >= 0) & (t >= 0)
+    (positions, f, t) = (positions[known], rep[f[known]], rep[t[known]])
+    drawn = (f >= 0) & (t >= 0)
+    single = drawn & (f < n) & (t < n)
+    mask = numpy.zeros((len(table),), dtype=bool)
+    selected = positions[single]
+    if max_edges is not None and len(selected) > max_edges:
+        (sf, st) = (f[single], t[single])
+        in_view = hierarchy.inside(sf, view_box) | hierarchy.inside(st, view_box)
+        strongest = numpy.lexsort((-numpy.abs(table.weights[selected]), ~in_view))[:max_edges]
+        selected = selected[strongest]
+    mask[selected] = True
+    graph = graph_view.view(table, mask, G)
+    single_nodes = numpy.flatnonzero(present & (rep < n))
+    graph.node_weights = dict(zip([hierarchy.names[i] for i in single_nodes.tolist()],
+                                  weights[single_nodes].tolist()))
+    # other edges are summed into meta-edges, leaving out those inside a group.
+    meta = drawn & ~single & (f != t)
+    (f, t, w) = (f[meta], t[meta], table.weights[positions[meta]])
+    size = n + len(hierarchy.parents)
+    (keys, inverse) = numpy.unique(f * size + t, return_inverse=True)
+    totals = numpy.bincount(inverse, weights=w, minlength=len(keys))
+    multiplicity = numpy.bincount(inverse, minlength=len(keys))
+    if max_links is not None and len(keys) > max_links:
+        strongest = numpy.sort(numpy.argsort(-numpy.abs(totals), kind="mergesort")[:max_links])
+        (keys, totals, multiplicity) = (keys[strongest], totals[strongest], multiplicity[strongest])
+    names = hierarchy.names
+    points = hierarchy.points
+    links = []
+    for (key, total, count) in zip(keys.tolist(), totals.tolist(), multiplicity.tolist()):
+        ends = []
+        for i in divmod(key, size):
+            if i < n:
+                ends.append((G.node_name(names[i]), tuple(points[i].tolist())))
+            else:
+                ends.append((group_name(i - n), centers[i]))
+        ((fname, fxy), (tname, txy)) = ends
+        links.append(("LINK_" + json.dumps([fname, tname]), fxy, txy, total, count))
+    return Summary(graph, groups, links)
+
+
+def draw_summary(canvas, summary, G, nodesize=3, edgewidth=1, labels=False):
+    "Draw the meta-edges and meta-nodes of a summary with the colors of G."
+    if summary.links:
+        eci = G.get_edge_color_interpolator()
+        colors = eci.interpolate_colors([link[3] for link in summary.links])
+        for ((name, (x1, y1), (x2, y2), total, count), color) in zip(summary.links, colors):
+            width = edgewidth * min(1 + numpy.log2(count), 6)
+            canvas.line(name, x1, y1, x2, y2, color, width)
+    if summary.groups:
+        nci = G.get_node_color_interpolator()
+        colors = nci.interpolate_colors([group[3] for group in summary.groups])
+        for ((g, (x, y), count, weight), color) in zip(summary.groups, colors):
+            radius = nodesize * (1 + numpy.log2(count))
+            canvas.circle(group_name(g), x, y, radius, color, **{"fill-opacity": 0.6})
+            if labels:
+                canvas.text("GROUPLABEL_%d" % g, x, y - radius - 2, "(%d)" % count, "black",
+                            **{"text-anchor": "middle"})
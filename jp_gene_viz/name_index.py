@@ -0,0 +1,155 @@
+"""
+Case insensitive search over node, row and column names.
+
+A NameIndex keeps the case folded names in sorted order, so the names
+starting with any prefix are a contiguous range found by bisection: the
+sorted list serves as a prefix trie without a node per character.  A glob
+pattern only examines the range of its literal prefix (the part before
+the first wildcard), and all the patterns of a query are tested in one
+pass over the union of their ranges with a single compiled expression.
+Matches are reported as the original names.
+"""
+
+import bisect
+import fnmatch
+import re
+
+# characters which start a glob wildcard
+WILDCARDS = "*?["
+
+
+def fold(name):
+    "Case folded form of name used for matching."
+    return name.lower()
+
+
+def literal_prefix(pattern):
+    "The part of a glob pattern before its first wildcard."
+    for (i, c) in enumerate(pattern):
+        if c in WILDCARDS:
+            return pattern[:i]
+    return pattern
+
+
+def merge_ranges(ranges):
+    "Sorted disjoint (start, end) ranges covering ranges."
+    result = []
+    for (start, end) in sorted(ranges):
+        if start >= end:
+            continue
+        if result and start <= result[-1][1]:
+            result[-1] = (result[-1][0], max(end, result[-1][1]))
+        else:
+            result.append((start, end))
+    return result
+
+
+def any_of(expressions, flags=0):
+    "Compiled expression matching where any of the regular expressions match."
+    return re.compile("|".join("(?:%s)" % e for e in expressions), flags)
+
+
+class NameIndex(object):
+
+    """
+    Case insensitive glob, prefix and regular expression search over names.
+    Queries return the original names ordered by their folded forms.
+    """
+
+    def __init__(self, names):
+        originals = {}
+        for name in names:
+            originals.setdefault(fold(name), []).append(name)
+        # folded name -> original names with that folded form
+        self.originals = originals
+        self.folded = sorted(originals)
+
+    def __len__(self):
+        return len(self.folded)
+
+    def names(self, folded):
+        "Original names for a sequence of folded names."
+        originals = self.originals
+        return [name for f in folded for name in originals[f]]
+
+    def lookup(self, names):
+        """
+        Original names equal to any of names except for case, in the order of
+        names, each at most once (so looking up a result again gives the same).
+        """
+        originals = self.originals
+        seen = set()
+        result = []
+        for name in names:
+            f = fold(name)
+            if f not in seen:
+                seen.add(f)
+                result.extend(originals.get(f, ()))
+        return result
+
+    def prefix_range(self, prefix):
+        "(start, end) of the folded names which start with the folded prefix."
+        folded = self.folded
+        start = bisect.bisect_left(folded, prefix)
+        # the names with the prefix are a run from start: find its end.
+        (low, high) = (start, len(folded))
+        n = len(prefix)
+        while low < high:
+            middle = (low + high) // 2
+            if folded[middle][:n] == prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return (start, low)
+
+    def scan(self, ranges, test):
+        "Folded names in ranges for which test is true, in sorted order."
+        folded = self.folded
+        result = []
+        for (start, end) in merge_ranges(ranges):
+            result.extend(f for f in folded[start:end] if test(f))
+        return result
+
+    def prefix(self, prefixes):
+        "Names starting with any of prefixes."
+        ranges = [self.prefix_range(fold(p)) for p in prefixes]
+        folded = self.folded
+        return self.names(f for (start, end) in merge_ranges(ranges) for f in folded[start:end])
+
+    def glob(self, patterns):
+        "Names matching any of the fnmatch style patterns."
+        originals = self.originals
+        found = set()
+        ranges = []
+        expressions = []
+        for pattern in patterns:
+            pattern = fold(pattern)
+            prefix = literal_prefix(pattern)
+            if prefix == pattern:
+                if pattern in originals:
+                    found.add(pattern)
+            else:
+                ranges.append(self.prefix_range(prefix))
+                expressions.append(fnmatch.translate(pattern))
+        if expressions:
+            found.update(self.scan(ranges, any_of(expressions).match))
+        return self.names(sorted(found))
+
+    def regex(self, expressions):
+        "Names containing a match for any of the regular expressions, ignoring case."
+        expressions = list(expressions)
+        if not expressions:
+            return []
+        test = any_of(expressions, re.IGNORECASE).search
+        return self.names(self.scan([(0, len(self.folded))], test))
+
+
+def node_index(G):
+    "The NameIndex for the nodes of G, rebuilt only after its edges or node count change."
+    key = (getattr(G.edge_weights, "revision", None), len(G.node_weights))
+    cached = getattr(G, "_name_index", None)
+    if key[0] is not None and cached is not None and cached[0] == key:
+        return cached[1]
+    result = NameIndex(G.node_weights)
+    G._name_index = (key, result)
+    return result
@@ -0,0 +1,212 @@
+"""
+Retained drawing for SVG canvases.
+
+RetainedCanvas stands in for an SVG canvas widget.  It remembers the named
+elements last sent to the widget, and a drawing made between empty() and
+send_commands() is sent as a difference from the previous one: elements
+that are gone are deleted, elements whose attributes changed are updated
+in place with change_element, and only new elements are drawn.
+
+SVG has no way to insert an element below existing ones, so to keep the
+stacking order every element from the first one that is new (or out of
+order) to the end of the drawing is sent again.  Drawing order puts edges
+before nodes before labels, so for example new edges cost the edges above
+them plus the nodes and labels, never the whole graph.
+"""
+
+# For each drawing method, the attribute set by each positional parameter
+# after the name, or None for parameters which cannot be changed in place.
+PARAMETERS = {
+    "line": ["x1", "y1", "x2", "y2", "stroke", "stroke-width", None, None],
+    "circle": ["cx", "cy", "r", "fill", None, None],
+    "rect": ["x", "y", "width", "height", "fill", None, None],
+    "text": ["x", "y", None, "fill", None, None],
+    }
+
+# keyword parameters which cannot be changed in place.
+FIXED_KEYWORDS = ("event_cb", "style_dict")
+
+# keyword parameters which set an attribute with another name.
+KEYWORD_ATTRIBUTES = {
+    "color": "stroke",
+    "width": "stroke-width",
+    }
+
+
+class Element(object):
+
+    "A drawing call for a named element, split into changeable attributes and fixed parameters."
+
+    def __init__(self, method, name, args, kwargs):
+        self.method = method
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        attributes = {}
+        fixed = [method]
+        for (parameter, value) in zip(PARAMETERS[method], args):
+            if parameter is None:
+                fixed.append(value)
+            else:
+                attributes[parameter] = value
+        for (keyword, value) in kwargs.items():
+            if keyword in FIXED_KEYWORDS:
+                fixed.append((keyword, value))
+            else:
+                attributes[KEYWORD_ATTRIBUTES.get(keyword, keyword)] = value
+        self.attributes = attributes
+        self.fixed = fixed
+        # attributes set by change_element outside of drawings
+        self.extra = set()
+
+    def draw(self, canvas):
+        getattr(canvas, self.method)(self.name, *self.args, **self.kwargs)
+
+    def changes(self, new):
+        """
+        Attributes to change to turn this element into new, or None if that
+        is not possible in place.
+        """
+        if self.fixed != new.fixed:
+            return None
+        old_attributes = self.attributes
+        new_attributes = new.attributes
+        for att in old_attributes:
+            if att not in new_attributes and att not in self.extra:
+                return None
+        return dict((att, value) for (att, value) in new_attributes.items()
+                    if att not in old_attributes or old_attributes[att] != value)
+
+
+class RetainedCanvas(object):
+
+    """
+    Wrapper for an SVG canvas widget which sends drawings as differences.
+    Changes to drawn elements made outside of drawings must also go
+    through the wrapper (change_element and delete_names) to keep it in
+    sync, and clear() must be used instead of emptying the widget.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        # name -> Element for the elements on the canvas, in stacking order
+        self.elements = []
+        self.named = {}
+        # elements of the drawing in progress, or None
+        self.frame = None
+        self.fit_args = None
+
+    def __getattr__(self, attribute):
+        # everything else is the canvas widget's business.
+        return getattr(self.canvas, attribute)
+
+    def clear(self):
+        "Empty the canvas and forget what was drawn."
+        self.canvas.empty()
+        self.elements = []
+        self.named = {}
+        self.frame = None
+
+    def empty(self):
+        "Start a drawing which replaces everything drawn before at the next send_commands()."
+        self.frame = []
+        self.fit_args = None
+
+    def _record(self, method, name, args, kwargs):
+        if self.frame is None:
+            # drawing outside of a drawing: send it now
+            element = Element(method, name, args, kwargs)
+            element.draw(self.canvas)
+            if name is not None:
+                self._forget([name])
+                self.elements.append(element)
+                self.named[name] = element
+        else:
+            self.frame.append(Element(method, name, args, kwargs))
+
+    def line(self, name, *args, **kwargs):
+        self._record("line", name, args, kwargs)
+
+    def circle(self, name, *args, **kwargs):
+        self._record("circle", name, args, kwargs)
+
+    def rect(self, name, *args, **kwargs):
+        self._record("rect", name, args, kwargs)
+
+    def text(self, name, *args, **kwargs):
+        self._record("text", name, args, kwargs)
+
+    def fit(self, *args):
+        if self.frame is None:
+            self.canvas.fit(*args)
+        else:
+            self.fit_args = args
+
+    def change_element(self, name, attributes):
+        element = self.named.get(name)
+        if element is not None:
+            for (att, value) in attributes.items():
+                if att not in element.attributes:
+                    element.extra.add(att)
+                element.attributes[att] = value
+        self.canvas.change_element(name, attributes)
+
+    def _forget(self, names):
+        named = self.named
+        gone = set(name for name in names if name in named)
+        if gone:
+            for name in gone:
+                del named[name]
+            self.elements = [e for e in self.elements if e.name not in gone]
+
+    def delete_names(self, names):
+        self._forget(names)
+        self.canvas.delete_names(names)
+
+    def send_commands(self):
+        frame = self.frame
+        if frame is not None:
+            self.frame = None
+            self.send_frame(frame)
+            if self.fit_args is not None:
+                self.canvas.fit(*self.fit_args)
+        self.canvas.send_commands()
+
+    def send_frame(self, frame):
+        "Send the differences between the canvas and the drawing frame."
+        canvas = self.canvas
+        new_named = dict((element.name, element) for element in frame)
+        if None in new_named or len(new_named) < len(frame):
+            # unnamed or repeated names cannot be tracked: draw everything.
+            canvas.empty()
+            for element in frame:
+                element.draw(canvas)
+            self.elements = []
+            self.named = {}
+            return
+        old_named = self.named
+        removed = [element.name for element in self.elements if element.name not in new_named]
+        kept = [element.name for element in self.elements if element.name in new_named]
+        # update elements in place while they keep their stacking order.
+        changes = []
+        start = len(frame)
+        for (i, element) in enumerate(frame):
+            old = old_named.get(element.name)
+            change = None
+            if old is not None and i < len(kept) and kept[i] == element.name:
+                change = old.changes(element)
+            if change is None:
+                start = i
+                break
+            if change:
+                changes.append((element.name, change))
+        redraw = frame[start:]
+        removed.extend(element.name for element in redraw if element.name in old_named)
+        if removed:
+            canvas.delete_names(removed)
+        for (name, change) in changes:
+            canvas.change_element(name, change)
+        for element in redraw:
+            element.draw(canvas)
+        self.elements = list(frame)
+        self.named = new_named
@@ -0,0 +1,86 @@
+"""
+Sidecar cache files derived from a source data file.
+
+A sidecar lives next to its source file (source name plus a suffix) and
+is paired with a small JSON index recording the size and modification
+time of the source when the sidecar was written.  A sidecar is only
+trusted while the source still has the same size and mtime.  Failure to
+write a sidecar (read only directory, etcetera) is never an error.
+"""
+
+import json
+import os
+
+INDEX_SUFFIX = ".json"
+
+
+def source_signature(filename):
+    "Size and modification time identifying the current contents of a file."
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime]
+
+
+def sidecar_path(filename, suffix):
+    return filename + suffix
+
+
+def read_index(filename, suffix):
+    """
+    Return the metadata stored for the sidecar of filename with this suffix,
+    or None if there is no such sidecar or it is stale.
+    """
+    path = sidecar_path(filename, suffix)
+    try:
+        with open(path + INDEX_SUFFIX) as f:
+            metadata = json.load(f)
+        if not os.path.exists(path):
+            return None
+        if metadata.get("signature") != source_signature(filename):
+            return None
+    except (IOError, OSError, ValueError):
+        return None
+    return metadata
+
+
+def write_index(filename, suffix, metadata):
+    """
+    Record metadata for a freshly written sidecar of filename.
+    Pass the source_signature taken before reading the source in
+    metadata["signature"] to guard against the source changing meanwhile.
+    Return True on success.
+    """
+    path = sidecar_path(filename, suffix) + INDEX_SUFFIX
+    metadata = dict(metadata)
+    if "signature" not in metadata:
+        metadata["signature"] = source_signature(filename)
+    temp = path + ".tmp"
+    try:
+        with open(temp, "w") as f:
+            json.dump(metadata, f)
+        os.rename(temp, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def writable_path(filename, suffix):
+    """
+    Return a temporary path for writing the sidecar of filename, or None
+    if the directory is not writable.  Pass the result to commit().
+    """
+    path = sidecar_path(filename, suffix)
+    if not os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        return None
+    return path + ".tmp"
+
+
+def commit(filename, suffix, temp_path, metadata):
+    """
+    Move a sidecar written at temp_path into place and record its index.
+    Return True on success.
+    """
+    try:
+        os.rename(temp_path, sidecar_path(filename, suffix))
+    except (IOError, OSError):
+        return False
+    return write_index(filename, suffix, metadata)
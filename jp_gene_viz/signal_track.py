@@ -0,0 +1,241 @@
+"""
+Compact, randomly accessible binary storage for WIG signal tracks.
+
+A signal track file holds, for each chromosome, the sorted locations and
+heights of a bindings.WigData track cut into blocks of at most BLOCK_SIZE
+samples.  Each block is compressed separately and indexed by its first and
+last location, so a region query only reads and decompresses the blocks
+overlapping the region.  The zoom pyramid of every chromosome is stored
+uncompressed and memory mapped for drawing.
+
+File layout (little endian):
+
+    8 bytes     magic string "JPGVSIG1"
+    8 bytes     uint64 length of the JSON header
+    header      JSON: per chromosome span, counts, block index and
+                the offset, dtype and length of each zoom array
+                (blocks also hold a span per location when "spans" is true
+                for the chromosome)
+    padding     to an 8 byte boundary
+    data        compressed blocks and zoom arrays at the recorded offsets
+
+Offsets in the header are relative to the start of the data section.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy
+
+from jp_gene_viz import bindings
+
+MAGIC = b"JPGVSIG1"
+
+# suffix used for signal tracks converted from WIG files.
+SIGNAL_SUFFIX = ".jpsig"
+
+# samples per compressed block
+BLOCK_SIZE = 1 << 16
+
+COMPRESSION_LEVEL = 1
+
+
+def is_signal_track(filename):
+    "Test whether a file starts with the signal track magic string."
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def aligned(n, alignment=8):
+    return ((n + alignment - 1) // alignment) * alignment
+
+
+def write_signal_track(wig, filename, block_size=BLOCK_SIZE):
+    """
+    Store all chromosomes of a loaded WigData in a signal track file.
+    Zoom pyramids are built if they are missing.
+    """
+    pieces = []
+    offset = [0]
+
+    def add(data):
+        "Queue bytes for the data section; return their offset."
+        start = offset[0]
+        pieces.append(data)
+        padding = aligned(len(data)) - len(data)
+        if padding:
+            pieces.append(b"\0" * padding)
+        offset[0] = start + len(data) + padding
+        return start
+
+    chromosomes = []
+    for chrom in wig.chromosome_names:
+        track = wig.chromosomes[chrom]
+        if track.pyramid is None:
+            track.build_pyramid()
+        locations = numpy.asarray(track.locations).astype(bindings.LOCATION_DTYPE)
+        heights = numpy.asarray(track.heights).astype(bindings.HEIGHT_DTYPE)
+        spans = track.spans
+        blocks = []
+        for first in range(0, track.numelts, block_size):
+            L = locations[first:first + block_size]
+            H = heights[first:first + block_size]
+            data = L.astype("<u4").tobytes() + H.astype("<f4").tobytes()
+            if spans is not None:
+                data += numpy.asarray(spans[first:first + block_size]).astype("<u4").tobytes()
+            data = zlib.compress(data, COMPRESSION_LEVEL)
+            # [first location, last location, offset, compressed length, count]
+            blocks.append([int(L[0]), int(L[-1]), add(data), len(data), len(L)])
+        levels = []
+        for level in track.pyramid.levels:
+            arrays = {}
+            for field in bindings.ZoomPyramid.fields:
+                a = getattr(level, field)
+                a = a.astype(a.dtype.newbyteorder("<"))
+                arrays[field] = [add(a.tobytes()), a.dtype.str, len(a)]
+            levels.append({"bin_size": level.bin_size, "arrays": arrays})
+        chromosomes.append({
+            "chrom": chrom,
+            "span": track.span,
+            "spans": spans is not None,
+            "max_span": int(numpy.max(spans)) if spans is not None and len(spans) else track.span,
+            "numelts": track.numelts,
+            "maxheight": float(track.maxheight),
+            "blocks": blocks,
+            "levels": levels,
+            })
+    header = {"version": 1, "block_size": block_size, "chromosomes": chromosomes}
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes
+    with open(filename, "wb") as f:
+        f.write(prefix)
+        f.write(b"\0" * (aligned(len(prefix)) - len(prefix)))
+        for data in pieces:
+            f.write(data)
+    return filename
+
+
+class SignalTrackFile(object):
+
+    """
+    Reader for a signal track file.  Only the header is read on opening.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("not a signal track file: " + repr(filename))
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        self.header = header
+        self.data_start = aligned(len(MAGIC) + 8 + header_length)
+        self.chromosome_names = [c["chrom"] for c in header["chromosomes"]]
+        self.chromosome_info = dict((c["chrom"], c) for c in header["chromosomes"])
+
+    def map_array(self, offset, dtype, length):
+        dtype = numpy.dtype(str(dtype))
+        if length == 0:
+            return numpy.zeros((0,), dtype=dtype)
+        return numpy.memmap(self.filename, dtype=dtype, mode="r",
+                            offset=self.data_start + offset, shape=(length,))
+
+    def pyramid(self, chrom):
+        "Memory mapped ZoomPyramid for chrom."
+        levels = []
+        for level in self.chromosome_info[chrom]["levels"]:
+            data = [self.map_array(*level["arrays"][field])
+                    for field in bindings.ZoomPyramid.fields]
+            levels.append(bindings.ZoomLevel(level["bin_size"], *data))
+        return bindings.ZoomPyramid(levels)
+
+    def block_range(self, chrom, start_location, end_location, extra=0):
+        """
+        Indices (first, last) of the blocks holding locations in
+        [start_location, end_location], plus extra following blocks.
+        """
+        blocks = self.chromosome_info[chrom]["blocks"]
+        block_ends = [b[1] for b in blocks]
+        block_starts = [b[0] for b in blocks]
+        first = numpy.searchsorted(block_ends, start_location, "left")
+        last = numpy.searchsorted(block_starts, end_location, "right")
+        return (int(first), min(int(last) + extra, len(blocks)))
+
+    def read_blocks(self, chrom, first, last):
+        """
+        Concatenated (locations, heights, spans) of blocks first up to last.
+        spans is None if the chromosome has a single span.
+        """
+        info = self.chromosome_info[chrom]
+        blocks = info["blocks"][first:last]
+        locations = []
+        heights = []
+        spans = [] if info.get("spans") else None
+        with open(self.filename, "rb") as f:
+            for (_, _, offset, length, count) in blocks:
+                f.seek(self.data_start + offset)
+                data = zlib.decompress(f.read(length))
+                locations.append(numpy.frombuffer(data, dtype="<u4", count=count))
+                heights.append(numpy.frombuffer(data, dtype="<f4", count=count, offset=4 * count))
+                if spans is not None:
+                    spans.append(numpy.frombuffer(data, dtype="<u4", count=count, offset=8 * count))
+        if spans is not None:
+            spans = bindings.concatenate(spans, bindings.SPAN_DTYPE).astype(bindings.SPAN_DTYPE)
+        return (bindings.concatenate(locations, bindings.LOCATION_DTYPE).astype(bindings.LOCATION_DTYPE),
+                bindings.concatenate(heights, bindings.HEIGHT_DTYPE).astype(bindings.HEIGHT_DTYPE),
+                spans)
+
+    def read_region(self, chrom, start_location, end_location):
+        "(locations, heights) for locations in [start_location, end_location]."
+        (first, last) = self.block_range(chrom, start_location, end_location)
+        (locations, heights, spans) = self.read_blocks(chrom, first, last)
+        keep = slice(bindings.location_index(locations, start_location),
+                     bindings.location_index(locations, numpy.floor(end_location) + 1))
+        return (locations[keep], heights[keep])
+
+
+class FileChromosomeTrack(bindings.ChromosomeTrack):
+
+    """
+    A ChromosomeTrack whose data stays in a signal track file.
+    Queries read only the blocks they need.
+    """
+
+    def __init__(self, track_file, chrom):
+        info = track_file.chromosome_info[chrom]
+        self.track_file = track_file
+        self.chrom = chrom
+        self.locations = self.heights = None
+        self.span = info["span"]
+        # spans of single locations are read with the regions queried.
+        self.spans = None
+        self.max_span = info.get("max_span", self.span)
+        self.numelts = info["numelts"]
+        self.maxheight = info["maxheight"]
+        self.pyramid = track_file.pyramid(chrom)
+
+    def build_pyramid(self):
+        return self.pyramid
+
+    def region_track(self, start_location, end_location):
+        """
+        In memory ChromosomeTrack with all the data needed to answer queries
+        about windows inside [start_location, end_location).
+        """
+        # the span-gap rule looks up to 1.5 spans past a window start and
+        # needs to know whether a location is the last one on the chromosome.
+        (first, last) = self.track_file.block_range(
+            self.chrom, start_location, end_location + 1.5 * self.max_span, extra=1)
+        (locations, heights, spans) = self.track_file.read_blocks(self.chrom, first, last)
+        result = bindings.ChromosomeTrack(self.chrom, locations, heights, self.span, spans)
+        return result
+
+    def window_values(self, starts, ends, summary="max"):
+        starts = numpy.asarray(starts, dtype=numpy.float64)
+        ends = numpy.asarray(ends, dtype=numpy.float64)
+        if len(starts) == 0:
+            return numpy.zeros(starts.shape, dtype=numpy.float64)
+        region = self.region_track(numpy.min(starts), numpy.max(ends))
+        return region.window_values(starts, ends, summary)
@@ -0,0 +1,112 @@
+"""
+Spatial index over node positions for hit testing and region selection.
+
+SpatialIndex answers rectangle, radius and nearest node queries over a
+node -> position dictionary with a k-d tree.  Nodes moved after the tree
+was built are kept aside and checked directly; the tree is rebuilt at the
+next query once too many have moved.
+"""
+
+import numpy
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex(object):
+
+    # rebuild once more than this fraction of the nodes have moved
+    rebuild_fraction = 0.02
+    # ... but never for fewer moved nodes than this
+    rebuild_minimum = 256
+
+    def __init__(self, positions):
+        self.positions = positions
+        self.build()
+
+    def build(self):
+        "(Re)build the tree for the current positions."
+        positions = self.positions
+        nodes = list(positions)
+        points = numpy.array([positions[n] for n in nodes], dtype=numpy.float64).reshape((-1, 2))
+        self.nodes = nodes
+        self.points = points
+        self.tree = None
+        if len(nodes):
+            self.tree = cKDTree(points)
+        # node -> position (None if removed) for nodes changed since the build.
+        self.moved = {}
+
+    def update(self, nodes):
+        "Record that nodes were moved, added or removed in the positions dictionary."
+        positions = self.positions
+        moved = self.moved
+        for n in nodes:
+            moved[n] = positions.get(n)
+
+    def check(self):
+        "Rebuild the tree if too many nodes have moved."
+        if len(self.moved) > max(self.rebuild_minimum, self.rebuild_fraction * len(self.nodes)):
+            self.build()
+
+    def _tree_nodes(self, indices):
+        "Nodes at tree indices, leaving out the moved ones."
+        nodes = self.nodes
+        moved = self.moved
+        return [nodes[i] for i in indices if nodes[i] not in moved]
+
+    def _moved_points(self):
+        "(nodes, points) for moved nodes that are still positioned."
+        items = [(n, p) for (n, p) in self.moved.items() if p is not None]
+        nodes = [n for (n, p) in items]
+        points = numpy.array([p for (n, p) in items], dtype=numpy.float64).reshape((-1, 2))
+        return (nodes, points)
+
+    def in_rectangle(self, minx, miny, maxx, maxy):
+        "List of nodes with minx <= x <= maxx and miny <= y <= maxy."
+        self.check()
+        result = []
+        if self.tree is not None:
+            center = ((minx + maxx) * 0.5, (miny + maxy) * 0.5)
+            radius = max(maxx - minx, maxy - miny) * 0.5
+            candidates = numpy.array(self.tree.query_ball_point(center, radius, p=numpy.inf),
+                                     dtype=numpy.int64)
+            points = self.points[candidates]
+            inside = ((points[:, 0] >= minx) & (points[:, 0] <= maxx) &
+                      (points[:, 1] >= miny) & (points[:, 1] <= maxy))
+            result = self._tree_nodes(candidates[inside].tolist())
+        (nodes, points) = self._moved_points()
+        inside = ((points[:, 0] >= minx) & (points[:, 0] <= maxx) &
+                  (points[:, 1] >= miny) & (points[:, 1] <= maxy))
+        result.extend(n for (n, keep) in zip(nodes, inside.tolist()) if keep)
+        return result
+
+    def within(self, x, y, radius):
+        "List of nodes at distance at most radius from (x, y)."
+        self.check()
+        result = []
+        if self.tree is not None:
+            result = self._tree_nodes(self.tree.query_ball_point((x, y), radius))
+        (nodes, points) = self._moved_points()
+        distances = numpy.hypot(points[:, 0] - x, points[:, 1] - y)
+        result.extend(n for (n, d) in zip(nodes, distances.tolist()) if d <= radius)
+        return result
+
+    def nearest(self, x, y, max_distance=numpy.inf):
+        "(node, distance) for the node nearest to (x, y), or (None, None) if none is close enough."
+        self.check()
+        best = (None, None)
+        if self.tree is not None:
+            # moved nodes may be nearer at their old position than the answer.
+            k = min(len(self.moved) + 1, len(self.nodes))
+            (distances, indices) = self.tree.query((x, y), k=k, distance_upper_bound=max_distance)
+            for (d, i) in zip(numpy.atleast_1d(distances).tolist(), numpy.atleast_1d(indices).tolist()):
+                if i < len(self.nodes) and self.nodes[i] not in self.moved:
+                    best = (self.nodes[i], d)
+                    break
+        (nodes, points) = self._moved_points()
+        if nodes:
+            distances = numpy.hypot(points[:, 0] - x, points[:, 1] - y)
+            i = int(numpy.argmin(distances))
+            d = float(distances[i])
+            if d <= max_distance and (best[0] is None or d < best[1]):
+                best = (nodes[i], d)
+        return best
@@ -1,4 +1,5 @@
 
+import numpy
 import unittest
 from .. import HMap
 from .. import dGraph
@@ -54,6 +55,19 @@ class TestProjection(unittest.TestCase):
         self.assertEqual([[1, 0], [3, 2]], Hpdata.tolist())
         
 
+class TestInvalidValues(unittest.TestCase):
+
+    def test_data_not_modified(self):
+        data = numpy.array([[0, numpy.nan], [numpy.inf, 3]])
+        H = HMap.HeatMap("A B".split(), "X Y".split(), data)
+        H.transform_data(None)
+        self.assertEqual(H.display_data.tolist(), [[0, 0], [numpy.inf, 3]])
+        H.fix_data()
+        self.assertEqual(H.display_data.tolist(), [[0, 0], [0, 3]])
+        self.assertTrue(numpy.isnan(data[0, 1]))
+        self.assertTrue(numpy.isinf(data[1, 0]))
+
+
 
 class Test0(unittest.TestCase):
 
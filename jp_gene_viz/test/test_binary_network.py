@@ -0,0 +1,49 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import binary_network
+from .. import getData
+
+EXAMPLE_FILE = """\
+regulator\ttarget\tbeta\tMotifs
+A\tB\t1.5\tm1,m2
+A\tC\t-0.25\tm1
+C\tB\t3\t
+D\tD\t2\tm3
+"""
+
+
+class TestBinaryNetwork(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tsv = os.path.join(self.directory, "network.tsv")
+        with open(self.tsv, "w") as f:
+            f.write(EXAMPLE_FILE)
+        self.binary = binary_network.write_network(self.tsv)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_magic(self):
+        self.assertTrue(binary_network.is_binary_network(self.binary))
+        self.assertFalse(binary_network.is_binary_network(self.tsv))
+
+    def test_same_graph(self):
+        G = getData.read_network(self.tsv)
+        H = getData.read_network(self.binary)
+        self.assertEqual(G.edge_weights, H.edge_weights)
+        self.assertEqual(G.node_weights, H.node_weights)
+
+    def test_threshhold(self):
+        H = getData.read_network(self.binary, threshhold=1)
+        self.assertEqual(sorted(H.edge_weights), [("A", "B"), ("C", "B")])
+
+    def test_attributes(self):
+        H = binary_network.read_network(self.binary, attributes=True)
+        atts = H.edge_attributes[("A", "B")]
+        self.assertEqual(atts["Motifs"], "m1,m2")
+        self.assertEqual(atts["target"], "B")
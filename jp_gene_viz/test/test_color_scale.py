@@ -75,3 +75,34 @@ class TestColor2Clr(unittest.TestCase):
 
     def test_456789(self, hex="#456789"):
         return self.test_123456(hex)
+
+
+class TestInterpolateColors(unittest.TestCase):
+
+    def setUp(self):
+        ci = self.ci = color_scale.ColorInterpolator(minvalue=-2, maxvalue=2)
+        ci.add_color(0, color_scale.clr(255, 255, 255))
+
+    def test_matches_interpolate_color(self):
+        values = [-3, -2, -1, 0, 0.5, 2, 3]
+        expected = [self.ci.interpolate_color(v) for v in values]
+        self.assertEqual(self.ci.interpolate_colors(values), expected)
+
+    def test_nearest_entry(self):
+        self.ci.lut_size = 5
+        self.assertEqual(self.ci.interpolate_colors([0.9, 1.1]), ["#ff7f7f", "#ff7f7f"])
+
+    def test_nan(self):
+        self.assertRaises(ValueError, self.ci.interpolate_colors, [0, float("nan")])
+        # infinite values get the colors of the ends.
+        self.assertEqual(self.ci.interpolate_colors([float("-inf"), float("inf")]),
+                         [self.ci.interpolate_color(-2), self.ci.interpolate_color(2)])
+
+    def test_invalidate(self):
+        self.assertEqual(self.ci.interpolate_colors([0]), ["#ffffff"])
+        self.ci.add_color(0, color_scale.clr(0, 255, 0))
+        self.assertEqual(self.ci.interpolate_colors([0]), ["#00ff00"])
+        self.ci.remove_color(color_scale.clr(0, 255, 0))
+        self.assertEqual(self.ci.interpolate_colors([0]), [self.ci.interpolate_color(0)])
+        self.ci.set_color_mapping({0: color_scale.clr(0, 0, 255), 1: color_scale.clr(0, 0, 0)})
+        self.assertEqual(self.ci.interpolate_colors([0, 1]), ["#0000ff", "#000000"])
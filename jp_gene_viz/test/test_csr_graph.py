@@ -0,0 +1,87 @@
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from .. import csr_graph
+from .. import dGraph
+from .. import getData
+from .test_binary_network import EXAMPLE_FILE
+
+EDGES = [("A", "B", 1.5), ("A", "C", -0.25), ("C", "B", 3), ("D", "D", 2),
+         ("B", "D", 0.5), ("A", "B", 2.0)]
+
+
+def build(klass):
+    G = klass()
+    for (f, t, w) in EDGES:
+        G.add_edge(f, t, w, {"beta": w})
+    return G
+
+
+class TestCSRGraph(unittest.TestCase):
+
+    def test_same_as_wgraph(self):
+        G = build(dGraph.WGraph)
+        C = build(csr_graph.CSRGraph)
+        self.assertEqual(dict(C.edge_weights), G.edge_weights)
+        self.assertEqual(dict(C.node_weights), G.node_weights)
+        self.assertEqual(C.neighbors_dict(), G.neighbors_dict())
+        self.assertEqual(C.get_node_to_descendants(), G.get_node_to_descendants())
+        self.assertEqual(C.weights_extrema(), G.weights_extrema())
+        self.assertEqual(C.edge_attributes[("A", "B")], {"beta": 2.0})
+        self.assertEqual(C.clone().edge_weights.copy(), G.edge_weights)
+
+    def test_views(self):
+        C = build(csr_graph.CSRGraph)
+        e = C.edge_weights
+        self.assertEqual(e[("A", "C")], -0.25)
+        self.assertNotIn(("C", "A"), e)
+        self.assertNotIn(("A", "Z"), e)
+        self.assertRaises(KeyError, lambda: e[("Z", "A")])
+        e[("C", "A")] = 4
+        del e[("A", "B")]
+        self.assertEqual(sorted(e), [("A", "C"), ("B", "D"), ("C", "A"), ("C", "B")])
+        self.assertEqual(len(e), 4)
+        C.node_weights = {"A": 1}
+        self.assertEqual(C.node_weights.copy(), {"A": 1.0})
+        self.assertNotIn("B", C.node_weights)
+
+    def test_arrays(self):
+        C = build(csr_graph.CSRGraph)
+        (indptr, targets, weights) = C.csr()
+        A = C.node_ids(["A"])[0]
+        a_targets = C.node_names(targets[indptr[A]:indptr[A + 1]])
+        self.assertEqual(sorted(a_targets), ["B", "C"])
+        (indptr, sources, weights, positions) = C.csc()
+        B = C.node_ids(["B"])[0]
+        b_sources = C.node_names(sources[indptr[B]:indptr[B + 1]])
+        self.assertEqual(sorted(b_sources), ["A", "C"])
+        numpy.testing.assert_array_equal(weights, C.csr()[2][positions])
+        (names, s, t, w) = build(dGraph.WGraph).graph_arrays()
+        edges = dict(((names[i], names[j]), x) for (i, j, x) in zip(s, t, w))
+        self.assertEqual(edges, C.edge_weights.copy())
+
+    def test_json_and_loading(self):
+        C = build(csr_graph.CSRGraph)
+        D = csr_graph.CSRGraph()
+        D.from_json_value(json.loads(json.dumps(C.to_json_value())))
+        self.assertEqual(D.edge_weights.copy(), C.edge_weights.copy())
+        self.assertEqual(D.node_weights.copy(), C.node_weights.copy())
+        directory = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(directory, "network.tsv")
+            with open(fn, "w") as f:
+                f.write(EXAMPLE_FILE)
+            G = getData.read_network(fn)
+            H = getData.read_network(fn, klass=csr_graph.CSRGraph)
+            self.assertIsInstance(H, csr_graph.CSRGraph)
+            self.assertEqual(H.edge_weights.copy(), G.edge_weights)
+            self.assertEqual(H.node_weights.copy(), G.node_weights)
+            self.assertEqual(H.edge_attributes[("A", "B")], G.edge_attributes[("A", "B")])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,206 @@
+
+import pickle
+import unittest
+
+import numpy
+
+from .. import csr_graph
+from .. import dGraph
+
+
+class RecordingCanvas(object):
+
+    "Stand in for an svg canvas which records changed element names."
+
+    def __init__(self):
+        self.changed = set()
+
+    def change_element(self, name, attributes):
+        self.changed.add(name)
+
+    def delete_names(self, names):
+        pass
+
+    def send_commands(self):
+        pass
+
+
+class TestEdgeWeights(unittest.TestCase):
+
+    def test_index_follows_changes(self):
+        ew = dGraph.EdgeWeights({("A", "B"): 1, ("A", "C"): 2})
+        self.assertEqual(sorted(ew.edges_from("A")), [("A", "B"), ("A", "C")])
+        ew[("C", "B")] = 3
+        ew.update({("D", "B"): 4})
+        del ew[("A", "B")]
+        ew.pop(("A", "C"))
+        self.assertEqual(ew.edges_from("A"), [])
+        self.assertEqual(sorted(ew.sources("B")), ["C", "D"])
+        self.assertEqual(ew.edges_to("C"), [])
+        copied = ew.copy()
+        copied[("B", "C")] = 5
+        self.assertEqual(ew.edges_from("B"), [])
+        self.assertEqual(copied.edges_from("B"), [("B", "C")])
+        unpickled = pickle.loads(pickle.dumps(copied, 2))
+        self.assertEqual(unpickled, copied)
+        self.assertEqual(sorted(unpickled.sources("B")), ["C", "D"])
+
+    def test_other_changes(self):
+        ew = dGraph.EdgeWeights.fromkeys([("A", "B"), ("A", "C")], 1)
+        self.assertIsInstance(ew, dGraph.EdgeWeights)
+        self.assertEqual(sorted(ew.targets("A")), ["B", "C"])
+        revision = ew.revision
+        ew |= {("B", "C"): 2, ("A", "B"): 3}
+        self.assertIsInstance(ew, dGraph.EdgeWeights)
+        self.assertNotEqual(ew.revision, revision)
+        self.assertEqual(ew.edges_from("B"), [("B", "C")])
+        self.assertEqual(ew[("A", "B")], 3)
+        ew.setdefault(("C", "A"), 4)
+        self.assertEqual(ew.edges_to("A"), [("C", "A")])
+        version = ew.version
+        ew[("C", "A")] = 5
+        self.assertEqual(ew.version, version)
+        while ew:
+            (edge, weight) = ew.popitem()
+            self.assertNotIn(edge[1], ew.targets(edge[0]))
+        self.assertEqual(ew.edges_from("A"), [])
+
+    def test_assigned_dict_is_indexed(self):
+        G = dGraph.WGraph()
+        G.add_edge("A", "B", 1)
+        G.edge_weights = {("B", "C"): 2}
+        self.assertIsInstance(G.edge_weights, dGraph.EdgeWeights)
+        self.assertEqual(G.edge_weights.edges_to("C"), [("B", "C")])
+        self.assertEqual(G.get_node_to_descendants(), {"B": set(["C"])})
+
+    def test_move_node_touches_only_its_edges(self):
+        for klass in (dGraph.WGraph, csr_graph.CSRGraph):
+            G = klass()
+            for (f, t) in [("A", "B"), ("C", "A"), ("B", "C"), ("C", "D")]:
+                G.add_edge(f, t, 1)
+            positions = dict((n, dGraph.pos(0, 0)) for n in "ABCD")
+            canvas = RecordingCanvas()
+            G.move_node(canvas, positions, "A", 5, 5)
+            expected = set([G.edge_name("A", "B"), G.edge_name("C", "A"), G.node_name("A")])
+            self.assertEqual(canvas.changed, expected)
+            canvas = RecordingCanvas()
+            G.move_descendants(canvas, positions, "B", 5, 5, depth=1)
+            expected = set([G.edge_name("A", "B"), G.edge_name("B", "C"), G.edge_name("C", "A"),
+                            G.edge_name("C", "D"), G.node_name("B"), G.node_name("C")])
+            self.assertEqual(canvas.changed, expected)
+
+
+class TestEdgeGeometry(unittest.TestCase):
+
+    def test_matches_scalar_helpers(self):
+        fps = [dGraph.pos(0, 0), dGraph.pos(10, 5), dGraph.pos(3, 3)]
+        tps = [dGraph.pos(4, 3), dGraph.pos(10, 5), dGraph.pos(0, 9)]
+        weights = [2, 1, -1]
+        (lines, marks) = dGraph.edge_geometry(fps, tps, weights, edgewidth=2)
+        for (fp, tp, w, line, mark) in zip(fps, tps, weights, lines, marks):
+            n = dGraph.towards(fp, tp)
+            no = dGraph.orthogonal(n)
+            fp = fp + no
+            tp = tp + no
+            p = fp + dGraph.WGraph.arrow_ratio * (tp - fp)
+            if w > 0:
+                m = p - 10 * (n + no)
+            else:
+                m = p - 10 * no
+            numpy.testing.assert_allclose(line, list(fp) + list(tp))
+            numpy.testing.assert_allclose(mark, list(p) + list(m))
+
+
+class TestSkeleton(unittest.TestCase):
+
+    def test_spanning_forest(self):
+        G = dGraph.WGraph()
+        for (f, t, w) in [("A", "B", 1), ("B", "C", -5), ("A", "C", 2), ("C", "D", 0.5),
+                          ("X", "Y", -1), ("Y", "Z", 3), ("Z", "X", 4)]:
+            G.add_edge(f, t, w)
+        G.node_weights["lonely"] = 1
+        K = dGraph.skeleton(G)
+        self.assertEqual(K.edge_weights,
+                         {("B", "C"): -5, ("A", "C"): 2, ("C", "D"): 0.5, ("Z", "X"): 4, ("Y", "Z"): 3})
+        self.assertEqual(set(K.node_weights), set(G.node_weights))
+        self.assertEqual(K.node_weights["lonely"], 1)
+
+    def test_same_weight_as_heap_version(self):
+        G = dGraph.WGraph()
+        for i in range(30):
+            for j in range(i + 1, 30, 7):
+                G.add_edge(i, j, ((i * 31 + j * 17) % 23) - 11.5)
+        total = lambda H: sum(abs(w) for w in H.edge_weights.values())
+        K = dGraph.skeleton(G)
+        self.assertEqual(len(K.edge_weights), 29)
+        self.assertAlmostEqual(total(K), total(dGraph.skeleton_heap(G)))
+
+
+class TestInfluence(unittest.TestCase):
+
+    def setUp(self):
+        G = self.G = dGraph.WGraph()
+        for (f, t, w) in [("A", "B", 1), ("B", "C", -3), ("C", "D", 2), ("A", "E", 0.5)]:
+            G.add_edge(f, t, w)
+
+    def test_primary_influence(self):
+        for G in (self.G, csr_graph.from_wgraph(self.G)):
+            P = dGraph.primary_influence(G)
+            # each edge carries the influence recorded for its source.
+            self.assertEqual(dict(P.edge_weights), {("C", "B"): -3, ("B", "A"): -3, ("B", "C"): -3,
+                                                    ("C", "D"): -3, ("A", "E"): 1})
+            self.assertEqual(dict(P.node_weights), dict(G.node_weights))
+            self.assertEqual(P.edge_attributes[("A", "E")], {})
+
+    def test_connect(self):
+        P = dGraph.primary_influence(self.G, connect=True, connect_weight=2)
+        self.assertEqual(dict(P.edge_weights), {("C", "B"): -3, ("B", "A"): -3, ("B", "C"): -3,
+                                                ("C", "D"): -3, ("A", "E"): 1,
+                                                ("B", "D"): 2, ("D", "B"): 2, ("A", "C"): 2, ("C", "A"): 2})
+
+    def test_trim_leaves(self):
+        T = dGraph.trim_leaves(self.G)
+        self.assertEqual(dict(T.edge_weights), {("A", "B"): 1, ("B", "C"): -3})
+        self.assertEqual(dict(T.node_weights), {"A": 1, "B": 4, "C": 3})
+        self.assertIn(("B", "C"), T.edge_attributes)
+
+
+class TestDescendants(unittest.TestCase):
+
+    def setUp(self):
+        G = self.G = dGraph.WGraph()
+        # A reaches D directly and through B and C.
+        for (f, t) in [("A", "B"), ("B", "C"), ("C", "D"), ("A", "D"), ("D", "E")]:
+            G.add_edge(f, t, 1)
+
+    def test_levels(self):
+        G = self.G
+        self.assertEqual(G.descendant_set("A", 0), set(["A"]))
+        self.assertEqual(G.descendant_set("A", 2), set(["A", "B", "C", "D", "E"]))
+        self.assertEqual(G.descendant_set("C", 1), set(["C", "D"]))
+        self.assertEqual(G.descendant_set("E", None), set(["E"]))
+        self.assertEqual(G.descendant_set("A", 1, set(["B"])), set(["A", "B", "D"]))
+
+    def test_cache_follows_edges(self):
+        G = self.G
+        self.assertIs(G.descendant_set("C", None), G.descendant_set("C", None))
+        G.edge_weights[("E", "F")] = 1
+        self.assertEqual(G.descendant_set("C", None), set(["C", "D", "E", "F"]))
+        del G.edge_weights[("D", "E")]
+        self.assertEqual(G.descendant_set("C", None), set(["C", "D"]))
+
+    def test_batch(self):
+        for G in (self.G, csr_graph.from_wgraph(self.G)):
+            for level in (0, 1, 2, None):
+                nodes = ["A", "B", "C", "D", "E", "missing"]
+                batch = G.descendant_sets(nodes, level)
+                G.uncache()
+                for n in nodes:
+                    self.assertEqual(batch[n], G.descendant_set(n, level))
+
+    def test_deep_chain(self):
+        G = dGraph.WGraph()
+        for i in range(3000):
+            G.add_edge(i, i + 1, 1)
+        self.assertEqual(len(G.descendant_set(0, None)), 3001)
+        self.assertEqual(len(G.descendant_set(0, 2500)), 2501)
@@ -0,0 +1,57 @@
+
+import unittest
+
+from .. import dGraph
+from .. import edge_attributes
+
+
+class TestEdgeAttributeStore(unittest.TestCase):
+
+    def test_update_edge(self):
+        S = edge_attributes.EdgeAttributeStore()
+        S.update_edge(("A", "B"), {"beta": "1.5", "Motifs": "m1"})
+        S.update_edge(("B", "C"), {"beta": "2"})
+        S.update_edge(("A", "B"), {"beta": "3"})
+        self.assertEqual(S[("A", "B")], {"beta": "3", "Motifs": "m1"})
+        self.assertEqual(S.get(("B", "C")), {"beta": "2"})
+        self.assertEqual(S.get(("C", "A")), None)
+        self.assertEqual(S.value(("A", "B"), "Motifs"), "m1")
+        self.assertEqual(S.value(("B", "C"), "Motifs", ""), "")
+        self.assertEqual(len(S), 2)
+        self.assertEqual(sorted(S), [("A", "B"), ("B", "C")])
+
+    def test_extend(self):
+        S = edge_attributes.EdgeAttributeStore()
+        S.update_edge(("A", "B"), {"beta": "1"})
+        names = ["X", "Y", "A"]
+        columns = [("Motifs", ["m1", "m2"], [1, -1])]
+        S.extend(names, [0, 2], [1, 0], columns)
+        self.assertEqual(S[("X", "Y")], {"Motifs": "m2"})
+        self.assertEqual(S[("A", "X")], {})
+        self.assertEqual(S[("A", "B")], {"beta": "1"})
+        C = S.copy()
+        C.update_edge(("X", "Y"), {"Motifs": "m3"})
+        self.assertEqual(S[("X", "Y")], {"Motifs": "m2"})
+
+    def test_graph_json(self):
+        G = dGraph.WGraph()
+        G.add_edge("A", "B", 1.0, {"Motifs": "m1"})
+        G.add_edge("B", "C", -1.0)
+        H = dGraph.WGraph()
+        H.load_json(G.as_json())
+        self.assertEqual(dict(H.edge_attributes.items()), dict(G.edge_attributes.items()))
+        self.assertEqual(H.edge_attributes[("A", "B")], {"Motifs": "m1"})
+
+    def test_add_edge_rows(self):
+        headers = ["regulator", "target", "beta", "Motifs"]
+        rows = [["A", "B", "1.5", "m1"], ["A", "C", "-2"], ["C", "C", "1"]]
+        weights = [1.5, -2.0, 1.0]
+        G = dGraph.WGraph()
+        G.add_edge_rows(headers, rows, weights)
+        H = dGraph.WGraph()
+        for (row, weight) in zip(rows, weights):
+            H.add_edge(row[0], row[1], weight, dict(zip(headers, row)))
+        self.assertEqual(G.edge_weights, H.edge_weights)
+        self.assertEqual(G.node_weights, H.node_weights)
+        self.assertEqual(dict(G.edge_attributes.items()), dict(H.edge_attributes.items()))
+        self.assertEqual(G.edge_attributes[("A", "C")], {"regulator": "A", "target": "C", "beta": "-2"})
@@ -0,0 +1,168 @@
+
+import io
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from .. import dGraph
+from .. import getData
+from .. import sidecar
+
+EXAMPLE_FILE = """\
+\tc1\tc2\tc3
+r1\t1\t2.5\t-3
+r2\t0\tnan\t1e3
+"""
+
+
+class TestReadMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tsv = os.path.join(self.directory, "expr.tsv")
+        with open(self.tsv, "w") as f:
+            f.write(EXAMPLE_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_matrix(self):
+        (r, c, A) = getData.read_matrix(self.tsv, cache=False)
+        self.assertEqual(r, ["r1", "r2"])
+        self.assertEqual(c, ["c1", "c2", "c3"])
+        self.assertEqual(A.dtype, numpy.float64)
+        numpy.testing.assert_array_equal(A, [[1, 2.5, -3], [0, numpy.nan, 1000]])
+
+    def test_float32(self):
+        (r, c, A) = getData.read_matrix(self.tsv, dtype=numpy.float32, cache=False)
+        self.assertEqual(A.dtype, numpy.float32)
+        self.assertEqual(A.shape, (2, 3))
+
+    def test_sidecar_cache(self):
+        (r, c, A) = getData.read_matrix(self.tsv)
+        self.assertNotEqual(sidecar.read_index(self.tsv, getData.MATRIX_SUFFIX), None)
+        (r2, c2, B) = getData.read_matrix(self.tsv)
+        self.assertTrue(isinstance(B, numpy.memmap))
+        self.assertEqual(r, r2)
+        numpy.testing.assert_array_equal(A, B)
+        # writes to a cached matrix do not reach the sidecar.
+        B[0, 0] = 99
+        (r3, c3, C) = getData.read_matrix(self.tsv)
+        self.assertEqual(C[0, 0], 1)
+
+    def test_stale_cache(self):
+        getData.read_matrix(self.tsv)
+        with open(self.tsv, "a") as f:
+            f.write("r3\t4\t5\t6\n")
+        (r, c, A) = getData.read_matrix(self.tsv)
+        self.assertEqual(r, ["r1", "r2", "r3"])
+        self.assertEqual(A.shape, (3, 3))
+
+
+NETWORK_FILE = """\
+regulator\ttarget\tbeta\tprior
+Stat3\tIl17a\t1.5\tyes
+Stat3\tRorc\t-0.25\tno
+Batf\tIl17a\t3e-1
+Rorc\tIl17f\t-2\tyes\textra
+Batf\tBatf\t4
+Foxp3\tIl2\t0.05\tno
+Rorc\tIl17a\t  0.75 \tno
+"""
+
+
+def line_parser(fn, limit=None, threshhold=None):
+    "The line by line read_network parser which read_network replaces."
+    f = open(fn)
+    headers = f.readline().strip().split("\t")
+    G = dGraph.WGraph()
+    count = 0
+    for dataline in f:
+        columns = dataline.strip().split("\t")
+        [regulator, target, beta_s] = columns[:3]
+        beta = float(beta_s)
+        assert not math.isnan(beta), "nan beta in row " + repr(columns)
+        assert not math.isinf(beta), "inf beta in row " + repr(columns)
+        if threshhold is not None and  abs(beta) < threshhold:
+            continue
+        attributes = dict(zip(headers, columns))
+        G.add_edge(regulator, target, beta, attributes)
+        count += 1
+        if limit is not None and count > limit:
+            break
+    f.close()
+    return G
+
+
+class TestReadNetwork(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content, name="network.tsv"):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(content.encode("utf-8"))
+        return path
+
+    def assertSameGraph(self, G, expected):
+        self.assertEqual(dict(G.edge_weights), dict(expected.edge_weights))
+        self.assertEqual(G.node_weights, expected.node_weights)
+        self.assertEqual(sorted(G.edge_attributes.items()), sorted(expected.edge_attributes.items()))
+
+    def test_same_as_line_parser(self):
+        path = self.write(NETWORK_FILE)
+        for (limit, threshhold) in [(None, None), (None, 0.3), (2, None), (1, 0.3), (0, None), (100, 10)]:
+            self.assertSameGraph(
+                getData.read_network(path, limit, threshhold),
+                line_parser(path, limit, threshhold))
+
+    def test_line_endings_and_blank_lines(self):
+        expected = line_parser(self.write(NETWORK_FILE))
+        crlf = self.write(NETWORK_FILE.replace("\n", "\r\n"), "crlf.tsv")
+        self.assertSameGraph(getData.read_network(crlf), expected)
+        # the line parser failed on blank lines: they are now skipped.
+        lines = NETWORK_FILE.split("\n")
+        blank = self.write("\n".join(lines[:3] + ["", "  "] + lines[3:] + [""]), "blank.tsv")
+        self.assertSameGraph(getData.read_network(blank), expected)
+        unterminated = self.write(NETWORK_FILE.rstrip("\n"), "unterminated.tsv")
+        self.assertSameGraph(getData.read_network(unterminated), expected)
+
+    def test_bad_rows(self):
+        for (row, error) in [
+                ("Stat3\tIl17a", ValueError),
+                ("Stat3", ValueError),
+                ("Stat3\tIl17a\tlarge", ValueError),
+                ("Stat3\tIl17a\t", ValueError),
+                ("Stat3\tIl17a\tnan", AssertionError),
+                ("Stat3\tIl17a\t-inf\tyes", AssertionError),
+                ]:
+            path = self.write(NETWORK_FILE + row + "\n")
+            self.assertRaises(error, line_parser, path)
+            self.assertRaises(error, getData.read_network, path)
+        with self.assertRaises(AssertionError) as context:
+            getData.read_network(self.write(NETWORK_FILE + "Stat3\tIl17a\tnan\n"))
+        self.assertEqual(str(context.exception), "nan beta in row ['Stat3', 'Il17a', 'nan']")
+
+    def test_chunk_boundaries(self):
+        # mixed line endings and a blank line, without the header.
+        content = NETWORK_FILE.replace("\n", "\r\n", 3).replace("\n", "\n\n", 4)
+        body = content[content.index("\n") + 1:].encode("utf-8")
+        expected = [line.strip().split("\t") for line in content.split("\n")[1:] if line.strip()]
+        for chunk_size in (1, 2, 7, 16, 33, len(body)):
+            rows = []
+            for chunk in getData.text_chunks(io.BytesIO(body), chunk_size):
+                self.assertTrue(chunk.endswith(b"\n"))
+                (starts, ends, betas) = getData.parse_beta_column(chunk)
+                for (start, end, beta) in zip(starts.tolist(), ends.tolist(), betas.tolist()):
+                    columns = getData.text(chunk[start:end]).strip().split("\t")
+                    self.assertEqual(beta, float(columns[2]))
+                    rows.append(columns)
+            self.assertEqual(rows, expected)
@@ -0,0 +1,108 @@
+
+import json
+import unittest
+
+from .. import csr_graph
+from .. import dGraph
+from .. import graph_view
+
+EDGES = [("A", "B", 1.5), ("A", "C", -0.25), ("C", "B", 3.0), ("D", "D", 2.0),
+         ("B", "D", -0.5), ("C", "A", 1.0)]
+
+
+def build(klass=dGraph.WGraph):
+    G = klass()
+    for (f, t, w) in EDGES:
+        G.add_edge(f, t, w)
+    return G
+
+
+def threshold(G, value, positives=True, negatives=True, nodes=None):
+    "The edges do_threshhold selected before views were used."
+    if nodes is None:
+        nodes = G.node_weights
+    return dict((e, w) for (e, w) in G.edge_weights.items()
+                if abs(w) >= value and e[0] in nodes and e[1] in nodes and
+                (positives or w <= 0) and (negatives or w >= 0))
+
+
+class TestGraphView(unittest.TestCase):
+
+    def test_threshold_view(self):
+        for klass in (dGraph.WGraph, csr_graph.CSRGraph):
+            G = build(klass)
+            table = graph_view.edge_table(G)
+            self.assertIs(graph_view.edge_table(G), table)
+            for (value, positives, negatives, nodes) in [
+                    (0, True, True, None), (1, True, True, None), (0.5, False, True, None),
+                    (0, True, False, ["A", "B", "C"]), (10, True, True, None)]:
+                mask = table.threshold_mask(value, positives, negatives, nodes)
+                V = graph_view.view(table, mask, G)
+                expected = threshold(G, value, positives, negatives, nodes)
+                ew = V.edge_weights
+                self.assertEqual(dict(ew.items()), expected)
+                self.assertEqual(len(ew), len(expected))
+                self.assertEqual(sorted(ew), sorted(expected))
+                for e in EDGES:
+                    self.assertEqual(e[:2] in ew, e[:2] in expected)
+                self.assertNotIn(("A", "Z"), ew)
+                for n in "ABCDZ":
+                    self.assertEqual(sorted(ew.edges_from(n)), sorted(e for e in expected if e[0] == n))
+                    self.assertEqual(sorted(ew.edges_to(n)), sorted(e for e in expected if e[1] == n))
+                W = dGraph.WGraph()
+                W.edge_weights = expected
+                W.node_weights = dict(G.node_weights)
+                self.assertEqual(V.get_node_to_descendants(), W.get_node_to_descendants())
+                self.assertEqual(V.weights_extrema(), W.weights_extrema())
+
+    def test_copy_on_write(self):
+        G = build()
+        V = graph_view.graph_view(G)
+        C = V.clone()
+        self.assertIs(C.table, V.table)
+        V.edge_weights[("B", "A")] = 7
+        del V.edge_weights[("A", "B")]
+        V.node_weights["A"] = 100
+        V.node_weights["E"] = 1
+        self.assertIsInstance(V.edge_weights, dGraph.EdgeWeights)
+        self.assertEqual(sorted(V.edge_weights.edges_to("A")), [("B", "A"), ("C", "A")])
+        self.assertEqual(C.edge_weights[("A", "B")], 1.5)
+        self.assertNotIn(("B", "A"), C.edge_weights)
+        self.assertEqual(C.node_weights["A"], G.node_weights["A"])
+        self.assertNotIn("E", C.node_weights)
+        self.assertNotIn("E", G.node_weights)
+        self.assertNotIn(("B", "A"), G.edge_weights)
+        self.assertEqual(G.edge_weights[("A", "B")], 1.5)
+
+    def test_table_follows_graph(self):
+        G = build()
+        table = graph_view.edge_table(G)
+        V = graph_view.graph_view(G)
+        G.edge_weights[("A", "B")] = 5
+        changed = graph_view.edge_table(G)
+        self.assertIsNot(changed, table)
+        self.assertEqual(changed.weights[changed.position(("A", "B"))], 5)
+        # existing views keep their snapshot.
+        self.assertEqual(V.edge_weights[("A", "B")], 1.5)
+
+    def test_json(self):
+        G = build()
+        V = graph_view.graph_view(G)
+        value = json.loads(json.dumps(dGraph.WGraph.to_json_value(V)))
+        W = dGraph.WGraph()
+        W.from_json_value(value)
+        self.assertEqual(W.edge_weights, dict(V.edge_weights.items()))
+        self.assertEqual(W.node_weights, G.node_weights)
+
+    def test_weight_index(self):
+        G = build()
+        G.add_edge("B", "C", 0)
+        table = graph_view.edge_table(G)
+        for value in (0, 0.25, 0.3, 1, 1.5, 2.9, 3, 3.5):
+            for (positives, negatives) in ((True, True), (True, False), (False, True)):
+                expected = threshold(G, value, positives, negatives)
+                mask = table.threshold_mask(value, positives, negatives)
+                self.assertEqual(sorted(table.edges(mask.nonzero()[0])), sorted(expected))
+                nodes = set(n for e in expected for n in e)
+                self.assertEqual(table.threshold_counts(value, positives, negatives),
+                                 (len(expected), len(nodes)))
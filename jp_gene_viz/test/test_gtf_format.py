@@ -0,0 +1,58 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import gtf_format
+from .. import sidecar
+
+EXAMPLE_FILE = """\
+#!genome-build test
+chr1\tunknown\texon\t100\t200\t.\t+\t.\tgene_id "Abc"; transcript_id "T1";
+chr1\tunknown\tCDS\t150\t200\t.\t+\t0\tgene_id "Abc"; transcript_id "T1";
+chr2\tunknown\texon\t50\t80\t.\t-\t.\tgene_id "Xyz"; transcript_id "T2";
+chr1\tunknown\texon\t300\t5000\t.\t+\t.\tgene_id "Abc"; transcript_id "T1";
+chr1\tunknown\texon\t400\t450\t.\t+\t.\tgene_id "Def"; transcript_id "T3";
+"""
+
+
+class TestGTFIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.gtf = os.path.join(self.directory, "genes.gtf")
+        with open(self.gtf, "w") as f:
+            f.write(EXAMPLE_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_gene_features(self):
+        D = gtf_format.GTFData()
+        D.load([line for line in EXAMPLE_FILE.split("\n")[1:] if line])
+        I = gtf_format.GTFData()
+        I.load_file(self.gtf)
+        genes = ["abc", "xyz", "nope"]
+        expected = D.get_gene_features(genes)
+        found = I.get_gene_features(genes)
+        self.assertEqual(sorted(found), sorted(expected))
+        for gene in genes:
+            self.assertEqual(found[gene], expected[gene])
+        self.assertEqual(I.get_gene_features(["abc"], "CDS")["abc"][0]["frame"], 0)
+
+    def test_sidecar_reused(self):
+        gtf_format.GTFIndex(self.gtf)
+        self.assertNotEqual(sidecar.read_index(self.gtf, gtf_format.INDEX_SUFFIX), None)
+        index = gtf_format.GTFIndex(self.gtf)
+        features = index.get_gene_features(["def"])["def"]
+        self.assertEqual(features[0]["start"], 400)
+        self.assertEqual(features[0]["attribute"]["transcript_id"], "T3")
+
+    def test_range_features(self):
+        index = gtf_format.GTFIndex(self.gtf)
+        found = index.get_range_features("chr1", 420, 430)
+        self.assertEqual(sorted(d["start"] for d in found), [300, 400])
+        found = index.get_range_features("chr1", 0, 120, "exon")
+        self.assertEqual([d["start"] for d in found], [100])
+        self.assertEqual(index.get_range_features("chr3", 0, 100), [])
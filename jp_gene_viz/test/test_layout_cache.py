@@ -0,0 +1,86 @@
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from .. import dGraph
+from .. import layout_cache
+
+
+def small_graph(edges):
+    G = dGraph.WGraph()
+    for (a, b, w) in edges:
+        G.add_edge(a, b, w)
+    return G
+
+
+EDGES = [("A", "B", 1.0), ("B", "C", -2.0), ("C", "A", 0.5), ("C", "D", 3.0)]
+
+
+class TestLayoutCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = layout_cache.LayoutCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_keys(self):
+        G = small_graph(EDGES)
+        same = small_graph(list(reversed(EDGES)))
+        self.assertEqual(layout_cache.graph_hash(G), layout_cache.graph_hash(same))
+        reweighted = small_graph(EDGES[:-1] + [("C", "D", 2.0)])
+        self.assertNotEqual(layout_cache.graph_hash(G), layout_cache.graph_hash(reweighted))
+        key = layout_cache.layout_key(G, "skeleton", 1000)
+        self.assertEqual(key, layout_cache.layout_key(same, "skeleton", 1000))
+        others = [
+            layout_cache.layout_key(G, "forest", 1000),
+            layout_cache.layout_key(G, "skeleton", 500),
+            layout_cache.layout_key(G, "skeleton", 1000, seed=1),
+            layout_cache.layout_key(G, "skeleton", 1000, node_categories={"A": "tf"}),
+            ]
+        self.assertEqual(len(set(others + [key])), 5)
+
+    def test_round_trip(self):
+        positions = {"A": dGraph.pos(0, 1), "B": dGraph.pos(2.5, 3), "C": dGraph.pos(-1, 0)}
+        rectangles = {
+            frozenset(["A", "B"]): (0, 1, 2.5, 3),
+            frozenset(["C", "D"]): (-1, 0, 0, 0),
+            "label": [0, 0, 10, 10],
+            }
+        self.assertEqual(self.cache.get("key"), None)
+        self.assertTrue(self.cache.put("key", positions, rectangles))
+        (found, boxes) = self.cache.get("key")
+        self.assertEqual(sorted(found), ["A", "B", "C"])
+        for (node, p) in positions.items():
+            self.assertEqual(list(found[node]), list(p))
+        self.assertEqual(sorted(boxes, key=str), sorted(rectangles, key=str))
+        for (group, box) in rectangles.items():
+            self.assertEqual(list(boxes[group]), list(box))
+        # only arrays of strings and numbers are stored.
+        self.assertFalse(self.cache.put("other", positions, {object(): (0, 0, 1, 1)}))
+        self.assertEqual(self.cache.get("other"), None)
+
+    def test_eviction(self):
+        positions = dict(("N%d" % i, dGraph.pos(i, -i)) for i in range(1000))
+        self.cache.put("first", positions)
+        entry = self.cache.nbytes()
+        self.cache.put("second", positions)
+        self.cache.max_bytes = int(entry * 2.5)
+        # make first the most recently used.
+        past = time.time() - 100
+        os.utime(self.cache.path("first"), (past, past))
+        os.utime(self.cache.path("second"), (past + 10, past + 10))
+        self.assertNotEqual(self.cache.get("first"), None)
+        self.cache.put("third", positions)
+        keys = sorted(key for (used, size, key) in self.cache.entries())
+        self.assertEqual(keys, ["first", "third"])
+        # the entry just stored is kept even if it is too large.
+        self.cache.max_bytes = 1
+        self.cache.put("fourth", positions)
+        self.assertEqual([key for (used, size, key) in self.cache.entries()], ["fourth"])
+        self.cache.clear()
+        self.assertEqual(self.cache.nbytes(), 0)
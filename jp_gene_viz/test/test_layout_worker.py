@@ -0,0 +1,145 @@
+
+import pickle
+import threading
+import time
+import unittest
+
+from .. import dGraph
+from .. import layout_worker
+
+
+def square_layout(G, side):
+    return dict((n, dGraph.pos(i % side, i // side)) for (i, n) in enumerate(sorted(G.node_weights)))
+
+
+def failing_layout(G):
+    raise ValueError("no layout for you")
+
+
+def slow_layout(seconds):
+    time.sleep(seconds)
+    return "too late"
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.results = []
+        self.errors = []
+        self.messages = []
+
+    def job(self, function, args):
+        return layout_worker.LayoutJob(function, args, self.results.append, self.errors.append,
+                                       self.messages.append, "test")
+
+
+class QueuedLoop(object):
+
+    "Stands in for the kernel's event loop: callbacks run when run_callbacks is called."
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run_callbacks(self):
+        (callbacks, self.callbacks) = (self.callbacks, [])
+        for (callback, args) in callbacks:
+            callback(*args)
+
+
+class UnstartableProcess(object):
+
+    def start(self):
+        raise pickle.PicklingError("cannot pickle the arguments")
+
+
+class FailingStartJob(layout_worker.LayoutJob):
+
+    def make_process(self):
+        return UnstartableProcess()
+
+
+class TestLayoutJob(unittest.TestCase):
+
+    def setUp(self):
+        G = self.G = dGraph.WGraph()
+        for (f, t) in [("a", "b"), ("b", "c"), ("c", "d")]:
+            G.add_edge(f, t, 1.0)
+
+    def test_background(self):
+        R = Recorder()
+        job = R.job(square_layout, (self.G, 2))
+        job.start()
+        job.wait(30)
+        self.assertFalse(job.running())
+        self.assertEqual([sorted((n, tuple(p)) for (n, p) in r.items()) for r in R.results],
+                         [[("a", (0, 0)), ("b", (1, 0)), ("c", (0, 1)), ("d", (1, 1))]])
+        self.assertEqual(R.errors, [])
+        self.assertTrue(any("computing" in m for m in R.messages))
+
+    def test_in_thread(self):
+        R = Recorder()
+        R.job(square_layout, (self.G, 4)).run()
+        self.assertEqual(len(R.results), 1)
+        R.job(failing_layout, (self.G,)).run()
+        self.assertEqual(R.errors, ["ValueError: no layout for you"])
+
+    def test_error(self):
+        R = Recorder()
+        job = R.job(failing_layout, (self.G,))
+        job.start()
+        job.wait(30)
+        self.assertEqual(R.results, [])
+        self.assertEqual(R.errors, ["ValueError: no layout for you"])
+
+    def test_cancel(self):
+        R = Recorder()
+        job = R.job(slow_layout, (30,))
+        job.progress_interval = 0.05
+        job.start()
+        time.sleep(0.2)
+        self.assertTrue(job.running())
+        job.cancel()
+        job.wait(5)
+        self.assertFalse(job.process.is_alive())
+        self.assertFalse(job.thread.is_alive())
+        self.assertFalse(job.running())
+        self.assertEqual((R.results, R.errors), ([], []))
+
+    def test_callbacks_on_event_loop(self):
+        R = Recorder()
+        threads = []
+        job = R.job(square_layout, (self.G, 2))
+        job.on_done = lambda result: threads.append(threading.current_thread())
+        loop = job.io_loop = QueuedLoop()
+        job.start()
+        job.wait(30)
+        # nothing is called from the watcher thread.
+        self.assertEqual(threads, [])
+        self.assertTrue(job.running())
+        self.assertTrue(loop.callbacks)
+        loop.run_callbacks()
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertFalse(job.running())
+        self.assertTrue(any("computing" in m for m in R.messages))
+        # a job cancelled before its result is handed over drops the result.
+        job = R.job(square_layout, (self.G, 2))
+        job.on_done = threads.append
+        loop = job.io_loop = QueuedLoop()
+        job.start()
+        job.wait(30)
+        job.cancel()
+        loop.run_callbacks()
+        self.assertEqual(len(threads), 1)
+
+    def test_start_failure(self):
+        R = Recorder()
+        job = FailingStartJob(square_layout, (self.G, 2), R.results.append, R.errors.append)
+        job.start()
+        job.wait(5)
+        self.assertFalse(job.running())
+        self.assertEqual(R.results, [])
+        self.assertEqual(R.errors, ["could not start worker: PicklingError: cannot pickle the arguments"])
+        job.cancel()
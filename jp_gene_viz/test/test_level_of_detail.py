@@ -0,0 +1,120 @@
+
+import unittest
+
+import numpy
+
+from .. import dGraph
+from .. import graph_view
+from .. import level_of_detail
+
+
+def grid_graph(side=20):
+    "Graph of a side x side grid of nodes with edges to the right and down, and positions."
+    G = dGraph.WGraph()
+    P = {}
+    for i in range(side):
+        for j in range(side):
+            name = "N%d_%d" % (i, j)
+            P[name] = dGraph.pos(i, j)
+            G.node_weights[name] = i - j
+            if i:
+                G.add_edge("N%d_%d" % (i - 1, j), name, 1.0)
+            if j:
+                G.add_edge("N%d_%d" % (i, j - 1), name, -0.5)
+    return (G, P)
+
+
+class TestHierarchy(unittest.TestCase):
+
+    def check_tree(self, H):
+        n = len(H)
+        self.assertEqual((H.start[0], H.end[0]), (0, n))
+        for (g, parent) in enumerate(H.parents):
+            if parent >= 0:
+                self.assertTrue(H.start[parent] <= H.start[g] < H.end[g] <= H.end[parent])
+            members = H.points[H.start[g]:H.end[g]]
+            self.assertEqual(members.min(axis=0).tolist(), H.bounds[g, :2].tolist())
+            self.assertEqual(members.max(axis=0).tolist(), H.bounds[g, 2:].tolist())
+            children = H.children[g]
+            covered = H.direct[g] + sum(H.end[c] - H.start[c] for c in children)
+            self.assertEqual(covered, H.end[g] - H.start[g])
+            self.assertLessEqual(H.direct[g], H.leaf_size)
+
+    def test_grid_fallback(self):
+        (G, P) = grid_graph()
+        H = level_of_detail.Hierarchy(P)
+        self.assertEqual(sorted(H.names), sorted(P))
+        self.check_tree(H)
+        self.assertEqual(len(H.cut(budget=1000)), 0)
+        collapsed = H.cut(budget=50)
+        rep = H.representatives(collapsed)
+        self.assertLessEqual(len(set(rep.tolist())), 50)
+        # zooming in opens the groups in view.
+        zoomed = H.cut((0, 0, 3, 3), budget=50)
+        single = [H.names[i] for i in numpy.flatnonzero(H.representatives(zoomed) < len(H))]
+        self.assertIn("N1_1", single)
+        self.assertNotIn("N1_1", [H.names[i] for i in numpy.flatnonzero(rep < len(H))])
+
+    def test_nested_rectangles(self):
+        (G, P) = grid_graph(4)
+        left = frozenset(n for n in P if P[n][0] < 2)
+        corner = frozenset(n for n in left if P[n][1] < 2)
+        overlapping = frozenset(n for n in P if P[n][1] == 3)
+        rectangles = {left: None, corner: None, overlapping: None, "label": None}
+        H = level_of_detail.Hierarchy(P, rectangles)
+        self.check_tree(H)
+        groups = [frozenset(H.names[H.start[g]:H.end[g]]) for g in range(len(H.parents))]
+        self.assertIn(left, groups)
+        self.assertIn(corner, groups)
+        self.assertNotIn(overlapping, groups)
+        self.assertEqual(H.parents[groups.index(corner)], groups.index(left))
+
+    def test_summarize(self):
+        (G, P) = grid_graph()
+        H = level_of_detail.Hierarchy(P)
+        collapsed = H.cut((0, 0, 4, 4), budget=60)
+        for V in (graph_view.graph_view(G), G):
+            S = level_of_detail.summarize(H, collapsed, V)
+            rep = H.representatives(collapsed)
+            single = set(H.names[i] for i in numpy.flatnonzero(rep < len(H)))
+            self.assertEqual(set(S.graph.node_weights), single)
+            self.assertEqual(dict(S.graph.edge_weights.items()),
+                             dict((e, w) for (e, w) in G.edge_weights.items()
+                                  if e[0] in single and e[1] in single))
+            # every node is drawn once, alone or in a group.
+            self.assertEqual(sum(count for (g, xy, count, w) in S.groups) + len(single), len(P))
+            # meta-edges sum the edges between different drawn items.
+            item = dict((H.names[i], r) for (i, r) in enumerate(rep.tolist()))
+            between = [(e, w) for (e, w) in G.edge_weights.items()
+                       if item[e[0]] != item[e[1]] and not (e[0] in single and e[1] in single)]
+            self.assertEqual(sum(link[4] for link in S.links), len(between))
+            self.assertAlmostEqual(sum(link[3] for link in S.links), sum(w for (e, w) in between))
+        S = level_of_detail.summarize(H, collapsed, G, max_links=3)
+        self.assertEqual(len(S.links), 3)
+
+    def test_edge_budget(self):
+        (G, P) = grid_graph()
+        H = level_of_detail.Hierarchy(P)
+        # nothing is collapsed under the node budget, but the edges are limited.
+        collapsed = H.cut((0, 0, 20, 20), budget=len(P))
+        self.assertEqual(len(collapsed), 0)
+        for V in (graph_view.graph_view(G), G):
+            S = level_of_detail.summarize(H, collapsed, V, max_edges=100)
+            self.assertEqual(len(S.graph.node_weights), len(P))
+            self.assertEqual(S.links, [])
+            edges = dict(S.graph.edge_weights.items())
+            self.assertEqual(len(edges), 100)
+            self.assertEqual(set(edges.values()), set([1.0]))
+            # zooming in shows the weaker edges in view, then the strongest others.
+            view_box = (0, 0, 4, 4)
+            S = level_of_detail.summarize(H, collapsed, V, max_edges=100, view_box=view_box)
+            edges = dict(S.graph.edge_weights.items())
+            self.assertEqual(len(edges), 100)
+            in_view = dict((e, w) for (e, w) in G.edge_weights.items()
+                           if any(P[n][0] <= 4 and P[n][1] <= 4 for n in e))
+            self.assertIn(-0.5, in_view.values())
+            self.assertEqual(dict((e, edges[e]) for e in in_view), in_view)
+            self.assertEqual(set(w for (e, w) in edges.items() if e not in in_view), set([1.0]))
+            # under the limit every edge is kept, in view or not.
+            S = level_of_detail.summarize(H, collapsed, V, max_edges=len(G.edge_weights), view_box=view_box)
+            self.assertEqual(dict(S.graph.edge_weights.items()), dict(G.edge_weights.items()))
@@ -0,0 +1,55 @@
+
+import fnmatch
+import unittest
+
+from .. import dGraph
+from .. import name_index
+
+NAMES = ["Stat3", "STAT4", "stat5a", "Rorc", "Il17a", "IL17F", "Il2", "Foxp3", "rorc", "Batf"]
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = name_index.NameIndex(NAMES)
+
+    def test_glob_same_as_fnmatch(self):
+        folded = [name.lower() for name in NAMES]
+        for patterns in (["stat*"], ["*17*", "ROR?"], ["il[12]*", "batf", "none*"], ["*"], ["foxp3"], []):
+            expected = set()
+            for pattern in patterns:
+                expected.update(fnmatch.filter(folded, pattern.lower()))
+            found = self.index.glob(patterns)
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(set(name.lower() for name in found), expected)
+        self.assertEqual(self.index.glob(["RORC"]), ["Rorc", "rorc"])
+        self.assertEqual(self.index.glob(["il1*", "*3"]), ["Foxp3", "Il17a", "IL17F", "Stat3"])
+
+    def test_prefix_and_regex(self):
+        self.assertEqual(self.index.prefix(["STAT", "st", "b"]), ["Batf", "Stat3", "STAT4", "stat5a"])
+        self.assertEqual(self.index.prefix(["x"]), [])
+        self.assertEqual(self.index.prefix([""]), self.index.names(self.index.folded))
+        self.assertEqual(self.index.regex([r"\d[AF]$", "^b"]), ["Batf", "Il17a", "IL17F", "stat5a"])
+        self.assertEqual(self.index.regex([]), [])
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup(["stat3", "Missing", "IL2", "RORC"]), ["Stat3", "Il2", "Rorc", "rorc"])
+
+    def test_case_collisions(self):
+        index = name_index.NameIndex(["ABC", "Abc", "abd"])
+        self.assertEqual(index.lookup(["abc", "ABC", "Abc", "abc"]), ["ABC", "Abc"])
+        found = index.glob(["a*"])
+        self.assertEqual(found, ["ABC", "Abc", "abd"])
+        # names already found (as in ExpressionDisplay.display_data) are not repeated.
+        self.assertEqual(index.lookup(found), found)
+        self.assertEqual(index.lookup(index.glob(["ab?", "*c"])), ["ABC", "Abc", "abd"])
+
+    def test_node_index_cached(self):
+        G = dGraph.WGraph()
+        G.add_edge("Stat3", "Il17a", 1.0)
+        index = name_index.node_index(G)
+        self.assertIs(name_index.node_index(G), index)
+        G.add_edge("Stat3", "Rorc", 2.0)
+        index = name_index.node_index(G)
+        self.assertEqual(index.glob(["r*"]), ["Rorc"])
+        self.assertIs(name_index.node_index(G), index)
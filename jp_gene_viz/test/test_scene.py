@@ -0,0 +1,101 @@
+
+import unittest
+
+from .. import scene
+
+
+class RecordingCanvas(object):
+
+    "Stand in for an svg canvas which records the commands sent to it."
+
+    def __init__(self):
+        self.commands = []
+
+    def line(self, name, *args, **kwargs):
+        self.commands.append(("line", name))
+
+    def circle(self, name, *args, **kwargs):
+        self.commands.append(("circle", name))
+
+    def text(self, name, *args, **kwargs):
+        self.commands.append(("text", name))
+
+    def change_element(self, name, attributes):
+        self.commands.append(("change", name, attributes))
+
+    def delete_names(self, names):
+        self.commands.append(("delete", sorted(names)))
+
+    def empty(self):
+        self.commands.append(("empty",))
+
+    def fit(self, *args):
+        self.commands.append(("fit",))
+
+    def send_commands(self):
+        pass
+
+
+def draw(svg, edges, nodes, labels=True):
+    svg.empty()
+    for (name, color) in edges:
+        svg.line(name, 0, 0, 1, 1, color, 1)
+    for (name, x) in nodes:
+        svg.circle(name, x, 0, 3, "red")
+    if labels:
+        svg.text("LABEL", 0, 0, "label", "black", **{"font-size": 7})
+        svg.fit(False)
+    svg.send_commands()
+
+
+class TestRetainedCanvas(unittest.TestCase):
+
+    def setUp(self):
+        self.canvas = RecordingCanvas()
+        self.svg = scene.RetainedCanvas(self.canvas)
+        self.edges = [("E1", "red"), ("E2", "blue"), ("E3", "red")]
+        self.nodes = [("N1", 1), ("N2", 2)]
+        draw(self.svg, self.edges, self.nodes)
+        self.assertEqual(len(self.canvas.commands), 7)
+        self.canvas.commands = []
+
+    def test_unchanged(self):
+        draw(self.svg, self.edges, self.nodes)
+        self.assertEqual(self.canvas.commands, [("fit",)])
+
+    def test_removed_and_changed(self):
+        draw(self.svg, [("E1", "green"), ("E3", "red")], [("N1", 1), ("N2", 5)], labels=False)
+        self.assertEqual(self.canvas.commands, [
+            ("delete", ["E2", "LABEL"]),
+            ("change", "E1", {"stroke": "green"}),
+            ("change", "N2", {"cx": 5})])
+
+    def test_added_keeps_stacking_order(self):
+        draw(self.svg, [("E1", "red"), ("E4", "red"), ("E2", "blue"), ("E3", "red")], self.nodes)
+        self.assertEqual(self.canvas.commands, [
+            ("delete", ["E2", "E3", "LABEL", "N1", "N2"]),
+            ("line", "E4"), ("line", "E2"), ("line", "E3"),
+            ("circle", "N1"), ("circle", "N2"), ("text", "LABEL"), ("fit",)])
+
+    def test_changes_outside_drawings(self):
+        self.svg.change_element("N1", {"cx": 9, "x": 9})
+        self.svg.delete_names(["E3"])
+        self.canvas.commands = []
+        draw(self.svg, self.edges, self.nodes)
+        self.assertEqual(self.canvas.commands, [
+            ("delete", ["LABEL", "N1", "N2"]),
+            ("line", "E3"), ("circle", "N1"), ("circle", "N2"), ("text", "LABEL"), ("fit",)])
+        self.canvas.commands = []
+        self.svg.change_element("N2", {"cx": 9, "x": 9})
+        self.canvas.commands = []
+        draw(self.svg, self.edges, self.nodes)
+        self.assertEqual(self.canvas.commands, [("change", "N2", {"cx": 2}), ("fit",)])
+
+    def test_unnamed_elements(self):
+        self.svg.empty()
+        self.svg.text(None, 0, 0, "anonymous", "black")
+        self.svg.send_commands()
+        self.assertEqual(self.canvas.commands, [("empty",), ("text", None)])
+        self.canvas.commands = []
+        draw(self.svg, self.edges, self.nodes)
+        self.assertEqual(len(self.canvas.commands), 7)
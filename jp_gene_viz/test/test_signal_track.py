@@ -0,0 +1,77 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from .. import bindings
+from .. import signal_track
+from .test_wig import EXAMPLE_FILE, MULTI_FILE
+
+
+class TestSignalTrack(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "example" + signal_track.SIGNAL_SUFFIX)
+        self.W = bindings.WigData()
+        self.W.load_file(StringIO(EXAMPLE_FILE))
+        # small blocks so queries touch several of them.
+        signal_track.write_signal_track(self.W, self.filename, block_size=3)
+        self.V = bindings.WigData()
+        self.V.load_filename(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_header(self):
+        self.assertTrue(signal_track.is_signal_track(self.filename))
+        self.assertEqual(self.V.chromosome_names, ["chrX"])
+        self.assertEqual(self.V.numelts, self.W.numelts)
+        self.assertEqual(self.V.span, 10)
+
+    def test_read_region(self):
+        T = signal_track.SignalTrackFile(self.filename)
+        (locations, heights) = T.read_region("chrX", 3000031, 3000081)
+        self.assertEqual(list(locations), [3000031, 3000041, 3000051, 3000061, 3000071, 3000081])
+        self.assertEqual(list(heights), [2, 2, 1, 1, 1, 3])
+        (first, last) = T.block_range("chrX", 4000281, 4000321)
+        self.assertEqual((first, last), (4, 7))
+
+    def test_same_maximum(self):
+        windows = [(0, 1), (5000000, 5000001), (3000191, 3400091), (3000085, 3000095),
+                   (0, 3000039), (0, 999999999), (3000091, 4000101), (4000141, 4000142),
+                   (4000311, 4000315), (4000321, 4000322)]
+        for (a, b) in windows:
+            self.assertEqual(self.V.maximum(a, b), self.W.maximum(a, b))
+        starts = numpy.array([a for (a, b) in windows])
+        ends = numpy.array([b for (a, b) in windows])
+        self.assertEqual(list(self.V.window_values(starts, ends, "sum")),
+                         list(self.W.window_values(starts, ends, "sum")))
+
+    def test_pyramid(self):
+        P = self.W.pyramid
+        Q = self.V.pyramid
+        self.assertEqual(P.bin_sizes(), Q.bin_sizes())
+        self.assertEqual(list(P.pixel_values(3000000, 4000400, 50)),
+                         list(Q.pixel_values(3000000, 4000400, 50)))
+
+    def test_mixed_spans(self):
+        W = bindings.WigData()
+        W.load_file(StringIO(MULTI_FILE))
+        filename = os.path.join(self.directory, "multi" + signal_track.SIGNAL_SUFFIX)
+        signal_track.write_signal_track(W, filename, block_size=1)
+        V = bindings.WigData()
+        V.load_filename(filename)
+        windows = [(95, 99), (80, 84), (495, 499), (499, 499.5), (105, 108), (0, 1000)]
+        for (a, b) in windows:
+            self.assertEqual(V.maximum(a, b), W.maximum(a, b))
+        region = V.chromosomes["chr1"].region_track(0, 1000)
+        self.assertEqual(list(region.spans), [10, 10, 1, 1])
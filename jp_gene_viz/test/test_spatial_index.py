@@ -0,0 +1,57 @@
+
+import unittest
+
+import numpy
+
+from .. import dGraph
+from .. import spatial_index
+
+
+def brute_rectangle(positions, minx, miny, maxx, maxy):
+    return set(n for (n, (x, y)) in positions.items()
+               if minx <= x <= maxx and miny <= y <= maxy)
+
+
+def brute_within(positions, x, y, radius):
+    return set(n for (n, p) in positions.items() if numpy.hypot(p[0] - x, p[1] - y) <= radius)
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(3)
+        points = random.uniform(0, 100, size=(500, 2))
+        self.positions = dict(("N%d" % i, dGraph.pos(x, y)) for (i, (x, y)) in enumerate(points.tolist()))
+
+    def check(self, index):
+        P = self.positions
+        for (minx, miny, maxx, maxy) in [(10, 20, 30, 25), (0, 0, 100, 100), (50, 50, 50, 50), (-5, 90, 5, 200)]:
+            self.assertEqual(set(index.in_rectangle(minx, miny, maxx, maxy)),
+                             brute_rectangle(P, minx, miny, maxx, maxy))
+        for (x, y, r) in [(50, 50, 10), (0, 0, 3), (99, 1, 0.5)]:
+            self.assertEqual(set(index.within(x, y, r)), brute_within(P, x, y, r))
+            (node, d) = index.nearest(x, y)
+            best = min(numpy.hypot(p[0] - x, p[1] - y) for p in P.values())
+            self.assertAlmostEqual(d, best)
+            self.assertAlmostEqual(numpy.hypot(P[node][0] - x, P[node][1] - y), best)
+
+    def test_queries(self):
+        index = spatial_index.SpatialIndex(self.positions)
+        self.check(index)
+        self.assertEqual(index.nearest(-1000, -1000, max_distance=10), (None, None))
+        self.assertEqual(spatial_index.SpatialIndex({}).in_rectangle(0, 0, 1, 1), [])
+
+    def test_moves(self):
+        P = self.positions
+        index = spatial_index.SpatialIndex(P)
+        moved = ["N%d" % i for i in range(0, 500, 7)]
+        for n in moved:
+            P[n] = P[n] + dGraph.pos(37, -11)
+        P["new"] = dGraph.pos(50, 50)
+        del P["N1"]
+        index.update(moved + ["new", "N1"])
+        self.assertEqual(index.nearest(50, 50), ("new", 0))
+        self.check(index)
+        index.rebuild_minimum = 0
+        self.check(index)
+        self.assertEqual(index.moved, {})
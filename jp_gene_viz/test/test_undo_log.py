@@ -0,0 +1,131 @@
+
+import unittest
+
+import numpy
+
+from .. import dGraph
+from .. import graph_view
+from .. import undo_log
+
+EDGES = [("A", "B", 1.5), ("A", "C", -0.25), ("C", "B", 3.0), ("D", "D", 2.0),
+         ("B", "D", -0.5), ("C", "A", 1.0)]
+
+
+class FakeNetwork(object):
+
+    "The attributes of a NetworkDisplay which are saved for undo."
+
+    def __init__(self):
+        G = dGraph.WGraph()
+        for (f, t, w) in EDGES:
+            G.add_edge(f, t, w)
+        self.data_graph = G
+        self.display_graph = graph_view.graph_view(G)
+        self.threshhold = 0.0
+        self.label_position_overrides = {}
+        self.data_positions = dict((n, dGraph.pos(i, -i)) for (i, n) in enumerate("ABCD"))
+        self.display_positions = dict(self.data_positions)
+
+    def state(self):
+        G = self.display_graph
+        return (self.threshhold, dict(self.label_position_overrides),
+                dict((n, tuple(p)) for (n, p) in self.data_positions.items()),
+                dict((n, tuple(p)) for (n, p) in self.display_positions.items()),
+                dict(G.node_weights), dict(G.edge_weights.items()))
+
+    def threshold(self, value):
+        table = graph_view.edge_table(self.data_graph)
+        mask = table.threshold_mask(value, True, True, None)
+        self.display_graph = graph_view.view(table, mask, self.display_graph)
+        self.threshhold = value
+
+    def move(self, node, x, y):
+        self.display_positions = dict(self.display_positions)
+        self.display_positions[node] = dGraph.pos(x, y)
+
+
+class TestUndoLog(unittest.TestCase):
+
+    def test_capture_restore(self):
+        N = FakeNetwork()
+        N.display_positions["unknown"] = dGraph.pos(7, 7)
+        N.label_position_overrides["A"] = (1, 2)
+        N.display_graph.materialize_edges()[("X", "Y")] = 4.0
+        before = N.state()
+        checkpoint = undo_log.capture(N)
+        N.threshold(1.2)
+        N.move("A", 100, 100)
+        self.assertNotEqual(N.state(), before)
+        undo_log.restore(N, checkpoint)
+        self.assertEqual(N.state(), before)
+
+    def test_deltas(self):
+        N = FakeNetwork()
+        older = undo_log.capture(N)
+        N.threshold(1.2)
+        N.move("B", 5, 5)
+        newer = undo_log.capture(N)
+        delta = undo_log.reverse_delta(older, newer)
+        (components, entries) = delta
+        # most edges changed: the whole mask is kept.
+        self.assertEqual(sorted(entries), ["display_positions.xy"])
+        self.assertEqual(sorted(components), ["edges", "threshhold"])
+        N.threshold(1.7)
+        newest = undo_log.capture(N)
+        delta = undo_log.reverse_delta(newer, newest)
+        (components, entries) = delta
+        self.assertEqual(sorted(entries), ["edges"])
+        self.assertEqual(entries["edges"][1].tolist(), [True])
+        self.assertEqual(sorted(components), ["threshhold"])
+        restored = undo_log.apply_delta(newest, delta)
+        self.assertTrue(numpy.array_equal(restored["edges"], newer["edges"]))
+        delta = undo_log.reverse_delta(older, newer)
+        (components, entries) = delta
+        self.assertEqual(entries["display_positions.xy"][0].tolist(), [newer["table"].ids["B"]])
+        restored = undo_log.apply_delta(newer, delta)
+        for (name, value) in older.items():
+            if isinstance(value, numpy.ndarray):
+                self.assertTrue(numpy.array_equal(value, restored[name]), name)
+            else:
+                self.assertEqual(value, restored[name])
+        self.assertLess(undo_log.size(delta), undo_log.size(older))
+
+    def test_undo_redo(self):
+        N = FakeNetwork()
+        log = undo_log.UndoLog()
+        states = []
+        for value in (0.3, 1.2, 2.5):
+            states.append(N.state())
+            log.push(undo_log.capture(N))
+            N.threshold(value)
+            N.move("C", value, value)
+        final = N.state()
+        self.assertEqual(len(log), 3)
+        for state in reversed(states):
+            undo_log.restore(N, log.undo(undo_log.capture(N)))
+            self.assertEqual(N.state(), state)
+        self.assertEqual(len(log), 0)
+        self.assertIsNone(log.undo(undo_log.capture(N)))
+        for state in states[1:] + [final]:
+            undo_log.restore(N, log.redo(undo_log.capture(N)))
+            self.assertEqual(N.state(), state)
+        self.assertFalse(log.can_redo())
+        undo_log.restore(N, log.undo(undo_log.capture(N)))
+        self.assertEqual(N.state(), states[-1])
+        log.push(undo_log.capture(N))
+        self.assertFalse(log.can_redo())
+
+    def test_budget(self):
+        N = FakeNetwork()
+        full = undo_log.size(undo_log.capture(N))
+        log = undo_log.UndoLog(budget=full + 1, limit=3)
+        for i in range(5):
+            log.push(undo_log.capture(N))
+            N.move("D", i, i)
+            self.assertLessEqual(len(log), 3)
+        # the newest checkpoint is kept even if it alone exceeds the budget.
+        log.budget = 0
+        log.push(undo_log.capture(N))
+        self.assertEqual(len(log), 1)
+        undo_log.restore(N, log.undo(undo_log.capture(N)))
+        self.assertEqual(tuple(N.display_positions["D"]), (4, 4))
@@ -1,5 +1,6 @@
 
 import unittest
+import numpy
 try:
     from StringIO import StringIO
 except ImportError:
@@ -66,3 +67,156 @@ class TestMaximum(unittest.TestCase):
     def test_at_2(self):
         self.assertEqual(self.W.maximum(3000091, 4000101), 13)
 
+
+
+MULTI_FILE = """\
+track type=wiggle_0 name="multi"
+variableStep chrom=chr1 span=10
+100 1
+110 4
+fixedStep chrom=chr2 start=1000 step=100 span=50
+1
+2
+3
+track type=wiggle_0 name="second"
+fixedStep chrom=chr1 start=500 step=10
+5
+7
+"""
+
+
+class TestMultiFormat(unittest.TestCase):
+
+    def parse_file(self, chunk_size=bindings.CHUNK_SIZE):
+        result = bindings.WigData()
+        result.load_file(StringIO(MULTI_FILE), chunk_size=chunk_size)
+        return result
+
+    def test_chromosomes(self):
+        W = self.parse_file()
+        self.assertEqual(W.chromosome_names, ["chr1", "chr2"])
+        self.assertEqual(W.chrom, "chr1")
+        self.assertEqual(list(W.locations), [100, 110, 500, 510])
+        self.assertEqual(list(W.heights), [1, 4, 5, 7])
+        self.assertEqual(W.locations.dtype, bindings.LOCATION_DTYPE)
+        self.assertEqual(W.heights.dtype, bindings.HEIGHT_DTYPE)
+
+    def test_fixed_step(self):
+        W = self.parse_file()
+        W.select_chromosome("chr2")
+        self.assertEqual(list(W.locations), [1000, 1100, 1200])
+        self.assertEqual(W.span, 50)
+        self.assertEqual(W.maximum(1090, 1150), 2)
+
+    def test_small_chunks(self):
+        W = self.parse_file()
+        for chunk_size in (1, 7, 30):
+            V = self.parse_file(chunk_size)
+            for chrom in W.chromosome_names:
+                self.assertEqual(list(V.chromosomes[chrom].locations),
+                                 list(W.chromosomes[chrom].locations))
+                self.assertEqual(list(V.chromosomes[chrom].heights),
+                                 list(W.chromosomes[chrom].heights))
+
+    def test_bad_data(self):
+        W = bindings.WigData()
+        self.assertRaises(ValueError, W.load_file, StringIO("1 2\n3 4\n"))
+
+    def test_mixed_spans(self):
+        # the second chr1 block has the default span of 1.
+        W = self.parse_file()
+        self.assertEqual(W.span, 1)
+        self.assertEqual(list(W.spans), [10, 10, 1, 1])
+        # empty windows use the span of the next location in the gap rule.
+        windows = [(95, 99), (80, 84), (495, 499), (499, 499.5), (105, 108), (0, 1000)]
+        expected = [1, 0, 0, 5, 4, 7]
+        self.assertEqual([W.maximum(a, b) for (a, b) in windows], expected)
+        starts = [a for (a, b) in windows]
+        ends = [b for (a, b) in windows]
+        self.assertEqual(list(W.window_values(starts, ends)), expected)
+        W.select_chromosome("chr2")
+        self.assertEqual(W.spans, None)
+
+
+class TestZoomPyramid(unittest.TestCase):
+
+    def setUp(self):
+        self.W = bindings.WigData()
+        self.W.load_file(StringIO(EXAMPLE_FILE))
+
+    def test_levels(self):
+        P = self.W.pyramid
+        self.assertEqual(P.levels[0].bin_size, 10 * bindings.PYRAMID_BASE)
+        self.assertEqual(len(P.levels[-1].ids), 1)
+        for level in P.levels:
+            self.assertEqual(numpy.max(level.maxima), 13)
+            self.assertEqual(numpy.sum(level.counts), self.W.numelts)
+
+    def test_pixel_values_match_maximum(self):
+        W = self.W
+        (start, end, width) = (3000000, 4000400, 100)
+        values = W.pyramid.pixel_values(start, end, width)
+        dlocation = (end - start) * 1.0 / width
+        for x in range(width):
+            location = start + dlocation * x
+            self.assertEqual(values[x], W.maximum(location, location + dlocation))
+
+    def test_too_fine(self):
+        self.assertEqual(self.W.pyramid.pixel_values(3000000, 3000300, 100), None)
+
+    def test_mean(self):
+        values = self.W.pyramid.pixel_values(3000000, 3000100, 1, "mean")
+        self.assertAlmostEqual(values[0], 25.0 / 9)
+
+    def test_cache(self):
+        import os
+        import shutil
+        import tempfile
+        from .. import signal_track
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "example.wig")
+            with open(filename, "w") as f:
+                f.write(MULTI_FILE)
+            W = bindings.WigData()
+            W.load_filename(filename, cache=True)
+            self.assertTrue(os.path.exists(filename + signal_track.SIGNAL_SUFFIX))
+            V = bindings.WigData()
+            V.load_filename(filename, cache=True)
+            self.assertTrue(isinstance(V.chromosomes["chr1"], signal_track.FileChromosomeTrack))
+            for chrom in W.chromosome_names:
+                P = W.chromosomes[chrom].pyramid
+                Q = V.chromosomes[chrom].pyramid
+                self.assertEqual(P.bin_sizes(), Q.bin_sizes())
+                self.assertEqual(list(P.levels[0].maxima), list(Q.levels[0].maxima))
+            self.assertTrue(V.pyramid is V.chromosomes["chr1"].pyramid)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestWindowValues(unittest.TestCase):
+
+    def setUp(self):
+        self.W = bindings.WigData()
+        self.W.load_file(StringIO(EXAMPLE_FILE))
+
+    def test_matches_maximum(self):
+        W = self.W
+        windows = [(0, 1), (5000000, 5000001), (3000191, 3400091), (3000085, 3000095),
+                   (0, 3000039), (0, 999999999), (3000091, 4000101), (3000000, 3000005),
+                   (4000150, 4000275), (4000140, 4000142), (3000011, 3000011)]
+        starts = [a for (a, b) in windows]
+        ends = [b for (a, b) in windows]
+        values = W.window_values(starts, ends)
+        for (index, (a, b)) in enumerate(windows):
+            self.assertEqual(values[index], W.maximum(a, b))
+
+    def test_sum_and_mean(self):
+        W = self.W
+        self.assertEqual(list(W.window_values([3000011, 0], [3000041, 1], "sum")), [4, 0])
+        self.assertEqual(list(W.window_values([3000011], [3000051], "mean")), [1.5])
+
+    def test_feature_values(self):
+        features = [{"seqname": "chrX", "start": 3000081, "end": 3000091},
+                    {"seqname": "chr1", "start": 1, "end": 100}]
+        self.assertEqual(list(self.W.feature_values(features)), [13, 0])
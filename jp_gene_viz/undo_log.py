@@ -0,0 +1,280 @@
+"""
+Compact undo and redo history for NetworkDisplay.
+
+A checkpoint records the state NetworkDisplay.to_json_value used to copy
+into every undo entry, but by reference where the objects are not changed
+in place (the data graph and its EdgeTable) and otherwise as numpy arrays
+indexed by the node ids and edge positions of the data graph's table:
+node and edge masks, node weights and positions.
+
+Only the newest entry of each stack is a full checkpoint.  The others are
+reverse deltas holding just the components and array entries that differ
+from the next newer checkpoint, so a threshold change costs the edges it
+changed, a node drag the positions it moved.  The history is kept within
+a byte budget by dropping the oldest entries.
+"""
+
+import numpy
+
+from jp_gene_viz import dGraph
+from jp_gene_viz import graph_view
+from jp_gene_viz import color_scale
+
+# bytes assumed for each item of dictionaries copied into checkpoints.
+ITEM_BYTES = 64
+
+
+def encode_values(mapping, ids, n, width=None):
+    """
+    (present, values, extra) for a dictionary whose keys are mostly in
+    ids: a boolean mask and an array of values indexed by id (width
+    numbers per value, or scalars if width is None), and a dictionary for
+    the other keys.
+    """
+    shape = (n,) if width is None else (n, width)
+    present = numpy.zeros((n,), dtype=bool)
+    values = numpy.zeros(shape, dtype=numpy.float64)
+    extra = {}
+    indices = []
+    known = []
+    for (key, value) in mapping.items():
+        i = ids.get(key)
+        if i is None:
+            extra[key] = value
+        else:
+            indices.append(i)
+            known.append(value)
+    if indices:
+        present[indices] = True
+        values[indices] = numpy.array(known, dtype=numpy.float64).reshape((-1,) + shape[1:])
+    return (present, values, extra)
+
+
+def decode_values(names, present, values, extra):
+    "Dictionary for (present, values, extra) from encode_values."
+    indices = numpy.flatnonzero(present)
+    result = dict(zip([names[i] for i in indices.tolist()], values[indices].tolist()))
+    result.update(extra)
+    return result
+
+
+def capture(network):
+    "Checkpoint of the undoable state of a NetworkDisplay."
+    data_graph = network.data_graph
+    if data_graph is None or network.display_graph is None:
+        return None
+    table = graph_view.edge_table(data_graph)
+    ids = table.ids
+    n = len(table.names)
+    result = {
+        "data_graph": data_graph,
+        "table": table,
+        "threshhold": network.threshhold,
+        "label_position_overrides": dict(network.label_position_overrides),
+        }
+    for att in ("data_positions", "display_positions"):
+        positions = getattr(network, att) or {}
+        (present, xy, extra) = encode_values(positions, ids, n, 2)
+        result[att + ".present"] = present
+        result[att + ".xy"] = xy
+        result[att + ".extra"] = dict((node, tuple(p)) for (node, p) in extra.items())
+    G = network.display_graph
+    (present, weights, extra) = encode_values(G.node_weights, ids, n)
+    result["nodes.present"] = present
+    result["nodes.weights"] = weights
+    result["nodes.extra"] = extra
+    if isinstance(G, graph_view.GraphView) and G.table is table and G._edge_weights is None:
+        # masks are never changed in place, so the view's mask can be shared.
+        result["edges"] = G.edge_mask
+        result["edges.extra"] = {}
+    else:
+        items = list(G.edge_weights.items())
+        positions = table.positions_of([e for (e, w) in items])
+        weights = numpy.array([w for (e, w) in items], dtype=numpy.float64)
+        found = positions >= 0
+        found[found] = table.weights[positions[found]] == weights[found]
+        edges = numpy.zeros((len(table),), dtype=bool)
+        edges[positions[found]] = True
+        result["edges"] = edges
+        result["edges.extra"] = dict(item for (item, ok) in zip(items, found.tolist()) if not ok)
+    result["node_radius"] = dict(G.node_radius)
+    result["colors"] = tuple(
+        None if ci is None else ci.to_json_value()
+        for ci in (G._node_color_interpolator, G._edge_color_interpolator))
+    result["edge_attributes"] = G.edge_attributes
+    return result
+
+
+def restore(network, checkpoint):
+    "Put a NetworkDisplay back in the state of a checkpoint."
+    table = checkpoint["table"]
+    names = table.names
+    network.data_graph = checkpoint["data_graph"]
+    network.threshhold = checkpoint["threshhold"]
+    network.label_position_overrides = dict(checkpoint["label_position_overrides"])
+    for att in ("data_positions", "display_positions"):
+        positions = decode_values(
+            names, checkpoint[att + ".present"], checkpoint[att + ".xy"], checkpoint[att + ".extra"])
+        setattr(network, att, dict((node, dGraph.pos(*p)) for (node, p) in positions.items()))
+    node_weights = decode_values(
+        names, checkpoint["nodes.present"], checkpoint["nodes.weights"], checkpoint["nodes.extra"])
+    G = graph_view.GraphView(table, checkpoint["edges"], node_weights)
+    if checkpoint["edges.extra"]:
+        G.materialize_edges().update(checkpoint["edges.extra"])
+    G.node_radius = dict(checkpoint["node_radius"])
+    G.edge_attributes = checkpoint["edge_attributes"]
+    interpolators = []
+    for json_value in checkpoint["colors"]:
+        ci = None
+        if json_value is not None:
+            ci = color_scale.ColorInterpolator().from_json_value(json_value)
+        interpolators.append(ci)
+    (G._node_color_interpolator, G._edge_color_interpolator) = interpolators
+    network.display_graph = G
+
+
+def same(a, b):
+    "Test whether two array entries or component values are the same."
+    if isinstance(a, numpy.ndarray):
+        if a.dtype.kind == "f":
+            return (a == b) | (numpy.isnan(a) & numpy.isnan(b))
+        return a == b
+    return a is b or a == b
+
+
+def reverse_delta(older, newer):
+    """
+    The parts of the checkpoint older that differ from the checkpoint
+    newer: components as {name: value} and array entries as
+    {name: (indices, values)}.
+    """
+    components = {}
+    entries = {}
+    for (name, value) in older.items():
+        other = newer[name]
+        if isinstance(value, numpy.ndarray):
+            if value is other:
+                continue
+            if value.shape != other.shape:
+                components[name] = value
+                continue
+            unchanged = same(value, other)
+            if unchanged.ndim > 1:
+                unchanged = unchanged.all(axis=tuple(range(1, unchanged.ndim)))
+            indices = numpy.flatnonzero(~unchanged)
+            if len(indices) * 2 > len(value):
+                components[name] = value
+            elif len(indices):
+                entries[name] = (indices, value[indices])
+        elif not same(value, other):
+            components[name] = value
+    return (components, entries)
+
+
+def apply_delta(newer, delta):
+    "The older checkpoint for a reverse delta and the newer checkpoint."
+    (components, entries) = delta
+    result = dict(newer)
+    result.update(components)
+    for (name, (indices, values)) in entries.items():
+        # arrays may be shared (edge masks with graph views): patch a copy.
+        array = result[name].copy()
+        array[indices] = values
+        result[name] = array
+    return result
+
+
+def size(entry):
+    "Approximate bytes held by a checkpoint or reverse delta (not counting shared objects)."
+    if isinstance(entry, tuple):
+        (components, entries) = entry
+        arrays = [a for (indices, values) in entries.values() for a in (indices, values)]
+    else:
+        components = entry
+        arrays = []
+    result = 0
+    for (name, value) in components.items():
+        if isinstance(value, numpy.ndarray):
+            arrays.append(value)
+        elif isinstance(value, dict):
+            result += ITEM_BYTES * len(value)
+    return result + sum(a.nbytes for a in arrays)
+
+
+class UndoLog(object):
+
+    """
+    Undo and redo stacks of checkpoints, kept within budget bytes and at
+    most limit entries each (the newest entry is kept regardless).
+    """
+
+    def __init__(self, budget=50 * 1024 * 1024, limit=None):
+        self.budget = budget
+        self.limit = limit
+        # oldest first; the last entry of each is a full checkpoint and the
+        # others (entry, bytes) reverse deltas against the entry after them.
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def can_redo(self):
+        return len(self.redo_stack) > 0
+
+    def nbytes(self):
+        return sum(nbytes for stack in (self.undo_stack, self.redo_stack) for (entry, nbytes) in stack)
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def _push(self, stack, checkpoint):
+        if stack:
+            (newest, _) = stack[-1]
+            delta = reverse_delta(newest, checkpoint)
+            stack[-1] = (delta, size(delta))
+        stack.append((checkpoint, size(checkpoint)))
+
+    def _pop(self, stack):
+        (checkpoint, _) = stack.pop()
+        if stack:
+            (delta, _) = stack[-1]
+            older = apply_delta(checkpoint, delta)
+            stack[-1] = (older, size(older))
+        return checkpoint
+
+    def _trim(self):
+        for stack in (self.undo_stack, self.redo_stack):
+            if self.limit is not None:
+                del stack[:max(0, len(stack) - self.limit)]
+        while self.nbytes() > self.budget:
+            # drop the oldest entry of the longer stack, but never a newest one.
+            stack = max((self.undo_stack, self.redo_stack), key=len)
+            if len(stack) < 2:
+                break
+            del stack[0]
+
+    def push(self, checkpoint):
+        "Record the state before an action.  This forgets the redo history."
+        self._push(self.undo_stack, checkpoint)
+        self.redo_stack = []
+        self._trim()
+
+    def undo(self, current):
+        "Pop the checkpoint to restore for undo; current can be restored by redo."
+        if not self.undo_stack:
+            return None
+        result = self._pop(self.undo_stack)
+        self._push(self.redo_stack, current)
+        self._trim()
+        return result
+
+    def redo(self, current):
+        "Pop the checkpoint to restore for redo; current can be restored by undo."
+        if not self.redo_stack:
+            return None
+        result = self._pop(self.redo_stack)
+        self._push(self.undo_stack, current)
+        self._trim()
+        return result